@@ -0,0 +1,67 @@
+"""
+Microbenchmark: string builders (helpers/dynet_mqtt.py) vs byte codec (helpers/dynet_codec.py).
+
+    python benchmarks/bench_codec.py [--number N]
+
+Times (identical output and the round trip are checked by tests/test_dynet_codec.py):
+  - legacy:   build_*_body() f-string builders
+  - codec:    struct encode + hex, cache bypassed (__wrapped__)
+  - cached:   the memoised *_hex() functions as used by main.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import dynet_codec as codec
+from helpers.dynet_mqtt import build_area_setpoint_body, build_area_temperature_body, build_channel_level_body
+
+AREAS = range(1, 65)
+CHANNELS = [101, 102, 103, 105]
+JOIN = 0xFE
+
+
+def workload(setpoint, temperature, channel_level):
+    def run():
+        for area in AREAS:
+            setpoint(area, JOIN, 22.5)
+            temperature(area, JOIN, 23.0)
+            for channel in CHANNELS:
+                channel_level(area, JOIN, channel, 1)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=200, help="iterations per variant")
+    args = parser.parse_args()
+
+    packets = len(AREAS) * (2 + len(CHANNELS))
+
+    variants = {
+        "legacy": workload(
+            lambda a, j, v: build_area_setpoint_body(area=a, join=j, setpoint=v),
+            lambda a, j, v: build_area_temperature_body(area=a, join=j, temp=v),
+            lambda a, j, c, v: build_channel_level_body(area=a, join=j, channel=c, level=v),
+        ),
+        "codec": workload(
+            lambda a, j, v: codec.to_hex(codec.encode_setpoint.__wrapped__(a, j, v)),
+            lambda a, j, v: codec.to_hex(codec.encode_temperature.__wrapped__(a, j, v)),
+            lambda a, j, c, v: codec.to_hex(codec.encode_channel_level.__wrapped__(a, j, c, v)),
+        ),
+        "cached": workload(codec.setpoint_hex, codec.temperature_hex, codec.channel_level_hex),
+    }
+
+    baseline = None
+    print(f"{'variant':<8} {'packets/s':>12} {'us/packet':>10} {'speedup':>8}")
+    for name, fn in variants.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        per_packet = seconds / (args.number * packets)
+        baseline = baseline or per_packet
+        print(f"{name:<8} {1 / per_packet:>12,.0f} {per_packet * 1e6:>10.3f} {baseline / per_packet:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Microbenchmark: description substring chain vs opcode/template dispatch table.
+
+    python benchmarks/bench_dispatch.py [--number N]
+
+The legacy router below is the decision logic of the old handle_dynalite_message
+(lowercase the description, walk the substring chain, pick fields per dynet1/2)
+calling the same stub handlers as the dispatch table, with side effects removed. Both routers must agree on every message before
+they are timed on a busy-site mix: mostly lighting traffic, a few climate
+messages.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.dynet_dispatch import (
+    DynetDispatcher, join_value, REQUEST_SETPOINT, SET_SETPOINT, RECALL_LEVEL, UNKNOWN
+)
+
+
+def legacy_route(dynalite):
+    description = str(dynalite.get("description", "").lower())
+    type = dynalite.get("type")
+    fields = dynalite.get("fields")
+
+    if "join fe" in description:
+        return _skipped("loopback")
+    if "request user temperature set point" in description or "request temperature set point" in description:
+        if type == "dynet1" and len(fields) == 2:
+            return _handled(REQUEST_SETPOINT, fields[0], fields[1], None, None)
+        if type == "dynet2" and len(fields) == 4:
+            return _handled(REQUEST_SETPOINT, fields[2], fields[3], None, None)
+        return _skipped("invalid")
+    if "set temperature set point to" in description:
+        if type == "dynet1" and len(fields) == 3:
+            return _handled(SET_SETPOINT, fields[0], fields[1], None, fields[2])
+        if type == "dynet2" and len(fields) == 5:
+            return _handled(SET_SETPOINT, fields[2], fields[3], None, fields[4])
+        return _skipped("invalid")
+    elif "recall level" in description:
+        if type == "dynet1" and len(fields) == 5:
+            return _handled(RECALL_LEVEL, fields[0], fields[1], fields[2], fields[3])
+        if type == "dynet2" and len(fields) == 7:
+            return _handled(RECALL_LEVEL, fields[2], fields[3], fields[4], fields[5])
+        return _skipped("invalid")
+    return _skipped(UNKNOWN)
+
+
+def _handled(kind, area, join, channel, value):
+    return (kind, area, join, channel, value)
+
+
+def _skipped(reason):
+    return reason
+
+
+# One stub call per message on both sides, like the real handlers
+def _routed(kind):
+    def handler(area, join, channel, value, dynalite):
+        if join_value(join) == 0xFE:
+            return "loopback"
+        return (kind, area, join, channel, value)
+    return handler
+
+
+def _unknown(dynalite):
+    return UNKNOWN
+
+
+def _invalid(dynalite):
+    return "invalid"
+
+
+dispatcher = DynetDispatcher(
+    {kind: _routed(kind) for kind in (REQUEST_SETPOINT, SET_SETPOINT, RECALL_LEVEL)},
+    fallback=_unknown,
+    invalid=_invalid,
+)
+
+
+def message_mix():
+    msgs = []
+    for area in range(1, 101):
+        # lighting chatter: preset recalls, fades, channel levels on non-HVAC channels
+        msgs.append({"type": "dynet1", "template": "Select Current Preset {} in Area {} Join {:02x} Fade {}s",
+                     "description": f"Select Current Preset 4 in Area {area} Join ff Fade 2s", "fields": [4, area, 255, 2]})
+        msgs.append({"type": "dynet1", "template": "Fade Channel {} in Area {} to {} Join {:02x}",
+                     "description": f"Fade Channel 3 in Area {area} to 50% Join ff", "fields": [3, area, "50%", 255]})
+        msgs.append({"type": "dynet2", "template": "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}",
+                     "description": f"Area {area} Join ff Recall Level Channel 4 Level 80% Fade 0",
+                     "fields": [0, 0, area, 255, 4, "80%", 0]})
+        msgs.append({"type": "dynet1", "template": "Report Channel Level {} in Area {}",
+                     "description": f"Report Channel Level 2 in Area {area}", "fields": [2, area]})
+    for area in range(1, 11):
+        # climate traffic
+        msgs.append({"type": "dynet2", "template": "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}",
+                     "description": f"Area {area} Join ff Recall Level Channel 102 Level 1% Fade 0",
+                     "fields": [0, 0, area, 255, 102, "1%", 0]})
+        msgs.append({"type": "dynet2", "template": "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}",
+                     "description": f"Area {area} Join fe Recall Level Channel 101 Level 1% Fade 0",
+                     "fields": [0, 0, area, 254, 101, "1%", 0]})
+        msgs.append({"type": "dynet1", "template": "Set Temperature Set Point to {} Area {} Join {:02x}",
+                     "description": f"Set Temperature Set Point to 23 Area {area} Join ff", "fields": [area, 255, 23]})
+        msgs.append({"type": "dynet2", "template": "Request Temperature Set Point Area {} Join {:02x}",
+                     "description": f"Request Temperature Set Point Area {area} Join ff", "fields": [0, 0, area, 255]})
+    return msgs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=500, help="passes over the message mix")
+    args = parser.parse_args()
+
+    msgs = message_mix()
+    for msg in msgs:
+        assert legacy_route(msg) == dispatcher.dispatch(msg), msg
+    print(f"verified {len(msgs)} messages route identically ({dispatcher.stats()['routes']} compiled routes)")
+
+    variants = {
+        "legacy": lambda: [legacy_route(m) for m in msgs],
+        "dispatch": lambda: [dispatcher.dispatch(m) for m in msgs],
+    }
+    baseline = None
+    print(f"{'variant':<9} {'msgs/s':>12} {'us/msg':>8} {'speedup':>8}")
+    for name, fn in variants.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        per_msg = seconds / (args.number * len(msgs))
+        baseline = baseline or per_msg
+        print(f"{name:<9} {1 / per_msg:>12,.0f} {per_msg * 1e6:>8.3f} {baseline / per_msg:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Handler benchmark: the MQTT message handlers in main.py against an in-memory publisher.
+
+    python benchmarks/bench_handlers.py [--number N] [--scenario NAME ...] [--no-alloc]
+
+Each scenario feeds a fixed message mix through a handler with mqtt_client
+replaced by FakePublisher, which records publishes in memory instead of
+talking to a broker (no scheduler, no batching: packets are published the
+moment the handler produces them). Reported per scenario:
+
+    msgs/s      whole mix, timed pass
+    p50/p99     per-message handler latency
+    peak B/msg  average transient allocation high-water per message (tracemalloc)
+    blocks/msg  memory blocks still allocated per message after the pass (growth)
+
+Acks on /set/res/<id> answer packets published earlier in the same run.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from helpers import logger
+from helpers.dynet_mqtt import build_area_setpoint_body, build_area_temperature_body, build_channel_level_body
+from helpers.response_tracker import PendingResponses
+
+PREFIX = main.MQTT_DYNALITE_PREFIX
+CLIMATE_AREAS = range(1, 51)
+LIGHTING_AREAS = range(100, 200)
+
+
+class FakePublisher:
+    """
+    Stand-in for MQTTPublisher: same publish/subscribe/stop surface, publishes
+    kept in memory. Response ids of /set publishes are queued for acks.
+    """
+
+    def __init__(self):
+        self.published = 0
+        self.response_ids = deque(maxlen=100000)
+        self.set_topic = f"{PREFIX}/set"
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published += 1
+        if topic == self.set_topic:
+            self.response_ids.append(payload)
+        return True
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+    def stop(self):
+        pass
+
+    def next_ack(self):
+        if not self.response_ids:
+            return f"{PREFIX}/set/res/unknown"
+        frame = json.loads(self.response_ids.popleft())
+        return f"{PREFIX}/set/res/{frame['response_id']}"
+
+
+def _reset():
+    main.mqtt_client = FakePublisher()
+    main.scheduler = None
+    main.batcher = None
+    main.pending_responses = PendingResponses(ttl=main.PENDING_TTL, max_entries=10 ** 7)
+    for name in main.bridge_online:
+        main.bridge_online[name] = True
+
+
+# --- message mixes ----------------------------------------------------------
+
+def _climate_state(area, rng, step):
+    return {
+        "temperature": 20 + (step + area) % 6,
+        "current_temperature": round(21 + rng.uniform(-2, 2), 1),
+        "hvac_mode": ("cool", "heat", "auto")[(step // 7 + area) % 3],
+        "fan_mode": ("low", "med", "high", "auto")[(step // 5 + area) % 4],
+        "status": "ok",
+    }
+
+
+def _climate_topic(area):
+    return f"homeassistant/climate/coolmaster_L1_{area}/state"
+
+
+def _recall(type, area, join, channel, level):
+    if type == "dynet1":
+        return {"type": "dynet1", "template": "Recall Level Channel {} Area {} Join {:02x} Level {} Fade {}",
+                "description": f"Recall Level Channel {channel} Area {area} Join {join:02x} Level {level}% Fade 0",
+                "fields": [area, join, channel, f"{level}%", 0]}
+    return {"type": "dynet2", "template": "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}",
+            "description": f"Area {area} Join {join:02x} Recall Level Channel {channel} Level {level}% Fade 0",
+            "fields": [0, 0, area, join, channel, f"{level}%", 0]}
+
+
+def _setpoint_request(area):
+    return {"type": "dynet2", "template": "Request Temperature Set Point Area {} Join {:02x}",
+            "description": f"Request Temperature Set Point Area {area} Join ff", "fields": [0, 0, area, 255]}
+
+
+def _set_setpoint(area, value):
+    return {"type": "dynet1", "template": "Set Temperature Set Point to {} Area {} Join {:02x}",
+            "description": f"Set Temperature Set Point to {value} Area {area} Join ff", "fields": [area, 255, value]}
+
+
+def _lighting(area):
+    return {"type": "dynet1", "template": "Select Current Preset {} in Area {} Join {:02x} Fade {}s",
+            "description": f"Select Current Preset 4 in Area {area} Join ff Fade 2s", "fields": [4, area, 255, 2]}
+
+
+def _bus(dynalite):
+    return (PREFIX, json.dumps(dynalite))
+
+
+def mixes(rng):
+    """
+    {scenario: (call, messages)}; ACK entries are resolved to a real response id at run time.
+    """
+    climate = [(_climate_topic(a), json.dumps(_climate_state(a, rng, step)))
+               for step in range(20) for a in CLIMATE_AREAS]
+    recall = []
+    for a in CLIMATE_AREAS:
+        for channel, level in ((101, 1), (102, a % 5), (103, a % 4)):
+            recall.append(_bus(_recall("dynet1" if a % 2 else "dynet2", a, 0xFF, channel, level)))
+        recall.append(_bus(_recall("dynet2", a, 0xFE, 101, 1)))   # our own loopback
+    for a in LIGHTING_AREAS:
+        recall.append(_bus(_recall("dynet2", a, 0xFF, 4, 80)))
+    requests = [_bus(_setpoint_request(a)) for a in CLIMATE_AREAS]
+    acks = ["ACK"] * 1000
+
+    mixed = []
+    for step in range(10):
+        for a in CLIMATE_AREAS:
+            mixed.append((_climate_topic(a), json.dumps(_climate_state(a, rng, step))))
+            mixed.append("ACK")
+        for a in LIGHTING_AREAS:
+            mixed.append(_bus(_lighting(a)))
+            mixed.append(_bus(_recall("dynet2", a, 0xFF, 4, (step * 10) % 100)))
+        for a in CLIMATE_AREAS[::10]:
+            mixed.append(_bus(_setpoint_request(a)))
+            mixed.append(_bus(_set_setpoint(a, 22 + step % 3)))
+            mixed.append(_bus(_recall("dynet1", a, 0xFF, 102, step % 5)))
+    rng.shuffle(mixed)
+
+    direct_climate = [(_climate_topic(a), _climate_state(a, rng, step)) for step in range(20) for a in CLIMATE_AREAS]
+    direct_dynalite = [(PREFIX, json.loads(payload)) for _, payload in recall + requests]
+    builders = []
+    for a in CLIMATE_AREAS:
+        builders.append((build_area_setpoint_body, (a, 0xFE, 22.5)))
+        builders.append((build_area_temperature_body, (a, 0xFE, 23.1)))
+        for channel in (101, 102, 103, 105):
+            builders.append((build_channel_level_body, (a, channel, 1, 0xFE)))
+
+    command = main.handle_mqtt_command
+    return {
+        "climate_state": (command, climate),
+        "dynet_recall": (command, recall),
+        "setpoint_request": (command, requests),
+        "set_res_ack": (command, acks),
+        "mixed": (command, mixed),
+        "handle_climate_message": (main.handle_climate_message, direct_climate),
+        "handle_dynalite_message": (main.handle_dynalite_message, direct_dynalite),
+        "dynet_mqtt_builders": (None, builders),
+    }
+
+
+# --- runner -----------------------------------------------------------------
+
+def _prime(call, msgs):
+    # Warm the caches (area rows, routes, codec) and produce packets to ack
+    for a in CLIMATE_AREAS:
+        main.handle_mqtt_command(_climate_topic(a), json.dumps(_climate_state(a, random.Random(a), 0)))
+    for msg in msgs:
+        _run_one(call, msg)
+
+
+def _run_one(call, msg):
+    if call is None:
+        fn, args = msg
+        return fn(*args)
+    if msg == "ACK":
+        return call(main.mqtt_client.next_ack(), '{"status": "ok"}')
+    return call(*msg)
+
+
+def _acks_ready(msgs):
+    # Ack topics are resolved before the clock starts so only the handler is timed
+    fake = main.mqtt_client
+    return [(fake.next_ack(), '{"status": "ok"}') if msg == "ACK" else msg for msg in msgs]
+
+
+def run(name, call, msgs, number, alloc):
+    _reset()
+    _prime(call, msgs)
+    perf = time.perf_counter
+    samples = []
+    total = 0.0
+    for _ in range(number):
+        batch = _acks_ready(msgs)
+        for msg in batch:
+            started = perf()
+            _run_one(call, msg)
+            elapsed = perf() - started
+            samples.append(elapsed)
+            total += elapsed
+    samples.sort()
+    count = len(samples)
+
+    peak = blocks = None
+    if alloc:
+        batch = _acks_ready(msgs)
+        before_blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        peak_total = 0
+        for msg in batch:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            _run_one(call, msg)
+            peak_total += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        peak = peak_total / len(batch)
+        blocks = (sys.getallocatedblocks() - before_blocks) / len(batch)
+
+    return {
+        "scenario": name,
+        "msgs": count,
+        "msgs_per_s": count / total if total else 0.0,
+        "p50_us": samples[count // 2] * 1e6,
+        "p99_us": samples[min(count - 1, int(count * 0.99))] * 1e6,
+        "peak_bytes": peak,
+        "blocks": blocks,
+    }
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20, help="timed passes over each message mix")
+    parser.add_argument("--scenario", action="append", help="only run these scenarios")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--log-level", default="ERROR", help="bridge log level while benchmarking")
+    args = parser.parse_args()
+
+    logger.configure(args.log_level, ring_size=0, background=False)
+    scenarios = mixes(random.Random(42))
+    names = args.scenario or list(scenarios)
+
+    print(f"{'scenario':<24} {'msgs':>7} {'msgs/s':>11} {'p50 us':>8} {'p99 us':>8} {'peak B/msg':>11} {'blocks/msg':>10}")
+    for name in names:
+        call, msgs = scenarios[name]
+        r = run(name, call, msgs, args.number, not args.no_alloc)
+        alloc = "" if r["peak_bytes"] is None else f"{r['peak_bytes']:>11,.0f} {r['blocks']:>10.2f}"
+        print(f"{name:<24} {r['msgs']:>7} {r['msgs_per_s']:>11,.0f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f} {alloc}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,150 @@
+"""
+Replay recorded MQTT traffic (MQTT_RECORD_PATH) through handle_mqtt_command without a broker.
+
+    python benchmarks/replay.py traffic.bin [--speed N] [--save out.jsonl] [--compare ref.jsonl]
+
+--speed 1 replays with the recorded gaps, N compresses them N times, 0 (the
+default) feeds messages back to back. Everything the bridge publishes is kept
+in memory; /set packets are normalised to type + hex string (response ids are
+random) so two runs can be compared. The bridge publishes through a real
+MQTTPublisher on the loopback transport, no broker (or paho) needed:
+
+    python benchmarks/replay.py traffic.bin --save before.jsonl
+    ... change the code ...
+    python benchmarks/replay.py traffic.bin --compare before.jsonl
+
+Compare runs made at the same speed: temperature deadband/rate limiting
+depends on wall-clock gaps, so max speed and 1x legitimately differ. Held
+temperatures are flushed at the end of a run, as on shutdown.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from helpers import logger
+from helpers.response_tracker import PendingResponses
+from helpers.traffic_log import read_traffic
+from mqtt.loopback import LoopbackBroker, LoopbackTransport
+from mqtt.publisher import MQTTPublisher
+
+
+def recording_client():
+    """
+    MQTTPublisher on a private loopback broker, plus the list every publish
+    lands in as (topic, normalised payload).
+    """
+    outbound = []
+    set_topic = f"{main.MQTT_DYNALITE_PREFIX}/set"
+
+    def record(topic, payload):
+        if topic == set_topic:
+            frame = json.loads(payload)
+            hex_strings = frame.get("hex_strings") or [frame.get("hex_string")]
+            for hex_string in hex_strings:
+                outbound.append((topic, f"{frame.get('type')} {hex_string}"))
+        else:
+            outbound.append((topic, payload.decode()))
+
+    broker = LoopbackBroker()
+    broker.listen("#", record)
+    client = MQTTPublisher(None, None, 0, "loopback", transport=LoopbackTransport(broker=broker))
+    client.start()
+    return client, outbound
+
+
+async def replay(path, speed=0.0, bridges_online=True):
+    main.mqtt_client, outbound = recording_client()
+    main.scheduler = None
+    main.batcher = None
+    main.pending_responses = PendingResponses(ttl=main.PENDING_TTL, max_entries=10 ** 7)
+    for name in main.bridge_online:
+        main.bridge_online[name] = bridges_online
+
+    handle = main.handle_mqtt_command
+    count = 0
+    handler_time = 0.0
+    first_ts = None
+    started = time.monotonic()
+    perf = time.perf_counter
+    for ts, topic, payload in read_traffic(path):
+        if speed > 0:
+            first_ts = ts if first_ts is None else first_ts
+            delay = (ts - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        t0 = perf()
+        handle(topic, payload)
+        handler_time += perf() - t0
+        count += 1
+        if count % 1000 == 0:
+            # Let timers (trailing temperature sends) run
+            await asyncio.sleep(0)
+    main.temp_limiter.flush_all()
+    elapsed = time.monotonic() - started
+    return outbound, count, elapsed, handler_time
+
+
+def _load(path):
+    with open(path) as f:
+        return [tuple(json.loads(line)) for line in f if line.strip()]
+
+
+def compare(outbound, reference):
+    """
+    Returns a list of human-readable differences (empty when identical).
+    """
+    diffs = []
+    for i, (got, want) in enumerate(zip(outbound, reference)):
+        if got != want:
+            diffs.append(f"#{i}: expected {want[0]} {want[1]!r}, got {got[0]} {got[1]!r}")
+            if len(diffs) >= 10:
+                diffs.append("...")
+                return diffs
+    if len(outbound) != len(reference):
+        diffs.append(f"{len(outbound)} outbound publishes, reference has {len(reference)}")
+    return diffs
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="recording written with MQTT_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, N = N times faster, 0 = max")
+    parser.add_argument("--save", help="write the outbound publishes as a reference (JSON lines)")
+    parser.add_argument("--compare", help="reference file from an earlier --save")
+    parser.add_argument("--bridges-offline", action="store_true",
+                        help="start with the dependent bridges offline until their status appears in the recording")
+    parser.add_argument("--log-level", default="ERROR", help="bridge log level while replaying")
+    args = parser.parse_args()
+
+    logger.configure(args.log_level, ring_size=0, background=False)
+    outbound, count, elapsed, handler_time = asyncio.run(
+        replay(args.path, args.speed, bridges_online=not args.bridges_offline)
+    )
+    print(f"replayed {count} messages in {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.0f} msgs/s), "
+          f"handler time {handler_time:.2f}s ({count / handler_time if handler_time else 0:,.0f} msgs/s), "
+          f"{len(outbound)} outbound publishes")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            for item in outbound:
+                f.write(json.dumps(item) + "\n")
+        print(f"saved reference to {args.save}")
+
+    if args.compare:
+        diffs = compare(outbound, _load(args.compare))
+        if diffs:
+            print(f"outbound differs from {args.compare}:")
+            for diff in diffs:
+                print(f"  {diff}")
+            sys.exit(1)
+        print(f"outbound matches {args.compare}")
+
+
+if __name__ == "__main__":
+    cli()
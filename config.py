@@ -1,4 +1,34 @@
 import os
+import sys
+import json
+from helpers.logger import get_logger
+
+
+def _json_env(name, default="{}"):
+    # A bad value stops the bridge at startup with the setting named, not a traceback
+    try:
+        value = json.loads(os.getenv(name, default) or default)
+    except ValueError as e:
+        get_logger("⚙️").error(f"❌ {name} is not valid JSON: {e}")
+        sys.exit(1)
+    if not isinstance(value, dict):
+        get_logger("⚙️").error(f"❌ {name} must be a JSON object")
+        sys.exit(1)
+    return value
+
+
+def _bool_env(name, default=False):
+    # One spelling for every switch; anything unrecognised stops the bridge with the setting named
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    get_logger("⚙️").error(f"❌ {name}={value!r} is not a boolean, use true/false, yes/no, on/off or 1/0")
+    sys.exit(1)
+
 MQTT_HOST = os.getenv("MQTT_HOST", "192.168.0.253")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME", "")
@@ -9,7 +39,65 @@ MQTT_CLIMATE_PREFIX = os.getenv("MQTT_CLIMATE_PREFIX","homeassistant/climate")
 MQTT_CLIMATE_WILL = os.getenv("MQTT_CLIMATE_WILL","homeassistant/climate/coolmaster/status")
 MQTT_DYNALITE_WILL = os.getenv("MQTT_DYNALITE_WILL","dynalite/status")
 MQTT_BRIDGE_WILL =  os.getenv("MQTT_BRIDGE_WILL", "bridges/climate_dynalite") 
-MQTT_DEBUG =  os.getenv("MQTT_DEBUG", False) 
+MQTT_DEBUG = _bool_env("MQTT_DEBUG")
 OUT_JOIN = os.getenv("OUT_JOIN", 0xFE) 
 IN_JOIN = os.getenv("OUT_JOIN", 0xFF) 
-TEMP_PRECISION = os.getenv("TEMP_PRECISION", 1)
\ No newline at end of file
+TEMP_PRECISION = float(os.getenv("TEMP_PRECISION", 0.5))
+TEMP_HYSTERESIS = float(os.getenv("TEMP_HYSTERESIS", 0.1))
+TEMP_DEADBAND = float(os.getenv("TEMP_DEADBAND", 1.0))
+TEMP_MIN_INTERVAL = float(os.getenv("TEMP_MIN_INTERVAL", 30))
+TEMP_SETTLE_INTERVAL = float(os.getenv("TEMP_SETTLE_INTERVAL", 300))
+TEMP_AREA_OVERRIDES = _json_env("TEMP_AREA_OVERRIDES")
+MSG_QUEUE_SIZE = int(os.getenv("MSG_QUEUE_SIZE", 1000))
+MSG_QUEUE_POLICY = os.getenv("MSG_QUEUE_POLICY", "drop_oldest")
+MSG_WORKERS = int(os.getenv("MSG_WORKERS", 1))
+MSG_SHARDS = int(os.getenv("MSG_SHARDS", 1))
+MSG_QUEUE_STATS_INTERVAL = int(os.getenv("MSG_QUEUE_STATS_INTERVAL", 300))
+DYNET_BATCH = os.getenv("DYNET_BATCH", "")
+DYNET_BATCH_WINDOW = float(os.getenv("DYNET_BATCH_WINDOW", 0.05))
+DYNET_BATCH_MAX = int(os.getenv("DYNET_BATCH_MAX", 32))
+PENDING_TTL = float(os.getenv("PENDING_TTL", 15))
+PENDING_MAX = int(os.getenv("PENDING_MAX", 10000))
+PENDING_EVICTION = os.getenv("PENDING_EVICTION", "oldest")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+STATE_SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH", "data/state_snapshot.json")
+STATE_SNAPSHOT_INTERVAL = float(os.getenv("STATE_SNAPSHOT_INTERVAL", 60))
+DYNET_BUS_BAUD = int(os.getenv("DYNET_BUS_BAUD", 9600))
+DYNET_BUS_SHARE = float(os.getenv("DYNET_BUS_SHARE", 0.5))
+DYNET_BUS_BURST = int(os.getenv("DYNET_BUS_BURST", 64))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", 500))
+LOG_RING_LEVEL = os.getenv("LOG_RING_LEVEL", "")
+LOG_BACKGROUND = _bool_env("LOG_BACKGROUND", True)
+MQTT_RECORD_PATH = os.getenv("MQTT_RECORD_PATH", "")
+CLIMATE_CONTROLLERS = [c.strip() for c in os.getenv("CLIMATE_CONTROLLERS", "coolmaster_L1").split(",") if c.strip()]
+CLIMATE_AREAS = os.getenv("CLIMATE_AREAS", "")
+CLIMATE_AREAS_FILE = os.getenv("CLIMATE_AREAS_FILE", "")
+CLIMATE_AREAS_LEARN = _bool_env("CLIMATE_AREAS_LEARN", True)
+JSON_CODEC = os.getenv("JSON_CODEC", "auto")
+DYNET_WINDOW = int(os.getenv("DYNET_WINDOW", 8))
+DYNET_WINDOW_MIN = int(os.getenv("DYNET_WINDOW_MIN", 1))
+DYNET_WINDOW_MAX = int(os.getenv("DYNET_WINDOW_MAX", 64))
+DYNET_WINDOW_LATENCY = float(os.getenv("DYNET_WINDOW_LATENCY", 1.0))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 1.0))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 30))
+RETRY_JITTER = float(os.getenv("RETRY_JITTER", 0.5))
+RETRY_BUDGET = int(os.getenv("RETRY_BUDGET", 5))
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", 60))
+RETRY_RESYNC_INTERVAL = float(os.getenv("RETRY_RESYNC_INTERVAL", 300))
+ECHO_TTL = float(os.getenv("ECHO_TTL", 5))
+ECHO_MAX = int(os.getenv("ECHO_MAX", 4096))
+DYNALITE_PREFILTER = _bool_env("DYNALITE_PREFILTER", True)
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "paho")
+RESYNC_RATE = float(os.getenv("RESYNC_RATE", 10))
+RESYNC_SETTLE = float(os.getenv("RESYNC_SETTLE", 2))
+TRACE = _bool_env("TRACE")
+TRACE_TOPIC = os.getenv("TRACE_TOPIC", f"{MQTT_BRIDGE_WILL}/trace")
+TRACE_DIR = os.getenv("TRACE_DIR", "data/trace")
+TRACE_SAMPLE_INTERVAL = float(os.getenv("TRACE_SAMPLE_INTERVAL", 0.005))
+REQUEST_REPLY_FIELDS = os.getenv("REQUEST_REPLY_FIELDS", "all")
+REQUEST_COLLAPSE_WINDOW = float(os.getenv("REQUEST_COLLAPSE_WINDOW", 1.0))
+TRACE_PROFILE = _bool_env("TRACE_PROFILE")
+TRACE_PROFILE_MAX = float(os.getenv("TRACE_PROFILE_MAX", 300))
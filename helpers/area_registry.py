@@ -0,0 +1,182 @@
+import json
+from helpers.logger import get_logger
+log = get_logger("🗺️")
+
+
+def _join(value, default):
+    if value is None:
+        return default
+    if isinstance(value, int):
+        return value
+    text = str(value)
+    return int(text, 16) if text.lower().startswith("0x") or not text.isdigit() else int(text)
+
+
+class AreaUnit:
+    """
+    One HA climate entity <-> Dynalite area, with every topic it uses precomputed.
+    """
+
+    __slots__ = ("area", "join", "entity", "controller", "base", "state_topic",
+                 "set_temperature_topic", "set_mode_topic", "set_fan_mode_topic")
+
+    def __init__(self, area, join, entity, controller, prefix):
+        self.area = area
+        self.join = join
+        self.entity = entity
+        self.controller = controller
+        self.base = f"{prefix}/{entity}"
+        self.state_topic = f"{self.base}/state"
+        self.set_temperature_topic = f"{self.base}/set/temperature"
+        self.set_mode_topic = f"{self.base}/set/mode"
+        self.set_fan_mode_topic = f"{self.base}/set/fan_mode"
+
+
+class AreaRegistry:
+    """
+    Maps HA climate entity topics to Dynalite areas and back.
+
+    Units come from config:
+        {"coolmaster_L1_12": 12,
+         "office_ac": {"area": 40, "join": "FE"},
+         "coolmaster_L2_3": {"area": 203, "controller": "coolmaster_L2"}}
+
+    and, for the CoolMaster naming (`<controller>_<area>`, one or more
+    controller prefixes), from the first state message of a unit not in the
+    config. Every lookup after that is one dict access: topic -> unit for
+    incoming state, area -> unit for publishing HA commands.
+
+    learn=False only accepts configured units.
+    """
+
+    def __init__(self, prefix="homeassistant/climate", controllers=("coolmaster_L1",), units=None,
+                 default_join=0xFE, learn=True):
+        self.prefix = prefix.rstrip("/")
+        self.controllers = tuple(controllers) or ("coolmaster_L1",)
+        self.default_join = _join(default_join, 0xFE)
+        self.learn = learn
+        self.by_topic = {}
+        self.by_area = {}
+        self._guessed = {}      # area -> unregistered unit handed out by for_area()
+        self._unknown = set()
+        for entity, spec in (units or {}).items():
+            if not isinstance(spec, dict):
+                spec = {"area": spec}
+            self.add(entity, int(spec["area"]), _join(spec.get("join"), self.default_join), spec.get("controller"))
+
+    def add(self, entity, area, join=None, controller=None) -> AreaUnit:
+        if area in self.by_area and self.by_area[area].entity != entity:
+            raise ValueError(f"Area {area} mapped to both {self.by_area[area].entity} and {entity}")
+        unit = AreaUnit(area, self.default_join if join is None else join, entity,
+                        controller or self._controller_of(entity), self.prefix)
+        self.by_topic[unit.state_topic] = unit
+        self.by_area[area] = unit
+        self._guessed.pop(area, None)
+        self._unknown.discard(unit.state_topic)
+        return unit
+
+    def _controller_of(self, entity):
+        for controller in self.controllers:
+            if entity.startswith(controller + "_"):
+                return controller
+        return None
+
+    def _parse(self, topic):
+        # <prefix>/<controller>_<area>/state
+        if not topic.startswith(self.prefix + "/") or not topic.endswith("/state"):
+            return None
+        entity = topic[len(self.prefix) + 1:-len("/state")]
+        controller = self._controller_of(entity)
+        if controller is None or "/" in entity:
+            return None
+        suffix = entity[len(controller) + 1:]
+        if not suffix.isdigit():
+            return None
+        return entity, int(suffix), controller
+
+    def lookup(self, topic) -> AreaUnit:
+        """
+        Unit for a state topic, None if the topic isn't a known/learnable unit.
+        """
+        unit = self.by_topic.get(topic)
+        if unit is not None or not self.learn or topic in self._unknown:
+            return unit
+        parsed = self._parse(topic)
+        if parsed is None:
+            if len(self._unknown) < 10000:
+                self._unknown.add(topic)
+            return None
+        entity, area, controller = parsed
+        if area in self.by_area:
+            log(f"⚠️ {entity} maps to Area {area}, already used by {self.by_area[area].entity}")
+            self._unknown.add(topic)
+            return None
+        unit = self.add(entity, area, controller=controller)
+        log(f"Learned {entity} → Area {area}")
+        return unit
+
+    def area_of(self, topic):
+        """
+        Area a state topic maps to, known or learnable, None otherwise.
+        Registers nothing (inbound shard keys read it for every message).
+        """
+        unit = self.by_topic.get(topic)
+        if unit is not None:
+            return unit.area
+        if not self.learn or topic in self._unknown:
+            return None
+        parsed = self._parse(topic)
+        return None if parsed is None else parsed[1]
+
+    def for_area(self, area) -> AreaUnit:
+        """
+        Unit for a Dynalite area; areas not seen yet (e.g. restored from a
+        snapshot) get a guess with the first controller's naming. The guess
+        isn't registered, so the unit's real state topic, from whichever
+        controller, still maps the area when it arrives.
+        """
+        unit = self.by_area.get(area)
+        if unit is None and self.learn:
+            unit = self._guessed.get(area)
+            if unit is None:
+                controller = self.controllers[0]
+                unit = self._guessed[area] = AreaUnit(area, self.default_join, f"{controller}_{area}",
+                                                      controller, self.prefix)
+        return unit
+
+    def join(self, area):
+        unit = self.by_area.get(area)
+        return self.default_join if unit is None else unit.join
+
+    def __len__(self):
+        return len(self.by_area)
+
+    def stats(self) -> dict:
+        controllers = {}
+        for unit in self.by_area.values():
+            controller = unit.controller or "custom"
+            controllers[controller] = controllers.get(controller, 0) + 1
+        return {"areas": len(self.by_area), "per_controller": controllers, "unknown_topics": len(self._unknown)}
+
+
+def load_units(inline: str = "", path: str = "") -> dict:
+    """
+    Unit map from CLIMATE_AREAS (JSON) and/or CLIMATE_AREAS_FILE (JSON file); the file wins on conflicts.
+    Raises ValueError naming the setting that is bad.
+    """
+    try:
+        units = json.loads(inline) if inline else {}
+    except ValueError as e:
+        raise ValueError(f"CLIMATE_AREAS is not valid JSON: {e}")
+    if not isinstance(units, dict):
+        raise ValueError("CLIMATE_AREAS must be a JSON object")
+    if path:
+        try:
+            with open(path) as f:
+                from_file = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"CLIMATE_AREAS_FILE {path}: {e}")
+        if not isinstance(from_file, dict):
+            raise ValueError(f"CLIMATE_AREAS_FILE {path} must hold a JSON object")
+        units.update(from_file)
+    return units
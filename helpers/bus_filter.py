@@ -0,0 +1,123 @@
+from helpers.dynet_dispatch import UNKNOWN
+from helpers.logger import get_logger
+log = get_logger("🧹")
+
+# Pre-filter reasons, same names as the skipped reasons in main
+UNHANDLED = "unhandled_dynalite"
+NOT_CLIMATE = "not_in_cache"
+
+
+def _string_value(payload: bytes, key: bytes):
+    # "key": "value" -> value, None when absent or escaped
+    start = payload.find(key)
+    if start < 0:
+        return None
+    start = payload.find(b'"', payload.find(b":", start + len(key)) + 1)
+    end = payload.find(b'"', start + 1)
+    if start < 0 or end < 0:
+        return None
+    value = payload[start + 1:end]
+    return None if b"\\" in value else value
+
+
+class BusPrefilter:
+    """
+    Drops Dynalite bus messages the bridge would ignore, from the raw payload
+    bytes, before the JSON parse.
+
+    - template: looked up once per distinct template (bytes) through the
+      dispatcher's route table; templates of kinds without a handler
+      (lighting, presets, sensors) are dropped
+    - area: for handled kinds, the area field is picked out of the "fields"
+      array by position (dynet1/dynet2 layout) and checked with
+      has_area(area), i.e. against the areas in the climate state cache
+
+    Anything the cheap scan can't read (no template, escaped strings, quoted
+    or missing fields, unexpected field count) is passed on for the full
+    parse, so the handlers still see every message they could act on.
+    """
+
+    def __init__(self, dispatcher, has_area):
+        self.dispatcher = dispatcher
+        self.has_area = has_area
+        self._templates = {}    # template bytes -> {type bytes: (area index, field count)}, None = not handled
+
+        # Stats
+        self.checked = 0
+        self.passed = 0
+        self.filtered = {UNHANDLED: 0, NOT_CLIMATE: 0}
+
+    def _compile(self, template: bytes):
+        route = self.dispatcher.route(template.decode(errors="replace"))
+        if route.kind == UNKNOWN:
+            return None
+        return {type.encode(): (layout.area, layout.length) for type, layout in route.layouts.items()}
+
+    def check(self, payload) -> str:
+        """
+        Reason the message can be dropped, None to handle it.
+        """
+        return self.check_area(payload)[0]
+
+    def check_area(self, payload):
+        """
+        (reason, area) from one scan: the reason as check(), and the area of a
+        message that passes (None if unknown), for callers that need both.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.checked += 1
+        reason, area = self._check(payload)
+        if reason is None:
+            self.passed += 1
+        else:
+            self.filtered[reason] += 1
+        return reason, area
+
+    def _layouts(self, payload: bytes):
+        # (template found, layouts for it)
+        template = _string_value(payload, b'"template"')
+        if template is None:
+            return False, None
+        try:
+            return True, self._templates[template]
+        except KeyError:
+            layouts = self._templates[template] = self._compile(template)
+            return True, layouts
+
+    def _check(self, payload: bytes):
+        found, layouts = self._layouts(payload)
+        if not found:
+            return None, None
+        if layouts is None:
+            return UNHANDLED, None
+        area = self._area(payload, layouts)
+        if area is None:
+            return None, None
+        return (None, area) if self.has_area(area) else (NOT_CLIMATE, area)
+
+    def _area(self, payload: bytes, layouts):
+        layout = layouts.get(_string_value(payload, b'"type"'))
+        if layout is None:
+            return None
+        start = payload.find(b'"fields"')
+        start = payload.find(b"[", start) if start >= 0 else -1
+        end = payload.find(b"]", start) if start >= 0 else -1
+        if end < 0:
+            return None
+        fields = payload[start + 1:end].split(b",")
+        area_index, length = layout
+        if len(fields) != length:
+            return None
+        try:
+            return int(fields[area_index])
+        except ValueError:
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "passed": self.passed,
+            "filtered": dict(self.filtered),
+            "templates": len(self._templates),
+        }
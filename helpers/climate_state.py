@@ -0,0 +1,190 @@
+import math
+from array import array
+
+# Climate fields per area, in packet order
+FIELDS = ("setpoint", "current_temp", "hvac_mode", "fan_mode", "status")
+NUMERIC = ("setpoint", "current_temp")
+CODED = ("hvac_mode", "fan_mode", "status")
+FIELD_BITS = {field: 1 << i for i, field in enumerate(FIELDS)}
+
+_UNSET_NUM = math.nan
+_UNSET_CODE = -1
+
+
+def _mask_fields(mask: int):
+    return [field for field in FIELDS if mask & FIELD_BITS[field]]
+
+
+class ClimateStateTable:
+    """
+    Columnar per-area climate state.
+
+    One array per field plus an area -> row index: numeric fields are
+    array('d') with NaN for "unset", string fields (hvac_mode, fan_mode,
+    status) are interned to small codes in array('h') with -1 for "unset".
+    A per-row dirty bitmask marks fields changed from HA whose value the
+    bus hasn't acknowledged yet (mark_synced), so site-wide questions (what
+    is dirty, what would a resync send) are a scan of one column rather
+    than a walk over every area and field.
+
+    Rows are only ever appended; an area keeps its row for the process life.
+    """
+
+    __slots__ = ("_index", "_areas", "setpoint", "current_temp", "hvac_mode", "fan_mode", "status",
+                 "dirty", "_codes", "_values")
+
+    def __init__(self):
+        self._index = {}            # area -> row
+        self._areas = array("l")    # row -> area
+        self.setpoint = array("d")
+        self.current_temp = array("d")
+        self.hvac_mode = array("h")
+        self.fan_mode = array("h")
+        self.status = array("h")
+        self.dirty = array("B")
+        self._codes = {field: {} for field in CODED}    # value -> code
+        self._values = {field: [] for field in CODED}   # code -> value
+
+    # --- rows ---------------------------------------------------------------
+
+    def __contains__(self, area):
+        return area in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def areas(self):
+        return list(self._index)
+
+    def _row(self, area, create=False):
+        row = self._index.get(area)
+        if row is None and create:
+            row = self._index[area] = len(self._areas)
+            self._areas.append(area)
+            self.setpoint.append(_UNSET_NUM)
+            self.current_temp.append(_UNSET_NUM)
+            self.hvac_mode.append(_UNSET_CODE)
+            self.fan_mode.append(_UNSET_CODE)
+            self.status.append(_UNSET_CODE)
+            self.dirty.append(0)
+        return row
+
+    # --- field encoding -----------------------------------------------------
+
+    def _encode(self, field, value):
+        if field in NUMERIC:
+            return _UNSET_NUM if value is None else float(value)
+        if value is None:
+            return _UNSET_CODE
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            values = self._values[field]
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _decode(self, field, raw):
+        if field in NUMERIC:
+            return None if math.isnan(raw) else raw
+        return None if raw == _UNSET_CODE else self._values[field][raw]
+
+    def _column(self, field):
+        return getattr(self, field)
+
+    # --- single area --------------------------------------------------------
+
+    def get(self, area):
+        """
+        State dict for an area, None if unknown.
+        """
+        if area not in self:
+            return None
+        row = self._index[area]
+        return {field: self._decode(field, self._column(field)[row]) for field in FIELDS}
+
+    def get_field(self, area, field):
+        row = self._index.get(area)
+        if row is None:
+            return None
+        return self._decode(field, self._column(field)[row])
+
+    def diff(self, area, state: dict):
+        """
+        Fields of `state` that differ from what is stored (unset counts as different).
+        """
+        row = self._index.get(area)
+        if row is None:
+            return [field for field in FIELDS if field in state]
+        changed = []
+        for field in FIELDS:
+            if field not in state:
+                continue
+            stored = self._column(field)[row]
+            if field in NUMERIC:
+                value = state[field]
+                if math.isnan(stored) or value is None or float(value) != stored:
+                    changed.append(field)
+            elif stored == _UNSET_CODE or self._values[field][stored] != state[field]:
+                changed.append(field)
+        return changed
+
+    def update(self, area, state: dict, dirty=True):
+        """
+        Store the fields in `state`; changed fields are marked dirty unless
+        dirty=False (values that came from the bus). Returns the changed fields.
+        """
+        changed = self.diff(area, state)
+        row = self._row(area, create=True)
+        mask = 0
+        for field in changed:
+            self._column(field)[row] = self._encode(field, state[field])
+            mask |= FIELD_BITS[field]
+        if dirty:
+            self.dirty[row] |= mask
+        return changed
+
+    def set_field(self, area, field, value, dirty=False):
+        return self.update(area, {field: value}, dirty=dirty)
+
+    def mark_synced(self, area, field):
+        """
+        The bus acknowledged the field's current value.
+        """
+        row = self._index.get(area)
+        if row is not None:
+            self.dirty[row] &= ~FIELD_BITS[field]
+
+    # --- bulk ---------------------------------------------------------------
+
+    def dirty_fields(self):
+        """
+        {area: [fields]} for every area with fields the bus hasn't acknowledged.
+        """
+        areas = self._areas
+        return {areas[row]: _mask_fields(mask) for row, mask in enumerate(self.dirty) if mask}
+
+    def resync_packets(self, encode, fields_by_area=None):
+        """
+        Site-wide resync packet list as (area, field, packets): encode(area,
+        field) returns the packets for the field's current value, for every
+        set field of every area or only fields_by_area (e.g. dirty_fields()).
+
+        A generator: each field is read and encoded when the caller gets to
+        it, so a paced sender never sends a value that changed meanwhile.
+        """
+        if fields_by_area is None:
+            fields_by_area = {area: FIELDS for area in self._index}
+        for area, fields in fields_by_area.items():
+            row = self._index.get(area)
+            if row is None:
+                continue
+            for field in fields:
+                if self._decode(field, self._column(field)[row]) is not None:
+                    yield area, field, encode(area, field)
+
+    def to_dict(self):
+        """
+        {area: state dict} for every known area (snapshots).
+        """
+        return {area: self.get(area) for area in self._index}
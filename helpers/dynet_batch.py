@@ -0,0 +1,94 @@
+import asyncio
+from helpers.logger import get_logger
+log = get_logger("📦")
+
+
+class DynetBatcher:
+    """
+    Groups Dynet packets bound for ${MQTT_DYNALITE_PREFIX}/set into frames.
+
+    Modes:
+      - "area":   packets added between begin_area() and end_area() are sent
+                  as one frame; packets added outside an area update (timers,
+                  trailing sends) go out straight away
+      - "window": packets added within `window` seconds of the first one are
+                  sent as one frame when the window closes
+
+    A frame carries one packet type and keeps a response id per packet so the
+    Dynalite bridge can acknowledge each packet on /set/res/<id>:
+
+        {"type": "dynet2",
+         "hex_strings": ["56 BB ...", "57 BB ..."],
+         "response_ids": ["<id1>", "<id2>"]}
+
+    A frame is also flushed early once it reaches max_packets.
+    """
+
+    MODES = ("area", "window")
+
+    def __init__(self, send_frame, mode="area", window=0.05, max_packets=32):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown batch mode {mode!r}, expected one of {self.MODES}")
+        self.send_frame = send_frame
+        self.mode = mode
+        self.window = max(0.0, float(window))
+        self.max_packets = max(1, int(max_packets))
+
+        self._frames = {}   # packet type -> (hex_strings, response_ids)
+        self._count = 0
+        self._timer = None
+        self._in_area = 0
+
+        # Stats
+        self.frames_sent = 0
+        self.packets_sent = 0
+
+    def add(self, type, hex_string, response_id):
+        hex_strings, response_ids = self._frames.setdefault(type, ([], []))
+        hex_strings.append(hex_string)
+        response_ids.append(response_id)
+        self._count += 1
+
+        if self._count >= self.max_packets or (self.mode == "area" and not self._in_area):
+            self.flush()
+        elif self.mode == "window" and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def begin_area(self):
+        self._in_area += 1
+
+    def end_area(self):
+        """
+        Marks the end of one area update; flushes in "area" mode.
+        """
+        self._in_area = max(0, self._in_area - 1)
+        if self.mode == "area" and not self._in_area:
+            self.flush()
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._frames:
+            return
+
+        frames, self._frames, self._count = self._frames, {}, 0
+        for type, (hex_strings, response_ids) in frames.items():
+            try:
+                self.send_frame({
+                    "type": type,
+                    "hex_strings": hex_strings,
+                    "response_ids": response_ids
+                })
+                self.frames_sent += 1
+                self.packets_sent += len(hex_strings)
+            except Exception as e:
+                log("❌ Failed to send batch frame of %s packets: %s", len(hex_strings), e)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "frames_sent": self.frames_sent,
+            "packets_sent": self.packets_sent,
+            "pending": self._count,
+        }
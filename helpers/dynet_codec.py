@@ -0,0 +1,139 @@
+import struct
+from collections import namedtuple
+from functools import lru_cache
+
+# Byte-level Dynet body codec.
+#
+# Same packets as the string builders in helpers/dynet_mqtt.py, but encoded with
+# one precompiled struct per opcode straight into bytes, and memoised: the bridge
+# sends the same few (area, join, channel, value) combinations over and over.
+
+OP_PRESET = 0x02
+OP_CHANNEL_LEVEL = 0x10
+OP_SETPOINT = 0x56
+OP_TEMPERATURE = 0x57   # reply to a setpoint request, used to push current temperature
+
+SUB_CHANNEL_LEVEL = 0x02
+SUB_TEMPERATURE = 0x0C
+SUB_SETPOINT = 0x0D
+
+DEVICE = 0xBB
+BOX = 8
+CACHE_SIZE = 4096
+
+# Templates per opcode, big endian:
+#   preset:        op dev box(2) area(2) preset 0xFF
+#   setpoint/temp: op dev box(2) area(2) join sub int dec 0x0000
+#   channel level: op dev box(2) area(2) join 0x02 channel(2) level 0x00 fade(3) 0x00
+_PRESET = struct.Struct(">BBHHBB")
+_DECIMAL = struct.Struct(">BBHHBBBBH")
+_CHANNEL_LEVEL = struct.Struct(">BBHHBBHBBBHB")
+
+DynetPacket = namedtuple("DynetPacket", "opcode device box area join channel value fade")
+
+
+def _decimal(value: float):
+    # Same split as float_to_dynet_decimal(): integer part + hundredths
+    value = float(value)
+    int_part = int(value)
+    return int_part & 0xFF, int(round((value - int_part) * 100)) & 0xFF
+
+
+def _level(percent) -> int:
+    # Same scale as percent_to_dynet_level(): 0-100 % -> 0-254, non numbers -> 0
+    if not isinstance(percent, (int, float)):
+        return 0
+    return int(max(0, min(int(percent), 100)) / 100 * 254)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_setpoint(area: int, join: int, setpoint: float, device=DEVICE, box=BOX) -> bytes:
+    int_part, dec_part = _decimal(setpoint)
+    return _DECIMAL.pack(OP_SETPOINT, device, box & 0xFFFF, area & 0xFFFF, int(join) & 0xFF,
+                         SUB_SETPOINT, int_part, dec_part, 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_temperature(area: int, join: int, temp: float, device=DEVICE, box=BOX) -> bytes:
+    int_part, dec_part = _decimal(temp)
+    return _DECIMAL.pack(OP_TEMPERATURE, device, box & 0xFFFF, area & 0xFFFF, int(join) & 0xFF,
+                         SUB_TEMPERATURE, int_part, dec_part, 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_channel_level(area: int, join: int, channel: int, level, fade: int = 0, device=DEVICE, box=BOX) -> bytes:
+    return _CHANNEL_LEVEL.pack(OP_CHANNEL_LEVEL, device, box & 0xFFFF, area & 0xFFFF, int(join) & 0xFF,
+                               SUB_CHANNEL_LEVEL, channel & 0xFFFF, _level(level), 0,
+                               (fade >> 16) & 0xFF, fade & 0xFFFF, 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode_preset(area: int, preset: int, device=1, box=1) -> bytes:
+    return _PRESET.pack(OP_PRESET, device, box & 0xFFFF, area & 0xFFFF, preset & 0xFF, 0xFF)
+
+
+def to_hex(data: bytes) -> str:
+    return data.hex(" ").upper()
+
+
+def from_hex(hex_string: str) -> bytes:
+    return bytes.fromhex(hex_string)
+
+
+# Hex variants, drop-in for the dynet_mqtt builders (same argument order)
+@lru_cache(maxsize=CACHE_SIZE)
+def setpoint_hex(area: int, join: int, setpoint: float, device=DEVICE, box=BOX) -> str:
+    return to_hex(encode_setpoint(area, join, setpoint, device, box))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def temperature_hex(area: int, join: int, temp: float, device=DEVICE, box=BOX) -> str:
+    return to_hex(encode_temperature(area, join, temp, device, box))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def channel_level_hex(area: int, join: int, channel: int, level, fade: int = 0, device=DEVICE, box=BOX) -> str:
+    return to_hex(encode_channel_level(area, join, channel, level, fade, device, box))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def preset_hex(area: int, preset: int, device=1, box=1) -> str:
+    return to_hex(encode_preset(area, preset, device, box))
+
+
+def decode(data) -> DynetPacket:
+    """
+    Decode a body produced by the encoders above (bytes or hex string).
+    Setpoint/temperature values come back as floats, channel levels as the
+    raw 0-254 bus level.
+    """
+    if isinstance(data, str):
+        data = from_hex(data)
+    if not data:
+        raise ValueError("Empty Dynet packet")
+
+    opcode = data[0]
+    if opcode == OP_CHANNEL_LEVEL and len(data) == _CHANNEL_LEVEL.size:
+        _, device, box, area, join, _, channel, level, _, fade_hi, fade_lo, _ = _CHANNEL_LEVEL.unpack(data)
+        return DynetPacket(opcode, device, box, area, join, channel, level, (fade_hi << 16) | fade_lo)
+    if opcode in (OP_SETPOINT, OP_TEMPERATURE) and len(data) == _DECIMAL.size:
+        _, device, box, area, join, _, int_part, dec_part, _ = _DECIMAL.unpack(data)
+        return DynetPacket(opcode, device, box, area, join, None, int_part + dec_part / 100, 0)
+    if opcode == OP_PRESET and len(data) == _PRESET.size:
+        _, device, box, area, preset, _ = _PRESET.unpack(data)
+        return DynetPacket(opcode, device, box, area, None, None, preset, 0)
+    raise ValueError(f"Unsupported Dynet packet: opcode 0x{opcode:02X}, {len(data)} bytes")
+
+
+def cache_info() -> dict:
+    return {
+        fn.__name__: fn.cache_info()._asdict()
+        for fn in (encode_setpoint, encode_temperature, encode_channel_level, encode_preset,
+                   setpoint_hex, temperature_hex, channel_level_hex, preset_hex)
+    }
+
+
+def cache_clear():
+    for fn in (encode_setpoint, encode_temperature, encode_channel_level, encode_preset,
+               setpoint_hex, temperature_hex, channel_level_hex, preset_hex):
+        fn.cache_clear()
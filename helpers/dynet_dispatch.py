@@ -0,0 +1,180 @@
+from collections import namedtuple
+from helpers.logger import get_logger
+log = get_logger("🔀")
+
+# Message kinds the climate bridge cares about
+REQUEST_SETPOINT = "request_setpoint"   # keypad asking for the current set point
+SET_SETPOINT = "set_setpoint"           # keypad/panel changing the set point
+RECALL_LEVEL = "recall_level"           # channel level, HVAC uses channels 101-103
+UNKNOWN = "unknown"
+
+# Description/template phrases per kind, checked in this order (as the old
+# substring chain did) once per distinct template
+KIND_PHRASES = (
+    (REQUEST_SETPOINT, ("request user temperature set point", "request temperature set point")),
+    (SET_SETPOINT, ("set temperature set point to",)),
+    (RECALL_LEVEL, ("recall level",)),
+)
+
+# Field layout per (kind, packet type): expected field count and positions
+Layout = namedtuple("Layout", "length area join channel value")
+LAYOUTS = {
+    (REQUEST_SETPOINT, "dynet1"): Layout(2, 0, 1, None, None),
+    (REQUEST_SETPOINT, "dynet2"): Layout(4, 2, 3, None, None),
+    (SET_SETPOINT, "dynet1"): Layout(3, 0, 1, None, 2),
+    (SET_SETPOINT, "dynet2"): Layout(5, 2, 3, None, 4),
+    (RECALL_LEVEL, "dynet1"): Layout(5, 0, 1, 2, 3),
+    (RECALL_LEVEL, "dynet2"): Layout(7, 2, 3, 4, 5),
+}
+
+# Decoded, layout-independent view of a bus message (see DynetDispatcher.decode)
+DynetMessage = namedtuple("DynetMessage", "kind type area join channel value raw")
+
+
+def classify(text: str) -> str:
+    text = str(text).lower()
+    for kind, phrases in KIND_PHRASES:
+        for phrase in phrases:
+            if phrase in text:
+                return kind
+    return UNKNOWN
+
+
+def join_value(join) -> int:
+    """
+    Join as an int; the bus reports it either as a number or as hex text ("FE").
+    """
+    if isinstance(join, int):
+        return join
+    try:
+        return int(str(join), 16)
+    except ValueError:
+        return -1
+
+
+class _Route:
+    """
+    One compiled table entry for a template: per packet type, the layout and a
+    precompiled call that pulls the fields by position straight into the kind
+    handler, handler(area, join, channel, value, dynalite).
+    """
+
+    __slots__ = ("kind", "handler", "layouts", "calls")
+
+    def __init__(self, kind, handler):
+        self.kind = kind
+        self.handler = handler
+        self.layouts = {}
+        self.calls = {}
+        if kind == UNKNOWN:
+            return
+        for (layout_kind, type), layout in LAYOUTS.items():
+            if layout_kind == kind:
+                self.layouts[type] = layout
+                self.calls[type] = _compile_call(handler, layout)
+
+
+def _compile_call(handler, layout):
+    area, join, channel, value = layout.area, layout.join, layout.channel, layout.value
+    if channel is None and value is None:
+        return lambda f, raw: handler(f[area], f[join], None, None, raw)
+    if channel is None:
+        return lambda f, raw: handler(f[area], f[join], None, f[value], raw)
+    return lambda f, raw: handler(f[area], f[join], f[channel], f[value], raw)
+
+
+class DynetDispatcher:
+    """
+    Routes decoded Dynalite bus messages to one handler per message kind.
+
+    The route table is keyed on the message template, which is the same for
+    every message of a kind, so the phrase matching runs once per template and
+    every later message is a single dict lookup. Kinds we handle then pick the
+    field layout for the packet type (dynet1/dynet2) and extract fields by
+    fixed position. Messages without a template fall back to classifying their
+    description (uncached).
+
+    handlers: {kind: fn(area, join, channel, value, dynalite)}, unknown kinds
+    go to `fallback(dynalite)`, malformed messages (wrong field count/type) to
+    `invalid(dynalite)`.
+
+    echo: optional fn(kind, area, join, channel, value) -> bool, checked
+    before the handler; True drops the message (our own packet coming back).
+    """
+
+    def __init__(self, handlers, fallback, invalid, echo=None):
+        self.handlers = handlers
+        self.fallback = fallback
+        self.invalid = invalid
+        self.echo = echo
+        self._routes = {}
+        self.compiled = 0
+        self.dispatch = self._build_dispatch()
+
+    def _compile(self, text) -> _Route:
+        kind = classify(text)
+        handler = self.handlers.get(kind)
+        if handler is None:
+            return _Route(UNKNOWN, self.fallback)
+        return _Route(kind, handler)
+
+    def route(self, template, description="") -> _Route:
+        if not template:
+            return self._compile(description)
+        route = self._routes.get(template)
+        if route is None:
+            route = self._routes[template] = self._compile(template)
+            self.compiled += 1
+        return route
+
+    def decode(self, route, dynalite):
+        """
+        DynetMessage for a routed message, None when type/fields don't match a layout.
+        """
+        type = dynalite.get("type")
+        layout = route.layouts.get(type)
+        fields = dynalite.get("fields") or ()
+        if layout is None or len(fields) != layout.length:
+            return None
+        return DynetMessage(
+            route.kind, type, fields[layout.area], fields[layout.join],
+            None if layout.channel is None else fields[layout.channel],
+            None if layout.value is None else fields[layout.value],
+            dynalite
+        )
+
+    def _build_dispatch(self):
+        # Closure over locals: this runs for every message on the bus
+        routes = self._routes
+        route_slow = self.route
+        invalid = self.invalid
+        echo = self.echo
+
+        def dispatch(dynalite):
+            try:
+                route = routes[dynalite["template"]]
+            except (KeyError, TypeError):
+                route = route_slow(dynalite.get("template"), dynalite.get("description", ""))
+
+            if route.kind == UNKNOWN:
+                return route.handler(dynalite)
+            type = dynalite.get("type")
+            layout = route.layouts.get(type)
+            fields = dynalite.get("fields") or ()
+            if layout is None or len(fields) != layout.length:
+                return invalid(dynalite)
+            if echo is not None and echo(
+                route.kind, fields[layout.area], fields[layout.join],
+                None if layout.channel is None else fields[layout.channel],
+                None if layout.value is None else fields[layout.value]
+            ):
+                return None
+            return route.calls[type](fields, dynalite)
+
+        return dispatch
+
+    def stats(self) -> dict:
+        kinds = {}
+        for route in self._routes.values():
+            kinds[route.kind] = kinds.get(route.kind, 0) + 1
+        return {"routes": len(self._routes), "compiled": self.compiled, "routes_per_kind": kinds}
@@ -1,5 +1,5 @@
-from datetime import datetime
-def log(msg): print(f"{datetime.now().strftime('%H:%M:%S')} 🧠 {msg}")
+from helpers.logger import get_logger
+log = get_logger("🧠")
 
 def float_to_q7_8(temp: float) -> tuple[int, int]:
     try:
@@ -7,7 +7,7 @@ def float_to_q7_8(temp: float) -> tuple[int, int]:
         raw = int(temp * 256)
         return (raw >> 8) & 0xFF, raw & 0xFF
     except Exception as e:
-        log(f"❌ float_to_q7_8 error: {e}")
+        log.error(f"❌ float_to_q7_8 error: {e}")
         return 0, 0
 
 
@@ -18,7 +18,7 @@ def float_to_dynet_decimal(temp: float) -> tuple[int, int]:
         decimal_part = int(round((temp - int_part) * 100))
         return int_part & 0xFF, decimal_part & 0xFF
     except Exception as e:
-        log(f"❌ float_to_dynet_decimal error: {e}")
+        log.error(f"❌ float_to_dynet_decimal error: {e}")
         return 0, 0
 
 
@@ -42,7 +42,7 @@ def build_area_setpoint_body(area: int, join: int, setpoint: float, device=0xBB,
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_area_setpoint_body error: {e}")
+        log.error(f"❌ build_area_setpoint_body error: {e}")
         return None
 
 
@@ -66,7 +66,7 @@ def build_area_temperature_body(area: int, join: int, temp: float, device=0xBB,
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_area_temperature_body error: {e}")
+        log.error(f"❌ build_area_temperature_body error: {e}")
         return None
 
 
@@ -87,7 +87,7 @@ def build_area_preset_body(area: int, preset: int, device=1, box=1) -> str:
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_area_preset_body error: {e}")
+        log.error(f"❌ build_area_preset_body error: {e}")
         return None
 
 
@@ -98,7 +98,7 @@ def percent_to_dynet_level(percent: int) -> int:
         percent = max(0, min(int(percent), 100))
         return int(percent / 100 * 254)
     except Exception as e:
-        log(f"❌ percent_to_dynet_level error: {e}")
+        log.error(f"❌ percent_to_dynet_level error: {e}")
         return 0
 
 
@@ -131,5 +131,5 @@ def build_channel_level_body(area: int, channel: int, level: int,join: int, fade
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_channel_level_body error: {e}")
+        log.error(f"❌ build_channel_level_body error: {e}")
         return None
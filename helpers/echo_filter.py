@@ -0,0 +1,115 @@
+import time
+from collections import deque
+from functools import lru_cache
+from helpers import dynet_codec
+from helpers.dynet_dispatch import SET_SETPOINT, RECALL_LEVEL, join_value
+from helpers.logger import get_logger
+log = get_logger("🪞")
+
+
+@lru_cache(maxsize=dynet_codec.CACHE_SIZE)
+def packet_fingerprint(hex_string: str):
+    """
+    Fingerprint of a packet we send, in the form the bus reports it back;
+    None for packets that never come back as a message we handle.
+    """
+    try:
+        packet = dynet_codec.decode(hex_string)
+    except ValueError:
+        return None
+    if packet.opcode == dynet_codec.OP_SETPOINT:
+        return hash((SET_SETPOINT, packet.area, packet.join, None, round(packet.value, 2)))
+    if packet.opcode == dynet_codec.OP_CHANNEL_LEVEL:
+        return hash((RECALL_LEVEL, packet.area, packet.join, packet.channel, packet.value))
+    return None
+
+
+def message_fingerprint(kind, area, join, channel, value):
+    """
+    Fingerprint of a decoded bus message, comparable with packet_fingerprint().
+    """
+    try:
+        if kind == SET_SETPOINT:
+            return hash((kind, int(area), join_value(join), None, round(float(value), 2)))
+        if kind == RECALL_LEVEL:
+            # The bus reports levels in %, we send the raw 0-254 level
+            level = dynet_codec._level(int(str(value).strip("%")))
+            return hash((kind, int(area), join_value(join), int(channel), level))
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class EchoFilter:
+    """
+    Fingerprints of the packets we sent in the last `ttl` seconds, so the bus
+    reporting them back can be dropped before any handler runs, whatever
+    join they were sent on.
+
+    Fingerprints are ints (hash of kind, area, join, channel, value) in a
+    dict with a deque of deadlines in send order for expiry; at most
+    `max_entries` are kept, oldest dropped first. Each send swallows one
+    echo: a fingerprint counts its sends within the ttl and a match uses
+    one up, so a real repeat of the same value after the echo gets through.
+    """
+
+    def __init__(self, ttl=5.0, max_entries=4096):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self._seen = {}         # fingerprint -> [deadline, echoes expected]
+        self._order = deque()   # (deadline, fingerprint)
+
+        # Stats
+        self.recorded = 0
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self._seen)
+
+    def sent(self, hex_string):
+        fingerprint = packet_fingerprint(hex_string)
+        if fingerprint is None:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        deadline = now + self.ttl
+        seen = self._seen.get(fingerprint)
+        if seen is None:
+            self._seen[fingerprint] = [deadline, 1]
+        else:
+            seen[0] = deadline
+            seen[1] += 1
+        self._order.append((deadline, fingerprint))
+        self.recorded += 1
+        while len(self._order) > self.max_entries:
+            self._forget(*self._order.popleft())
+
+    def _forget(self, deadline, fingerprint):
+        # Only if it wasn't refreshed by a later send
+        seen = self._seen.get(fingerprint)
+        if seen is not None and seen[0] == deadline:
+            del self._seen[fingerprint]
+
+    def _expire(self, now):
+        order = self._order
+        while order and order[0][0] <= now:
+            self._forget(*order.popleft())
+
+    def is_echo(self, kind, area, join, channel, value) -> bool:
+        if not self._seen:
+            return False
+        fingerprint = message_fingerprint(kind, area, join, channel, value)
+        seen = self._seen.get(fingerprint)
+        if seen is None:
+            return False
+        if seen[0] <= time.monotonic():
+            self._expire(time.monotonic())
+            return False
+        seen[1] -= 1
+        if not seen[1]:
+            del self._seen[fingerprint]
+        self.suppressed += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._seen), "recorded": self.recorded, "suppressed": self.suppressed}
@@ -0,0 +1,51 @@
+import json
+from helpers.logger import get_logger
+log = get_logger("🧩")
+
+# JSON for MQTT payloads: orjson when installed, stdlib otherwise.
+#
+#   loads(bytes | str) -> object
+#   dumps(object) -> bytes | str (compact; paho publishes either)
+#
+# Select with use("auto" | "orjson" | "stdlib"); "auto" is the default.
+
+BACKENDS = ("auto", "orjson", "stdlib")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_stdlib_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _stdlib_dumps(obj):
+    return _stdlib_encoder.encode(obj)
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, default=str)
+
+
+backend = "stdlib"
+loads = json.loads
+dumps = _stdlib_dumps
+
+
+def use(name="auto") -> str:
+    """
+    Switch backend; returns the backend in use.
+    """
+    global backend, loads, dumps
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of {', '.join(BACKENDS)}")
+    if name == "orjson" and orjson is None:
+        log("⚠️ JSON_CODEC=orjson but orjson is not installed, using stdlib json")
+    if name != "stdlib" and orjson is not None:
+        backend, loads, dumps = "orjson", orjson.loads, _orjson_dumps
+    else:
+        backend, loads, dumps = "stdlib", json.loads, _stdlib_dumps
+    return backend
+
+
+use("auto")
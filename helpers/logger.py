@@ -0,0 +1,275 @@
+import atexit
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import SimpleQueue, Empty
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+# Module state, set by configure()
+_level = INFO           # lowest level written to stdout
+_ring_level = INFO      # lowest level kept in the ring buffer
+_record_level = INFO    # lowest level kept at all (stdout or ring buffer)
+_ring = deque(maxlen=500)
+_queue = None           # SimpleQueue when the background writer runs
+_queue_max = 10000
+_writer = None
+_limits = OrderedDict() # key -> [next_allowed, suppressed, count], least recently used first
+_limits_max = 1024
+
+# Stats
+dropped = 0
+written = 0
+suppressed = 0
+
+
+def parse_level(level) -> int:
+    if isinstance(level, int):
+        return level
+    try:
+        return LEVELS[str(level).upper()]
+    except KeyError:
+        raise ValueError(f"Unknown log level {level!r}, expected one of {', '.join(LEVELS)}")
+
+
+def _format(record) -> str:
+    ts, level, emoji, msg, args = record
+    if args:
+        try:
+            msg = msg % args
+        except Exception as e:
+            msg = f"{msg} {args!r} (format error: {e})"
+    return f"{time.strftime('%H:%M:%S', time.localtime(ts))} {emoji} {msg}"
+
+
+def _emit(record):
+    global dropped, written
+    if _ring_level is not None and record[1] >= _ring_level:
+        _ring.append(record)
+    if record[1] < _level:
+        return
+    if _queue is None:
+        # No writer thread (tools/benchmarks), write inline
+        print(_format(record))
+        written += 1
+    elif _queue.qsize() < _queue_max:
+        _queue.put(record)
+    else:
+        dropped += 1
+
+
+def _write_loop(queue):
+    global written
+    out = sys.stdout
+    while True:
+        record = queue.get()
+        if record is None:
+            return
+        lines = [_format(record)]
+        # Drain whatever else is queued into one write
+        try:
+            while len(lines) < 256:
+                record = queue.get_nowait()
+                if record is None:
+                    queue.put(None)
+                    break
+                lines.append(_format(record))
+        except Empty:
+            pass
+        try:
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+        except Exception:
+            pass
+        written += len(lines)
+
+
+def configure(level=INFO, ring_size=500, ring_level=None, background=True, queue_size=10000, limit_keys=1024):
+    """
+    level: lowest level written to stdout
+    ring_size/ring_level: recent records kept in memory for dump_recent()
+        (ring_level defaults to level, so with DEBUG off debug calls cost one compare)
+    background: write stdout from a daemon thread instead of the caller
+    limit_keys: every()/sample() keys remembered; the least recently used go first
+    """
+    global _ring_level, _ring, _queue_max, _limits_max
+    _ring_level = None if not ring_size else parse_level(level) if ring_level is None else parse_level(ring_level)
+    _ring = deque(_ring, maxlen=max(1, int(ring_size)))
+    set_level(level)
+    _queue_max = max(1, int(queue_size))
+    _limits_max = max(1, int(limit_keys))
+    while len(_limits) > _limits_max:
+        _limits.popitem(last=False)
+    if background:
+        start_writer()
+    else:
+        stop_writer()
+
+
+def start_writer():
+    global _queue, _writer
+    if _writer is not None:
+        return
+    _queue = SimpleQueue()
+    _writer = threading.Thread(target=_write_loop, args=(_queue,), name="log-writer", daemon=True)
+    _writer.start()
+
+
+def stop_writer(timeout=2.0):
+    """
+    Flush what is queued and stop the writer; later records are written inline.
+    """
+    global _queue, _writer
+    if _writer is None:
+        return
+    queue, writer = _queue, _writer
+    _queue = _writer = None
+    queue.put(None)
+    writer.join(timeout)
+
+
+atexit.register(stop_writer)
+
+
+def set_level(level):
+    global _level, _record_level
+    _level = parse_level(level)
+    _record_level = _level if _ring_level is None else min(_level, _ring_level)
+
+
+def get_level() -> int:
+    return _level
+
+
+def is_enabled(level) -> bool:
+    return level >= _level
+
+
+def recent(n=None) -> list:
+    """
+    Formatted lines from the ring buffer, oldest first.
+    """
+    records = list(_ring)
+    if n is not None:
+        records = records[-n:]
+    return [_format(record) for record in records]
+
+
+def dump_recent(n=None, out=None):
+    out = out or sys.stderr
+    lines = recent(n)
+    out.write(f"----- last {len(lines)} log record(s) -----\n")
+    out.write("\n".join(lines) + "\n")
+    out.flush()
+
+
+def stats() -> dict:
+    return {
+        "level": _level,
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "written": written,
+        "dropped": dropped,
+        "ring": len(_ring),
+        "suppressed": suppressed,
+        "limit_keys": len(_limits),
+    }
+
+
+def _limit(key):
+    limit = _limits.get(key)
+    if limit is None:
+        if len(_limits) >= _limits_max:
+            # A key evicted with lines still suppressed starts over; the total stays in `suppressed`
+            _limits.popitem(last=False)
+        limit = _limits[key] = [0.0, 0, 0]
+    else:
+        _limits.move_to_end(key)
+    return limit
+
+
+def _suppress(limit):
+    global suppressed
+    limit[1] += 1
+    suppressed += 1
+
+
+class Logger:
+    """
+    Per-module logger, called like the old print-based log(msg).
+
+    Formatting is lazy: log.debug("Area %s -> %s", area, value) only builds
+    the string when the record is written (on the writer thread). Records
+    below the configured level return after one comparison.
+
+    every(key, seconds, ...) and sample(key, n, ...) thin out repetitive
+    lines; the number of suppressed lines is appended to the next one let
+    through. Their keys live in an LRU table (configure(limit_keys=...)), so
+    keys built from areas/topics don't grow it without bound.
+    """
+
+    __slots__ = ("emoji",)
+
+    def __init__(self, emoji):
+        self.emoji = emoji
+
+    def __call__(self, msg, *args, level=INFO):
+        if level >= _record_level:
+            _emit((time.time(), level, self.emoji, msg, args))
+
+    def debug(self, msg, *args):
+        if DEBUG >= _record_level:
+            _emit((time.time(), DEBUG, self.emoji, msg, args))
+
+    def info(self, msg, *args):
+        if INFO >= _record_level:
+            _emit((time.time(), INFO, self.emoji, msg, args))
+
+    def warning(self, msg, *args):
+        if WARNING >= _record_level:
+            _emit((time.time(), WARNING, self.emoji, msg, args))
+
+    def error(self, msg, *args):
+        if ERROR >= _record_level:
+            _emit((time.time(), ERROR, self.emoji, msg, args))
+
+    def every(self, key, seconds, msg, *args, level=INFO):
+        """
+        At most one line per `seconds` for `key`.
+        """
+        if level < _record_level:
+            return
+        now = time.monotonic()
+        limit = _limit(key)
+        if now < limit[0]:
+            _suppress(limit)
+            return
+        limit[0] = now + seconds
+        self._let_through(limit, msg, args, level)
+
+    def sample(self, key, n, msg, *args, level=INFO):
+        """
+        One line in every `n` for `key`.
+        """
+        if level < _record_level:
+            return
+        limit = _limit(key)
+        limit[2] += 1
+        if n > 1 and limit[2] % n != 1:
+            _suppress(limit)
+            return
+        self._let_through(limit, msg, args, level)
+
+    def _let_through(self, limit, msg, args, level):
+        if limit[1]:
+            msg = f"{msg} (+{limit[1]} suppressed)"
+            limit[1] = 0
+        _emit((time.time(), level, self.emoji, msg, args))
+
+
+def get_logger(emoji) -> Logger:
+    return Logger(emoji)
@@ -0,0 +1,327 @@
+import asyncio
+import time
+from collections import deque
+from helpers.logger import get_logger, WARNING
+from helpers.stats import Histogram
+log = get_logger("📥")
+
+# Shard key for messages that must be ordered against every shard
+BARRIER = object()
+# Shard key for messages the key function already found not worth queueing
+DROP = object()
+
+
+class MessageQueue:
+    """
+    Bounded hand-off between the paho network thread and the asyncio loop.
+
+    paho calls submit_threadsafe() from its loop_start() thread; the message is
+    handed to the event loop with call_soon_threadsafe() and queued, so the
+    network thread only pays for an enqueue. Async consumer tasks pull from the
+    queue and run the (synchronous) handler on the event loop, yielding to the
+    loop after every message so a backlog never holds it for long.
+
+    Backpressure: the queue is bounded. When it is full the configured policy
+    decides what is lost:
+      - "drop_oldest": evict the oldest queued message, keep the new one
+                       (HA state and bus events are level based, newest wins)
+      - "drop_newest": keep the queue as is and discard the new message
+
+    recorder: optional TrafficRecorder, every message submitted (dropped or
+    not) is recorded on the loop, never on the network thread.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest")
+
+    def __init__(self, handler, maxsize=1000, policy="drop_oldest", workers=1, name="Inbound queue", recorder=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {self.POLICIES}")
+        self.handler = handler
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.workers = max(1, int(workers))
+        self.recorder = recorder
+
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+
+        # Stats
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.handle_total = 0.0
+        self.latency = Histogram()  # queued -> handled
+
+    def start(self):
+        """
+        Bind to the running loop and spawn the consumer tasks.
+        Must be called from inside the event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._consume(), name=f"mqtt-consumer-{self.name}-{i}")
+            for i in range(self.workers)
+        ]
+        return self._tasks
+
+    def submit_threadsafe(self, topic, payload):
+        """
+        Called from the paho network thread. Never blocks.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.submit, topic, payload)
+
+    def submit(self, topic, payload):
+        """
+        Enqueue a message. Must run on the event loop thread.
+        """
+        if self.recorder:
+            self.recorder.record(topic, payload)
+        self.received += 1
+        item = (topic, payload, time.monotonic())
+        queue = self._queue
+        if queue.full():
+            if self.policy == "drop_newest":
+                self._drop(topic)
+                return
+            try:
+                dropped_topic = queue.get_nowait()[0]
+                queue.task_done()
+                self._drop(dropped_topic)
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(item)
+        depth = queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def _drop(self, topic):
+        self.dropped += 1
+        # Log the first drop and then every 100th so a flood doesn't flood the log as well
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            log("⚠️ %s full (%s), policy %s — dropped %s so far (last: %s)", self.name, self.maxsize, self.policy, self.dropped, topic)
+
+    async def _consume(self):
+        queue = self._queue
+        while True:
+            topic, payload, queued_at = await queue.get()
+            started = time.monotonic()
+            try:
+                self.handler(topic, payload)
+            except Exception as e:
+                self.errors += 1
+                log("❌ Handler error for %s: %s", topic, e)
+            finally:
+                done = time.monotonic()
+                self.wait_total += started - queued_at
+                self.handle_total += done - started
+                self.latency.observe(done - queued_at)
+                self.processed += 1
+                queue.task_done()
+            # get() on a non-empty queue doesn't suspend: give timers, the
+            # outbound drain and other consumers a turn between messages
+            await asyncio.sleep(0)
+
+    async def drained(self):
+        """
+        Wait until every queued message has been handled.
+        """
+        await self._queue.join()
+
+    async def join(self):
+        """
+        Wait for all consumer tasks (they only end on cancellation).
+        """
+        await asyncio.gather(*self._tasks)
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> dict:
+        processed = self.processed or 1
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.wait_total / processed * 1000, 3),
+            "avg_handle_ms": round(self.handle_total / processed * 1000, 3),
+            "p99_ms": round(self.latency.quantile(0.99) * 1000, 3),
+        }
+
+
+class ShardedMessageQueue:
+    """
+    MessageQueue split into `shards` queues by area, one consumer each: a
+    fairness option, not a way to scale. Every shard runs on the one event
+    loop and shares all bridge state, so there is no parallelism and no
+    extra throughput (MSG_SHARDS defaults to 1, a plain MessageQueue).
+
+    key(topic, payload) returns the message's area (None for messages that
+    belong to no area, e.g. unknown topics, which go to shard 0); the shard
+    is hash(area) % shards. Messages of one area always land on the same
+    shard and are handled in arrival order. Each shard has its own bound
+    and drop policy, so a burst for one area (a site resend, a flapping
+    unit) only drops messages of its own shard; consumers take turns one
+    message at a time, so the burst delays other shards by one message per
+    round rather than by the whole backlog.
+
+    key() returns BARRIER for messages that change state every area depends
+    on (bridge status): the barrier waits until all shards have drained,
+    is handled on its own, and messages that arrived after it are held and
+    only reach their shards once it has been handled. Handling order
+    therefore matches arrival order wherever it matters across areas, at
+    the cost of draining every shard per barrier. key() returns DROP for a
+    message it already knows won't be handled (counted as filtered).
+
+    The costs: key() runs for every message at enqueue, so it has to be
+    cheap and must not change bridge state. Shards are not state
+    partitions; the state the handlers touch (state cache, pending
+    responses, limiter, retries) is shared and needs no locks only because
+    every handler runs on the loop thread.
+    """
+
+    def __init__(self, handler, key, shards=4, maxsize=1000, policy="drop_oldest", recorder=None):
+        self.handler = handler
+        self.key = key
+        self.recorder = recorder
+        self.shards = [
+            MessageQueue(handler, maxsize=maxsize, policy=policy, workers=1, name=f"Inbound shard {i}")
+            for i in range(max(1, int(shards)))
+        ]
+        self.maxsize = self.shards[0].maxsize * len(self.shards)
+        self.policy = policy
+        self._loop = None
+        self._held = deque()    # (topic, payload, area), a barrier first
+        self._wakeup = None
+        self._task = None
+        self.key_errors = 0
+        self.barriers = 0
+        self.held_dropped = 0
+        self.filtered = 0
+        self.errors = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        tasks = []
+        for shard in self.shards:
+            tasks.extend(shard.start())
+        self._task = asyncio.create_task(self._barriers(), name="mqtt-consumer-barriers")
+        tasks.append(self._task)
+        return tasks
+
+    def submit_threadsafe(self, topic, payload):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.submit, topic, payload)
+
+    def _area(self, topic, payload):
+        try:
+            return self.key(topic, payload)
+        except Exception as e:
+            self.key_errors += 1
+            log.every("shard_key", 60, "⚠️ Failed to pick a shard for %s: %s", topic, e, level=WARNING)
+            return None
+
+    def _shard(self, area) -> MessageQueue:
+        if area is None:
+            return self.shards[0]
+        return self.shards[hash(area) % len(self.shards)]
+
+    def shard_for(self, topic, payload) -> MessageQueue:
+        area = self._area(topic, payload)
+        return self.shards[0] if area is BARRIER or area is DROP else self._shard(area)
+
+    def submit(self, topic, payload):
+        if self.recorder:
+            self.recorder.record(topic, payload)
+        area = self._area(topic, payload)
+        if area is DROP:
+            self.filtered += 1
+            return
+        if area is BARRIER or self._held:
+            # Behind a barrier, wait for it in arrival order
+            if len(self._held) >= self.maxsize:
+                self.held_dropped += 1
+                log.every("held_full", 60, "⚠️ Messages held behind a barrier full (%s), dropped %s so far (last: %s)",
+                          self.maxsize, self.held_dropped, topic, level=WARNING)
+                return
+            self._held.append((topic, payload, area))
+            self._wakeup.set()
+            return
+        self._shard(area).submit(topic, payload)
+
+    async def _barriers(self):
+        held = self._held
+        while True:
+            if not held:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # Everything that arrived before the barrier is handled first
+            await asyncio.gather(*(shard.drained() for shard in self.shards))
+            topic, payload, _ = held.popleft()
+            self.barriers += 1
+            try:
+                self.handler(topic, payload)
+            except Exception as e:
+                self.errors += 1
+                log("❌ Handler error for %s: %s", topic, e)
+            # Release what arrived after it, up to the next barrier
+            while held and held[0][2] is not BARRIER:
+                topic, payload, area = held.popleft()
+                self._shard(area).submit(topic, payload)
+
+    def stop(self):
+        for shard in self.shards:
+            shard.stop()
+        if self._task:
+            self._task.cancel()
+
+    @property
+    def dropped(self) -> int:
+        return sum(shard.dropped for shard in self.shards) + self.held_dropped
+
+    def depth(self) -> int:
+        return sum(shard.depth() for shard in self.shards) + len(self._held)
+
+    def shard_depths(self) -> dict:
+        return {str(i): shard.depth() for i, shard in enumerate(self.shards)}
+
+    def stats(self) -> dict:
+        shards = [shard.stats() for shard in self.shards]
+        processed = sum(shard.processed for shard in self.shards) or 1
+        return {
+            "depth": self.depth(),
+            "max_depth": max(s["max_depth"] for s in shards),
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "received": sum(s["received"] for s in shards),
+            "processed": sum(s["processed"] for s in shards),
+            "dropped": self.dropped,
+            "errors": sum(s["errors"] for s in shards) + self.errors,
+            "barriers": self.barriers,
+            "filtered": self.filtered,
+            "held": len(self._held),
+            "avg_wait_ms": round(sum(shard.wait_total for shard in self.shards) / processed * 1000, 3),
+            "avg_handle_ms": round(sum(shard.handle_total for shard in self.shards) / processed * 1000, 3),
+            "shards": shards,
+        }
@@ -0,0 +1,167 @@
+import asyncio
+from helpers.logger import get_logger
+from helpers.stats import Histogram, LATENCY_BUCKETS
+log = get_logger("📈")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter, optionally with labels: inc("101") / inc().
+    """
+
+    __slots__ = ("name", "help", "labelnames", "values")
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class HistogramFamily:
+    """
+    One Histogram per label value. Can also wrap an existing
+    {label value: Histogram} dict owned by another component.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelname, buckets=LATENCY_BUCKETS, source=None):
+        self.name = name
+        self.help = help
+        self.labelname = labelname
+        self.buckets = buckets
+        self.source = source if source is not None else {}
+
+    def observe(self, label, value: float):
+        hist = self.source.get(label)
+        if hist is None:
+            hist = self.source[label] = Histogram(self.buckets)
+        hist.observe(value)
+
+    def samples(self):
+        for label, hist in list(self.source.items()):
+            for bound, count in hist.cumulative():
+                yield f"{self.name}_bucket", _labels((self.labelname, "le"), (label, _num(bound))), count
+            yield f"{self.name}_sum", _labels((self.labelname,), (label,)), hist.sum
+            yield f"{self.name}_count", _labels((self.labelname,), (label,)), hist.count
+
+
+class Collector:
+    """
+    Values read at scrape time from a callback returning either a number or a
+    {label values tuple: number} dict.
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), type="gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.type = type
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            yield self.name, "", values
+            return
+        for labels, value in values.items():
+            if not isinstance(labels, tuple):
+                labels = (labels,)
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labelnames))
+
+    def histogram(self, name, help, labelname, buckets=LATENCY_BUCKETS, source=None) -> HistogramFamily:
+        return self._add(HistogramFamily(self.prefix + name, help, labelname, buckets, source))
+
+    def gauge(self, name, help, fn, labelnames=()) -> Collector:
+        return self._add(Collector(self.prefix + name, help, fn, labelnames, "gauge"))
+
+    def counter_fn(self, name, help, fn, labelnames=()) -> Collector:
+        return self._add(Collector(self.prefix + name, help, fn, labelnames, "counter"))
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format 0.0.4.
+        """
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                log("❌ Metric %s failed: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_num(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+async def _serve(registry, reader, writer):
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain headers, nothing in them matters here
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body, ctype = "200 OK", registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            status, body, ctype = "404 Not Found", b"not found\n", "text/plain"
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        log(f"❌ Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(registry, host="0.0.0.0", port=9108):
+    """
+    Minimal HTTP server on the running asyncio loop, serving GET /metrics.
+    """
+    server = await asyncio.start_server(lambda r, w: _serve(registry, r, w), host, port)
+    log(f"Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,334 @@
+import asyncio
+import time
+from collections import OrderedDict
+from helpers.logger import get_logger
+from helpers.stats import Histogram
+log = get_logger("🚦")
+
+# Priority classes, lower goes first
+INTERACTIVE = 0     # user setpoint, mode, fan
+ONOFF = 1           # on/off
+BACKGROUND = 2      # status, current temperature
+CLASS_NAMES = ("interactive", "onoff", "background")
+
+KIND_PRIORITY = {
+    "setpoint": INTERACTIVE,
+    "102": INTERACTIVE,
+    "103": INTERACTIVE,
+    "101": ONOFF,
+    "105": BACKGROUND,
+    "temp": BACKGROUND,
+}
+
+# Bytes a packet occupies on the bus. Dynet1 packets are a fixed 8 bytes;
+# Dynet2 adds a header (sync, length, ...) and checksum around the body.
+DYNET1_FRAME = 8
+DYNET2_OVERHEAD = 4
+
+
+def frame_size(type, hex_string) -> int:
+    if type == "dynet1":
+        return DYNET1_FRAME
+    return (len(hex_string) + 1) // 3 + DYNET2_OVERHEAD
+
+
+def bus_bytes_per_second(baud=9600, share=0.5) -> float:
+    # 8N1 framing, 10 bits on the wire per byte
+    return baud / 10 * share
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def take(self, n, now=None) -> float:
+        """
+        Take n tokens if available and return 0, otherwise take nothing and
+        return the seconds until n tokens will be there.
+
+        A request larger than the burst can never be covered, so it goes
+        through once the bucket is full and leaves it in debt: the packets
+        after it wait for the difference and the long-run rate holds.
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        need = min(n, self.burst)
+        if self.tokens >= need:
+            self.tokens -= n
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+
+class AimdWindow:
+    """
+    Limit on unacknowledged /set commands, adapted from ack feedback (AIMD).
+
+    - every ack within `latency_target` grows the window by 1/window
+      (about +1 per window's worth of acks)
+    - an expiry, a failed ack, or an ack slower than `latency_target` halves
+      it, at most once per `cooldown` seconds so one slow burst counts once
+    Bounded by [minimum, maximum].
+    """
+
+    __slots__ = ("size", "minimum", "maximum", "latency_target", "cooldown", "srtt",
+                 "_last_decrease", "increases", "decreases")
+
+    def __init__(self, initial=8, minimum=1, maximum=64, latency_target=1.0, cooldown=1.0):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.size = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = float(latency_target)
+        self.cooldown = float(cooldown)
+        self.srtt = None
+        self._last_decrease = -1e9
+
+        # Stats
+        self.increases = 0
+        self.decreases = 0
+
+    def can_send(self, in_flight) -> bool:
+        return in_flight < int(self.size)
+
+    def on_ack(self, latency):
+        self.srtt = latency if self.srtt is None else 0.875 * self.srtt + 0.125 * latency
+        if self.latency_target and latency > self.latency_target:
+            self._decrease()
+            return
+        if self.size < self.maximum:
+            self.size = min(self.maximum, self.size + 1.0 / self.size)
+            self.increases += 1
+
+    def on_loss(self):
+        # Expired or failed command
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.cooldown, self.srtt or 0.0):
+            return
+        self._last_decrease = now
+        self.size = max(float(self.minimum), self.size / 2)
+        self.decreases += 1
+
+    def stats(self) -> dict:
+        return {
+            "window": int(self.size),
+            "srtt_ms": None if self.srtt is None else round(self.srtt * 1000, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class OutboundPacket:
+    __slots__ = ("type", "hex_string", "kind", "area", "comment", "priority", "size", "queued_at", "attempt", "seq")
+
+    def __init__(self, type, hex_string, kind, area, comment, priority, size, queued_at, attempt=1, seq=0):
+        self.type = type
+        self.hex_string = hex_string
+        self.kind = kind
+        self.area = area
+        self.comment = comment
+        self.priority = priority
+        self.size = size
+        self.queued_at = queued_at
+        self.attempt = attempt
+        self.seq = seq
+
+
+class OutboundScheduler:
+    """
+    Priority queue in front of ${MQTT_DYNALITE_PREFIX}/set.
+
+    Packets are queued per priority class (interactive > on/off > background)
+    and drained highest class first, paced by a token bucket sized in bus
+    bytes per second, so a site-wide temperature/status refresh can't hold up
+    a user's setpoint change. Within a class packets keep their order.
+
+    The area of the packet picked next goes out as a whole: every packet
+    queued for that area, whatever its class, is sent back to back in the
+    order it was submitted (on/off before mode, as the climate handler
+    queues them) and counts against the bucket and the window as one unit.
+    Queued packets are also indexed per area, so picking an area's packets
+    costs the size of the area, not of the whole backlog.
+
+    Queued packets are keyed by (area, kind): a newer packet for the same
+    key replaces the one still waiting (last writer wins) and keeps its
+    place in the queue, so spinning a dial sends the final setpoint only.
+    A retry (attempt > 1) never replaces a queued packet with a different
+    value, the queued one is newer. Packets without an area are never
+    coalesced.
+
+    rate=None/0 disables the budget (priority ordering only).
+    window/in_flight: optional AimdWindow and a callable returning the number
+    of unacknowledged commands; when the window can't take the next area's
+    packets the queue waits for wake() (ack, expiry) instead of overrunning
+    the gateway. An area with more packets than the window goes out once
+    nothing is in flight.
+    begin_burst/end_burst wrap the packets of one area (used to close batch
+    frames, one frame per area update).
+    """
+
+    def __init__(self, send, rate=None, burst=64, window=None, in_flight=None, begin_burst=None, end_burst=None):
+        self.send = send
+        self.bucket = TokenBucket(rate, max(burst, DYNET1_FRAME)) if rate else None
+        self.window = window if in_flight else None
+        self.in_flight = in_flight
+        self.begin_burst = begin_burst
+        self.end_burst = end_burst
+        self._queues = tuple(OrderedDict() for _ in CLASS_NAMES)    # key -> packet
+        self._by_area = {}      # area -> OrderedDict(kind -> packet), in submission order
+        self._depth = 0
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        # Stats
+        self.sent = [0] * len(CLASS_NAMES)
+        self.coalesced = [0] * len(CLASS_NAMES)
+        self.bytes_sent = 0
+        self.window_waits = 0
+        self.wait = {name: Histogram() for name in CLASS_NAMES}
+
+    def start(self):
+        self._task = asyncio.create_task(self._drain(), name="dynet-outbound")
+        return self._task
+
+    def submit(self, type, hex_string, kind="", area=None, comment="", attempt=1):
+        priority = KIND_PRIORITY.get(kind, BACKGROUND)
+        self._seq += 1
+        packet = OutboundPacket(type, hex_string, kind, area, comment, priority,
+                                frame_size(type, hex_string), time.monotonic(), attempt, self._seq)
+        queue = self._queues[priority]
+        key = packet if area is None else (area, kind)
+        older = queue.get(key)
+        if older is not None and attempt > 1 and older.hex_string != hex_string:
+            # A retry of an older value, the queued packet wins
+            log.debug("🚦 Dropped retry of %s for Area %s, %s is queued", kind, area, older.hex_string)
+            return older
+        if older is not None:
+            # Superseded before it went out, keep its place and queue time
+            packet.queued_at = older.queued_at
+            packet.seq = older.seq
+            queue[key] = packet
+            if area is not None:
+                self._by_area[area][kind] = packet
+            self.coalesced[priority] += 1
+            log.debug("🚦 Coalesced %s for Area %s: %s → %s", kind, area, older.hex_string, hex_string)
+            return packet
+        queue[key] = packet
+        if area is not None:
+            self._by_area.setdefault(area, OrderedDict())[kind] = packet
+        self._depth += 1
+        self._wakeup.set()
+        return packet
+
+    def _next(self):
+        for queue in self._queues:
+            if queue:
+                return queue
+        return None
+
+    def _next_area(self) -> list:
+        """
+        The packet next in priority order, with every other packet queued for
+        its area, in submission order.
+        """
+        first = next(iter(self._next().values()))
+        if first.area is None:
+            return [first]
+        # A coalesced packet takes its predecessor's slot, so the index stays in seq order
+        return list(self._by_area[first.area].values())
+
+    def wake(self):
+        """
+        Re-check the window (an ack or expiry freed a slot).
+        """
+        self._wakeup.set()
+
+    def _window_full(self, count=1):
+        if self.window is None:
+            return False
+        in_flight = self.in_flight()
+        return in_flight > 0 and not self.window.can_send(in_flight + count - 1)
+
+    async def _drain(self):
+        while True:
+            if not self._depth:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            group = self._next_area()
+            if self._window_full(len(group)):
+                self._wakeup.clear()
+                if self._window_full(len(group)):
+                    self.window_waits += 1
+                    try:
+                        # Expiries free slots as well, the timeout is a safety net
+                        await asyncio.wait_for(self._wakeup.wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            if self.bucket:
+                delay = self.bucket.take(sum(packet.size for packet in group))
+                if delay:
+                    # Sleep until the budget allows the area, then re-pick by priority
+                    await asyncio.sleep(delay)
+                    continue
+            self._send_area(group)
+
+    def _send_area(self, group):
+        for packet in group:
+            del self._queues[packet.priority][packet if packet.area is None else (packet.area, packet.kind)]
+        if group[0].area is not None:
+            del self._by_area[group[0].area]
+        self._depth -= len(group)
+        if self.begin_burst:
+            self.begin_burst()
+        try:
+            for packet in group:
+                self._send(packet)
+        finally:
+            if self.end_burst:
+                self.end_burst()
+
+    def _send(self, packet):
+        now = time.monotonic()
+        self.wait[CLASS_NAMES[packet.priority]].observe(now - packet.queued_at)
+        self.sent[packet.priority] += 1
+        self.bytes_sent += packet.size
+        try:
+            self.send(packet)
+        except Exception as e:
+            log("❌ Failed to send %s packet for Area %s: %s", packet.kind, packet.area, e)
+
+    def flush(self):
+        """
+        Send everything queued right now, ignoring the budget (shutdown).
+        """
+        while self._depth:
+            self._send_area(self._next_area())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    def depth(self) -> dict:
+        return {name: len(queue) for name, queue in zip(CLASS_NAMES, self._queues)}
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "sent": dict(zip(CLASS_NAMES, self.sent)),
+            "coalesced": dict(zip(CLASS_NAMES, self.coalesced)),
+            "bytes_sent": self.bytes_sent,
+            "window_waits": self.window_waits,
+            "wait": {name: hist.snapshot() for name, hist in self.wait.items()},
+        }
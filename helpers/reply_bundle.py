@@ -0,0 +1,94 @@
+import time
+from helpers.climate_state import FIELDS
+from helpers.logger import get_logger
+log = get_logger("📨")
+
+
+def parse_reply_fields(value: str, requested=("setpoint",)):
+    """
+    REQUEST_REPLY_FIELDS: "all", "requested" (only what the keypad asked
+    for) or a comma separated list of climate fields.
+    """
+    value = (value or "all").strip().lower()
+    if value == "all":
+        return FIELDS
+    if value == "requested":
+        return tuple(requested)
+    fields = tuple(f.strip() for f in value.split(",") if f.strip())
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown climate field(s) in REQUEST_REPLY_FIELDS: {', '.join(sorted(unknown))}")
+    return tuple(f for f in FIELDS if f in fields)
+
+
+class ReplyBundles:
+    """
+    Encoded reply packets per area and field for keypad requests.
+
+    value(area, field) reads the current state, encode(area, field, value)
+    returns packets (kind, label, type, hex_string). A field's packets are
+    kept with the value they were encoded from and re-encoded only when the
+    stored value differs, so answering a request is a lookup per field.
+
+    Fields already answered for an area within `window` seconds are left
+    out of the next reply; a request with nothing left to send (fields that
+    have no value don't count) is collapsed.
+    """
+
+    def __init__(self, value, encode, window=1.0):
+        self.value = value
+        self.encode = encode
+        self.window = float(window)
+        self._bundles = {}      # (area, field) -> (value, packets)
+        self._answered = {}     # area -> {field: monotonic time}
+
+        # Stats
+        self.requests = 0
+        self.collapsed = 0
+        self.encoded = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._bundles)
+
+    def packets(self, area, field):
+        value = self.value(area, field)
+        if value is None:
+            return []
+        key = (area, field)
+        bundle = self._bundles.get(key)
+        if bundle is not None and bundle[0] == value:
+            self.reused += 1
+            return bundle[1]
+        packets = self.encode(area, field, value)
+        self._bundles[key] = (value, packets)
+        self.encoded += 1
+        return packets
+
+    def request(self, area, fields=FIELDS):
+        """
+        [(field, packets)] to answer a request for `fields` of `area`, None
+        when every field with a value was answered within the collapse window.
+        """
+        self.requests += 1
+        now = time.monotonic()
+        answered = self._answered.setdefault(area, {})
+        due = [field for field in fields if now - answered.get(field, -self.window) >= self.window]
+        if not due:
+            self.collapsed += 1
+            return None
+        reply = []
+        for field in due:
+            packets = self.packets(area, field)
+            if packets:
+                answered[field] = now
+                reply.append((field, packets))
+        if not reply:
+            # Only fields without a value were due
+            self.collapsed += 1
+            return None
+        return reply
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "collapsed": self.collapsed, "encoded": self.encoded,
+                "reused": self.reused, "bundles": len(self._bundles)}
@@ -0,0 +1,195 @@
+import asyncio
+import heapq
+import time
+from helpers.logger import get_logger
+from helpers.stats import Histogram
+log = get_logger("🧾")
+
+
+class PendingEntry:
+    __slots__ = ("response_id", "kind", "comment", "sent_at", "deadline", "data")
+
+    def __init__(self, response_id, kind, comment, sent_at, deadline, data):
+        self.response_id = response_id
+        self.kind = kind
+        self.comment = comment
+        self.sent_at = sent_at
+        self.deadline = deadline
+        self.data = data
+
+    def as_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "comment": self.comment,
+            "age": round(time.monotonic() - self.sent_at, 3),
+            **self.data
+        }
+
+
+class PendingResponses:
+    """
+    Tracks /set commands waiting for their /set/res/<id> acknowledgement.
+
+    Entries live in a dict (id -> entry) plus a min-heap ordered by deadline,
+    using monotonic time. Expiry pops from the heap top only, so a sweep costs
+    O(k log n) for k expired entries instead of a scan of everything pending.
+    Acked entries are left in the heap and skipped when they surface; the heap
+    is rebuilt once stale items outnumber live ones.
+
+    The tracker is capped at max_entries. When full:
+      - "oldest": evict the entry closest to expiry to make room
+      - "newest": don't track the new entry
+    so an offline Dynalite bridge can't grow it without limit.
+
+    Ack latency is recorded per packet kind (setpoint, temp, 101, ...) into
+    histograms, see latency_snapshot().
+
+    wait_next() sleeps until the next deadline, or until add() brings one
+    forward, so the sweeper doesn't poll while nothing is pending.
+    """
+
+    EVICTION = ("oldest", "newest")
+
+    def __init__(self, ttl=15, max_entries=10000, eviction="oldest"):
+        if eviction not in self.EVICTION:
+            raise ValueError(f"Unknown eviction policy {eviction!r}, expected one of {self.EVICTION}")
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.eviction = eviction
+        self._entries = {}
+        self._heap = []     # (deadline, seq, entry)
+        self._seq = 0
+        self._earlier = asyncio.Event()     # set when add() moves the next deadline forward
+        self.latency = {}   # kind -> Histogram
+
+        # Stats
+        self.added = 0
+        self.acked = 0
+        self.expired = 0
+        self.evicted = 0
+        self.unknown = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, response_id):
+        return response_id in self._entries
+
+    def add(self, response_id, kind="", comment="", **data):
+        if len(self._entries) >= self.max_entries:
+            if self.eviction == "newest":
+                self._evicted(response_id)
+                return None
+            oldest = self._pop_next()
+            if oldest is not None:
+                self._evicted(oldest.response_id)
+
+        now = time.monotonic()
+        entry = PendingEntry(response_id, kind, comment, now, now + self.ttl, data)
+        self._entries[response_id] = entry
+        self._seq += 1
+        if not self._heap or entry.deadline < self._heap[0][0]:
+            self._earlier.set()
+        heapq.heappush(self._heap, (entry.deadline, self._seq, entry))
+        self.added += 1
+        return entry
+
+    def _evicted(self, response_id):
+        self.evicted += 1
+        if self.evicted == 1 or self.evicted % 100 == 0:
+            log("⚠️ Pending responses full (%s), policy %s — evicted %s so far (last: %s)", self.max_entries, self.eviction, self.evicted, response_id)
+
+    def get(self, response_id):
+        return self._entries.get(response_id)
+
+    def ack(self, response_id):
+        """
+        Returns (entry, latency seconds) or (None, None) for unknown ids.
+        """
+        entry = self._entries.pop(response_id, None)
+        if entry is None:
+            self.unknown += 1
+            return None, None
+        elapsed = time.monotonic() - entry.sent_at
+        hist = self.latency.get(entry.kind)
+        if hist is None:
+            hist = self.latency[entry.kind] = Histogram()
+        hist.observe(elapsed)
+        self.acked += 1
+        self._maybe_compact()
+        return entry, elapsed
+
+    def pop(self, response_id):
+        """
+        Forget an entry without recording a latency.
+        """
+        entry = self._entries.pop(response_id, None)
+        self._maybe_compact()
+        return entry
+
+    def _pop_next(self):
+        # Next live entry by deadline, skipping stale heap items
+        heap = self._heap
+        while heap:
+            _, _, entry = heapq.heappop(heap)
+            if self._entries.get(entry.response_id) is entry:
+                del self._entries[entry.response_id]
+                return entry
+        return None
+
+    def _maybe_compact(self):
+        heap = self._heap
+        if len(heap) > 2 * len(self._entries) + 64:
+            self._heap = [item for item in heap if self._entries.get(item[2].response_id) is item[2]]
+            heapq.heapify(self._heap)
+
+    def expire(self, now=None):
+        """
+        Remove and return every entry past its deadline, oldest first.
+        """
+        now = time.monotonic() if now is None else now
+        heap = self._heap
+        expired = []
+        while heap and heap[0][0] <= now:
+            _, _, entry = heapq.heappop(heap)
+            if self._entries.get(entry.response_id) is entry:
+                del self._entries[entry.response_id]
+                expired.append(entry)
+        self.expired += len(expired)
+        return expired
+
+    def next_deadline(self):
+        """
+        Seconds until the next live entry expires, None when nothing is pending.
+        """
+        heap = self._heap
+        while heap and self._entries.get(heap[0][2].response_id) is not heap[0][2]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0.0, heap[0][0] - time.monotonic())
+
+    async def wait_next(self):
+        """
+        Sleep until the next live entry's deadline (forever when nothing is
+        pending) or until add() brings the next deadline forward.
+        """
+        delay = self.next_deadline()
+        self._earlier.clear()
+        try:
+            await asyncio.wait_for(self._earlier.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def latency_snapshot(self) -> dict:
+        return {kind: hist.snapshot() for kind, hist in self.latency.items()}
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "added": self.added,
+            "acked": self.acked,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "unknown": self.unknown,
+        }
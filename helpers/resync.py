@@ -0,0 +1,138 @@
+import asyncio
+import time
+from helpers.logger import get_logger
+log = get_logger("♻️")
+
+
+class AckedState:
+    """
+    What the Dynalite side confirmed: the last acknowledged packet (hex) per
+    (area, kind), plus the last sent one while its ack is outstanding.
+    A field is in sync when the packet for its desired value is the one
+    last acknowledged.
+    """
+
+    def __init__(self, in_flight_ttl=15.0):
+        self.in_flight_ttl = float(in_flight_ttl)
+        self._acked = {}    # (area, kind) -> hex_string
+        self._sent = {}     # (area, kind) -> (hex_string, monotonic time)
+
+    def __len__(self):
+        return len(self._acked)
+
+    def sent(self, area, kind, hex_string):
+        self._sent[(area, kind)] = (hex_string, time.monotonic())
+
+    def ack(self, area, kind, hex_string):
+        self._acked[(area, kind)] = hex_string
+
+    def to_dict(self) -> dict:
+        """
+        {area: {kind: hex_string}} of acknowledged packets (snapshots).
+        """
+        areas = {}
+        for (area, kind), hex_string in self._acked.items():
+            if area is not None:
+                areas.setdefault(area, {})[kind] = hex_string
+        return areas
+
+    def load(self, areas: dict):
+        for area, packets in areas.items():
+            for kind, hex_string in packets.items():
+                self._acked[(int(area), kind)] = hex_string
+
+    def acked(self, area, kind, hex_string) -> bool:
+        return self._acked.get((area, kind)) == hex_string
+
+    def in_sync(self, area, kind, hex_string) -> bool:
+        key = (area, kind)
+        if self._acked.get(key) == hex_string:
+            return True
+        sent = self._sent.get(key)
+        # Sent and still waiting for its ack (expiries are the retry engine's job)
+        return sent is not None and sent[0] == hex_string and time.monotonic() - sent[1] < self.in_flight_ttl
+
+
+class ResyncPacer:
+    """
+    Sends only the fields whose desired value differs from what was last
+    acknowledged, after a broker reconnect or a dependent bridge coming back
+    online.
+
+    packets(): the site-wide resync packet list to check, (area, field,
+    packets) with packets (kind, label, type, hex_string) for the field's
+    desired value (ClimateStateTable.resync_packets() over its dirty
+    fields), send(area, kind, type, hex_string), ready(): False stops a
+    run (bridge offline again).
+
+    trigger() can be called from any thread; runs start `settle` seconds
+    after the last trigger (a reconnect usually brings both bridge statuses
+    with it) and send at most `rate` packets per second. The packet list is
+    consumed lazily, so a value changed during the run is never sent stale.
+    """
+
+    def __init__(self, acked: AckedState, packets, send, ready=None, rate=10.0, settle=2.0):
+        self.acked = acked
+        self.packets = packets
+        self.send = send
+        self.ready = ready or (lambda: True)
+        self.rate = float(rate)
+        self.settle = float(settle)
+        self._loop = None
+        self._task = None
+        self._reasons = []
+
+        # Stats
+        self.runs = 0
+        self.checked = 0
+        self.sent = 0
+        self.aborted = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+
+    def trigger(self, reason: str):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._schedule, reason)
+
+    def _schedule(self, reason):
+        self._reasons.append(reason)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = asyncio.create_task(self._run(), name="dynet-resync")
+
+    async def _run(self):
+        await asyncio.sleep(self.settle)
+        reasons, self._reasons = ", ".join(dict.fromkeys(self._reasons)), []
+        if not self.ready():
+            log(f"⏸ Resync ({reasons}) skipped, dependent bridge offline")
+            return
+        self.runs += 1
+        started = time.monotonic()
+        checked = sent = 0
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        for area, field, packets in self.packets():
+            checked += 1
+            for kind, label, type, hex_string in packets:
+                if self.acked.in_sync(area, kind, hex_string):
+                    continue
+                if not self.ready():
+                    self.aborted += 1
+                    log(f"⏸ Resync ({reasons}) stopped after {sent} packet(s), dependent bridge offline")
+                    return
+                self.send(area, kind, type, hex_string)
+                sent += 1
+                self.sent += 1
+                if interval:
+                    await asyncio.sleep(interval)
+        self.checked += checked
+        log(f"Resync ({reasons}) → {sent} packet(s) for {checked} field(s) in {time.monotonic() - started:.1f}s")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "checked": self.checked, "sent": self.sent, "aborted": self.aborted}
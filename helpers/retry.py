@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+from helpers.logger import get_logger, WARNING
+log = get_logger("🔁")
+
+
+class RetryEngine:
+    """
+    Resends Dynet commands that expired or were acknowledged with a non-ok status.
+
+    - exponential backoff with jitter: base * 2^(attempt-1), capped at
+      max_delay, scaled by a random factor in [1 - jitter, 1]
+    - at most max_attempts sends per command (first send included)
+    - a retry budget per (area, channel): at most `budget` retries within
+      `budget_window` seconds, so one dead area can't take over the bus
+    - a retry is dropped when a newer packet was queued or sent for the
+      same (area, channel) in the meantime (note_queued), it would undo it
+    - a command that runs out of attempts or budget triggers resync(area),
+      at most once per `resync_interval` per area
+
+    resend(packet) puts the packet back on the outbound path; packets are
+    dicts with type, hex_string, kind, area, comment and attempt.
+    """
+
+    def __init__(self, resend, resync, max_attempts=3, base_delay=1.0, max_delay=30.0, jitter=0.5,
+                 budget=5, budget_window=60.0, resync_interval=300.0):
+        self.resend = resend
+        self.resync = resync
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.jitter = min(max(float(jitter), 0.0), 1.0)
+        self.budget = max(0, int(budget))
+        self.budget_window = float(budget_window)
+        self.resync_interval = float(resync_interval)
+        self._latest = {}       # (area, kind) -> hex_string last queued
+        self._budgets = {}      # (area, kind) -> [window start, retries]
+        self._resynced = {}     # area -> monotonic time of the last resync
+        self._timers = {}       # token -> TimerHandle
+        self._seq = 0
+
+        # Stats
+        self.scheduled = 0
+        self.sent = 0
+        self.superseded = 0
+        self.exhausted = 0
+        self.over_budget = 0
+        self.resyncs = 0
+
+    def note_queued(self, area, kind, hex_string):
+        """
+        Call when a packet is handed to the outbound path, not when it goes
+        out: a newer value still waiting behind the window must already
+        supersede a retry of the older one.
+        """
+        self._latest[(area, kind)] = hex_string
+
+    def delay(self, attempt) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        return delay * random.uniform(1.0 - self.jitter, 1.0)
+
+    def _take_budget(self, key, now) -> bool:
+        budget = self._budgets.get(key)
+        if budget is None or now - budget[0] >= self.budget_window:
+            budget = self._budgets[key] = [now, 0]
+        if budget[1] >= self.budget:
+            return False
+        budget[1] += 1
+        return True
+
+    def failed(self, packet, reason=""):
+        """
+        A send of `packet` failed (expired / bad status); retry or give up.
+        """
+        area, kind = packet.get("area"), packet.get("kind")
+        key = (area, kind)
+        if self._latest.get(key, packet["hex_string"]) != packet["hex_string"]:
+            self.superseded += 1
+            return
+        attempt = packet.get("attempt", 1)
+        now = time.monotonic()
+        if attempt >= self.max_attempts:
+            self.exhausted += 1
+            log.warning("❌ %s for Area %s failed after %s attempt(s) (%s)", kind, area, attempt, reason)
+            self._resync(area, now)
+            return
+        if not self._take_budget(key, now):
+            self.over_budget += 1
+            log.every(("retry_budget", area), 60, "⚠️ Retry budget spent for Area %s %s, not retrying (%s)",
+                      area, kind, reason, level=WARNING)
+            self._resync(area, now)
+            return
+
+        retry = {**packet, "attempt": attempt + 1}
+        self.scheduled += 1
+        delay = self.delay(attempt)
+        log.debug("🔁 Retrying %s for Area %s in %.1fs (attempt %s, %s)", kind, area, delay, attempt + 1, reason)
+        self._seq += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop (tools), retry straight away
+            self._fire(retry, self._seq)
+            return
+        self._timers[self._seq] = loop.call_later(delay, self._fire, retry, self._seq)
+
+    def _fire(self, packet, token):
+        self._timers.pop(token, None)
+        if self._latest.get((packet.get("area"), packet.get("kind")), packet["hex_string"]) != packet["hex_string"]:
+            self.superseded += 1
+            return
+        self.sent += 1
+        try:
+            self.resend(packet)
+        except Exception as e:
+            log("❌ Retry of %s for Area %s failed: %s", packet.get('kind'), packet.get('area'), e)
+
+    def _resync(self, area, now):
+        if area is None:
+            return
+        last = self._resynced.get(area)
+        if last is not None and now - last < self.resync_interval:
+            return
+        self._resynced[area] = now
+        self.resyncs += 1
+        try:
+            self.resync(area)
+        except Exception as e:
+            log("❌ Resync of Area %s failed: %s", area, e)
+
+    def cancel_all(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    def pending(self) -> int:
+        return len(self._timers)
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "sent": self.sent,
+            "superseded": self.superseded,
+            "exhausted": self.exhausted,
+            "over_budget": self.over_budget,
+            "resyncs": self.resyncs,
+            "pending": self.pending(),
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from helpers.logger import get_logger
+log = get_logger("💾")
+
+SNAPSHOT_VERSION = 1
+
+
+def encode_snapshot(areas: dict, acked: dict = None) -> bytes:
+    """
+    Compact JSON: {"v": 1, "saved_at": "...", "areas": {"12": {...}, ...},
+    "acked": {"12": {"setpoint": "<hex>", ...}, ...}}; "acked" is optional.
+    """
+    snapshot = {
+        "v": SNAPSHOT_VERSION,
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "areas": {str(area): state for area, state in areas.items() if state},
+    }
+    if acked is not None:
+        snapshot["acked"] = {str(area): packets for area, packets in acked.items() if packets}
+    return json.dumps(snapshot, separators=(",", ":"), sort_keys=True).encode()
+
+
+def save_snapshot(path: str, areas: dict, acked: dict = None) -> int:
+    return write_snapshot(path, encode_snapshot(areas, acked))
+
+
+def write_snapshot(path: str, data: bytes) -> int:
+    """
+    Atomically replace the snapshot file: write a temp file in the same
+    directory, fsync it, then os.replace() over the old one. A crash mid-write
+    leaves the previous snapshot intact. Returns the number of bytes written.
+    Blocking, SnapshotWriter runs it in the default executor.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+def read_snapshot(path: str) -> dict:
+    """
+    The whole snapshot, read and parsed once; empty when there is no usable
+    snapshot. Take its sections with snapshot_section().
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = json.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        log(f"❌ Ignoring unreadable state snapshot {path}: {e}")
+        return {}
+
+    if not isinstance(snapshot, dict):
+        log(f"❌ Ignoring unreadable state snapshot {path}: not a JSON object")
+        return {}
+    if snapshot.get("v") != SNAPSHOT_VERSION:
+        log(f"⚠️ Ignoring state snapshot {path} with version {snapshot.get('v')}")
+        return {}
+    return snapshot
+
+
+def snapshot_section(snapshot: dict, section="areas") -> dict:
+    """
+    Returns {area (int): state dict} (section "acked": {area: {kind: hex}}).
+    """
+    entries = snapshot.get(section)
+    if not isinstance(entries, dict):
+        return {}
+    areas = {}
+    for area, state in entries.items():
+        try:
+            areas[int(area)] = state
+        except ValueError:
+            log(f"⚠️ Skipping bad area {area!r} in state snapshot")
+    log(f"Loaded {'state' if section == 'areas' else section + ' packets'} for {len(areas)} area(s) (saved {snapshot.get('saved_at')})")
+    return areas
+
+
+def load_snapshot(path: str, section="areas") -> dict:
+    return snapshot_section(read_snapshot(path), section)
+
+
+class SnapshotWriter:
+    """
+    Periodically persists the state cache (and, with get_acked, the last
+    acknowledged packets). Every interval the cache is compared with what
+    was last written and, when it changed, encoded on the loop; the file
+    write and fsync run in the default executor so slow storage doesn't
+    stall message handling.
+
+    save() writes inline (shutdown). Writes are numbered, so a periodic
+    write still running in the executor never lands over a newer one.
+    """
+
+    def __init__(self, path: str, get_state, interval=60, get_acked=None):
+        self.path = path
+        self.get_state = get_state
+        self.get_acked = get_acked
+        self.interval = float(interval)
+        self._last = None
+        self._seq = 0
+        self._written_seq = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.writes = 0
+        self.skipped = 0
+
+    def _prepare(self, force):
+        # (seq, state, encoded snapshot), None when nothing changed
+        areas = self.get_state()
+        acked = self.get_acked() if self.get_acked else None
+        state = (areas, acked)
+        if not force and state == self._last:
+            self.skipped += 1
+            return None
+        self._seq += 1
+        return self._seq, state, encode_snapshot(areas, acked)
+
+    def _write(self, seq, data):
+        # Any thread; a write older than the last one done is dropped
+        with self._lock:
+            if seq <= self._written_seq:
+                return None
+            size = write_snapshot(self.path, data)
+            self._written_seq = seq
+            return size
+
+    def _written(self, state, size):
+        if size is None:
+            return False
+        self._last = state
+        self.writes += 1
+        log(f"Saved state for {len(state[0])} area(s) to {self.path} ({size} bytes)")
+        return True
+
+    def save(self, force=False) -> bool:
+        try:
+            prepared = self._prepare(force)
+            if prepared is None:
+                return False
+            seq, state, data = prepared
+            return self._written(state, self._write(seq, data))
+        except Exception as e:
+            log(f"❌ Failed to save state snapshot {self.path}: {e}")
+            return False
+
+    async def save_async(self, force=False) -> bool:
+        try:
+            prepared = self._prepare(force)
+            if prepared is None:
+                return False
+            seq, state, data = prepared
+            size = await asyncio.get_running_loop().run_in_executor(None, self._write, seq, data)
+            return self._written(state, size)
+        except Exception as e:
+            log(f"❌ Failed to save state snapshot {self.path}: {e}")
+            return False
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save_async()
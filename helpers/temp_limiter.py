@@ -0,0 +1,215 @@
+import asyncio
+import time
+from helpers.logger import get_logger
+log = get_logger("🌡️")
+
+# Float slack when comparing quantized values (0.1 steps don't add up exactly)
+_EPS = 1e-9
+
+
+class _AreaTemp:
+    __slots__ = ("quantized", "last_sent", "last_sent_at", "pending", "due", "timer")
+
+    def __init__(self):
+        self.quantized = None
+        self.last_sent = None
+        self.last_sent_at = 0.0
+        self.pending = None
+        self.due = None
+        self.timer = None
+
+
+class TemperatureLimiter:
+    """
+    Deadband, hysteresis and rate limiting for the current_temperature channel.
+
+    - quantize(): rounds the raw HA reading to `step` with hysteresis, so a
+      reading hovering around a rounding boundary doesn't flip-flop
+    - offer(): decides whether a quantized value goes out now:
+        * within `deadband` of the last sent value -> held, sent after `settle`
+        * less than `min_interval` since the last send -> held, sent when the
+          interval expires
+      Whatever value is held last is always sent eventually (trailing send),
+      unless the reading returns to the value already on the bus.
+
+    Values are quantized to `step`, so they move in whole steps: a deadband
+    of one step or less never holds anything back. The default of 1.0 with
+    the default 0.5 step holds single-step moves.
+
+    Settings are global with optional per-area overrides:
+        {12: {"deadband": 1.5, "min_interval": 60}}
+    """
+
+    SETTINGS = ("hysteresis", "deadband", "min_interval", "settle")
+
+    def __init__(self, send, step=0.5, hysteresis=0.1, deadband=1.0, min_interval=30, settle=300, overrides=None):
+        self.send = send
+        self.step = float(step) or 0.5
+        self.defaults = {
+            "hysteresis": float(hysteresis),
+            "deadband": float(deadband),
+            "min_interval": float(min_interval),
+            "settle": float(settle),
+        }
+        self.overrides = {}
+        for area, settings in (overrides or {}).items():
+            unknown = set(settings) - set(self.SETTINGS)
+            if unknown:
+                raise ValueError(f"Unknown temperature setting(s) for area {area}: {', '.join(sorted(unknown))}")
+            self.overrides[int(area)] = {**self.defaults, **{k: float(v) for k, v in settings.items()}}
+        for area, settings in [("default", self.defaults), *self.overrides.items()]:
+            if 0 < settings["deadband"] <= self.step + _EPS:
+                log.warning("⚠️ Temperature deadband %g for area %s is not larger than the precision %g, "
+                            "it won't hold anything back", settings["deadband"], area, self.step)
+        self._areas = {}
+
+        # Stats
+        self.sent = 0
+        self.trailing_sent = 0
+        self.suppressed_deadband = 0
+        self.suppressed_rate = 0
+        self.held_hysteresis = 0
+
+    def _settings(self, area):
+        return self.overrides.get(area, self.defaults)
+
+    def _area(self, area):
+        st = self._areas.get(area)
+        if st is None:
+            st = self._areas[area] = _AreaTemp()
+        return st
+
+    def quantize(self, area, raw) -> float:
+        raw = float(raw)
+        step = self.step
+        st = self._area(area)
+        prev = st.quantized
+        if prev is not None and abs(raw - prev) <= step / 2 + self._settings(area)["hysteresis"]:
+            if round(raw / step) * step != prev:
+                self.held_hysteresis += 1
+            return prev
+        st.quantized = round(raw / step) * step
+        return st.quantized
+
+    def seed(self, area, value):
+        """
+        Treat `value` as already on the bus (warm restart from a snapshot).
+        """
+        st = self._area(area)
+        st.quantized = st.last_sent = float(value)
+        st.last_sent_at = 0.0
+
+    def note_sent(self, area, value):
+        """
+        `value` went out by another path (a keypad request reply): drop any
+        trailing send and restart the interval from now.
+        """
+        st = self._area(area)
+        self._cancel(st)
+        st.last_sent = float(value)
+        st.last_sent_at = time.monotonic()
+
+    def offer(self, area, value, force=False) -> bool:
+        """
+        Returns True if the value was sent immediately.
+        """
+        st = self._area(area)
+        now = time.monotonic()
+
+        if force or st.last_sent is None:
+            self._send(area, st, value, now)
+            return True
+
+        if value == st.last_sent:
+            # Back to what the bus already has, nothing left to trail
+            self._cancel(st)
+            return False
+
+        settings = self._settings(area)
+        if abs(value - st.last_sent) < settings["deadband"] - _EPS:
+            self.suppressed_deadband += 1
+            st.pending = value
+            self._schedule(area, st, st.last_sent_at + settings["settle"])
+            return False
+
+        if now - st.last_sent_at < settings["min_interval"]:
+            self.suppressed_rate += 1
+            st.pending = value
+            self._schedule(area, st, st.last_sent_at + settings["min_interval"])
+            return False
+
+        self._send(area, st, value, now)
+        return True
+
+    def _send(self, area, st, value, now):
+        self._cancel(st)
+        st.last_sent = value
+        st.last_sent_at = now
+        self.sent += 1
+        self.send(area, value)
+
+    def _cancel(self, st):
+        if st.timer is not None:
+            st.timer.cancel()
+        st.timer = None
+        st.due = None
+        st.pending = None
+
+    def _schedule(self, area, st, due):
+        if st.due is not None and st.due <= due:
+            return
+        if st.timer is not None:
+            st.timer.cancel()
+        st.due = due
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop (tools/benchmarks), flush_all() sends what is held
+            st.timer = None
+            return
+        st.timer = loop.call_later(max(0.0, due - time.monotonic()), self._trailing, area)
+
+    def _trailing(self, area):
+        st = self._areas.get(area)
+        if st is None:
+            return
+        st.timer = None
+        st.due = None
+        value = st.pending
+        if value is None or value == st.last_sent:
+            st.pending = None
+            return
+
+        # A rate-limited value can still be inside the deadband, give it the settle time
+        settings = self._settings(area)
+        now = time.monotonic()
+        settle_due = st.last_sent_at + settings["settle"]
+        if abs(value - st.last_sent) < settings["deadband"] - _EPS and now < settle_due:
+            self._schedule(area, st, settle_due)
+            return
+
+        try:
+            self._send(area, st, value, now)
+            self.trailing_sent += 1
+        except Exception as e:
+            log("❌ Trailing temperature send failed for Area %s: %s", area, e)
+
+    def flush_all(self):
+        """
+        Send every held value now (shutdown, tools).
+        """
+        now = time.monotonic()
+        for area, st in self._areas.items():
+            if st.pending is not None and st.pending != st.last_sent:
+                self._send(area, st, st.pending, now)
+                self.trailing_sent += 1
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "trailing_sent": self.trailing_sent,
+            "suppressed_deadband": self.suppressed_deadband,
+            "suppressed_rate": self.suppressed_rate,
+            "held_hysteresis": self.held_hysteresis,
+            "pending": sum(1 for st in self._areas.values() if st.pending is not None),
+        }
@@ -0,0 +1,177 @@
+import asyncio
+import cProfile
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from helpers.logger import get_logger
+from helpers.stats import Histogram
+log = get_logger("🔬")
+
+# Stage timings run from a few µs (parse, encode) to ms (a full resend)
+TRACE_BUCKETS = (0.000002, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+
+def _timed(fn, hist):
+    perf = time.perf_counter
+
+    def traced(*args, **kwargs):
+        started = perf()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            hist.observe(perf() - started)
+
+    traced.__wrapped__ = fn
+    return traced
+
+
+def _timed_descriptor(raw, hist):
+    # Class attributes are wrapped as stored, so static/class methods stay what they were
+    if isinstance(raw, (staticmethod, classmethod)):
+        return type(raw)(_timed(raw.__func__, hist))
+    return _timed(raw, hist)
+
+
+class Tracer:
+    """
+    Per-stage timings for the message path, switched on and off at runtime.
+
+    Stages are attributes (module functions, bound methods, callbacks held
+    by an object) given as (target, attribute, stage). enable() swaps each
+    one for a timing wrapper feeding the stage's histogram, disable() puts
+    the originals back, so with tracing off the code runs exactly as if it
+    wasn't there. Timings are inclusive: a stage that calls another one
+    counts its time too.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}    # stage -> Histogram
+        self._patched = []  # (target, attribute, original as stored, was set on the target itself)
+        self.since = None
+
+    def enable(self, targets):
+        if self.enabled:
+            return
+        for target, attr, stage in targets:
+            if target is None:
+                continue
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram(TRACE_BUCKETS)
+            own = attr in getattr(target, "__dict__", {})
+            if isinstance(target, type):
+                original = inspect.getattr_static(target, attr)
+                wrapped = _timed_descriptor(original, hist)
+            else:
+                original = getattr(target, attr)
+                wrapped = _timed(original, hist)
+            self._patched.append((target, attr, original, own))
+            setattr(target, attr, wrapped)
+        self.enabled = True
+        self.since = time.time()
+        log(f"Tracing on, {len(self._patched)} stage hook(s)")
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for target, attr, original, own in reversed(self._patched):
+            if own:
+                setattr(target, attr, original)
+            else:
+                # A bound or inherited method: drop the wrapper, the class/base one shows again
+                delattr(target, attr)
+        self._patched.clear()
+        self.enabled = False
+        log("Tracing off")
+
+    def reset(self):
+        for hist in self.stages.values():
+            hist.__init__(TRACE_BUCKETS)
+        self.since = time.time()
+
+    def snapshot(self) -> dict:
+        return {stage: hist.snapshot() for stage, hist in self.stages.items()}
+
+    def report(self):
+        """
+        Log lines, slowest total first.
+        """
+        stages = sorted(self.snapshot().items(), key=lambda item: item[1]["sum"], reverse=True)
+        lines = [f"{'stage':<20} {'count':>9} {'total ms':>10} {'avg µs':>9} {'p50 µs':>9} {'p99 µs':>9} {'max µs':>9}"]
+        for stage, s in stages:
+            lines.append(f"{stage:<20} {s['count']:>9} {s['sum'] * 1000:>10.1f} {s['avg'] * 1e6:>9.1f} "
+                         f"{s['p50'] * 1e6:>9.1f} {s['p99'] * 1e6:>9.1f} {s['max'] * 1e6:>9.1f}")
+        return lines
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and counts collapsed stacks ("a;b;c" root first), the
+    input format of flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = float(interval)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == me:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+async def profile(seconds=10.0, directory="data/trace", interval=0.005):
+    """
+    cProfile the event loop thread for `seconds` while sampling its stack.
+    Writes <directory>/profile-<time>.pstats (python -m pstats / snakeviz)
+    and .collapsed (flamegraphs); returns both paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}")
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval=interval)
+    log(f"Profiling for {seconds:g}s")
+    sampler.start()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        sampler.stop()
+    profiler.dump_stats(f"{stem}.pstats")
+    sampler.write(f"{stem}.collapsed")
+    log(f"Profile written to {stem}.pstats and {stem}.collapsed ({sampler.samples} stack samples)")
+    return f"{stem}.pstats", f"{stem}.collapsed"
@@ -0,0 +1,110 @@
+import os
+import struct
+import time
+from helpers.logger import get_logger
+log = get_logger("🎙️")
+
+# Append-only binary log of incoming MQTT messages
+#
+#   file    = MAGIC record*
+#   record  = "<dHI" (timestamp, topic id, payload length) payload
+#
+# Topics are interned: the first message on a topic is preceded by a
+# definition record (topic id TOPIC_DEF, payload = topic) that assigns the
+# next id. Each recorder session starts with a SESSION record, which resets
+# the topic table, so a file can be appended to across restarts.
+MAGIC = b"CDTRAF1\n"
+RECORD = struct.Struct("<dHI")
+TOPIC_DEF = 0xFFFF
+SESSION = 0xFFFE
+MAX_TOPICS = 0xFFFD
+
+
+class TrafficRecorder:
+    """
+    Records (timestamp, topic, payload) on the event loop, where the inbound
+    queue accepts a message, so paho's network thread never touches the
+    file. Writes are buffered; flush() runs every `flush_interval` seconds
+    of traffic and on close().
+    """
+
+    def __init__(self, path: str, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = float(flush_interval)
+        self._topics = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._file.write(RECORD.pack(time.time(), SESSION, 0))
+        self._last_flush = time.monotonic()
+
+        # Stats
+        self.messages = 0
+        self.bytes = 0
+
+    def record(self, topic: str, payload: bytes, ts=None):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        ts = time.time() if ts is None else ts
+        if self._file is None:
+            return
+        write = self._file.write
+        topic_id = self._topics.get(topic)
+        if topic_id is None:
+            if len(self._topics) >= MAX_TOPICS:
+                # Start over rather than run out of ids
+                self._topics.clear()
+                write(RECORD.pack(ts, SESSION, 0))
+            topic_id = self._topics[topic] = len(self._topics)
+            name = topic.encode()
+            write(RECORD.pack(ts, TOPIC_DEF, len(name)))
+            write(name)
+        write(RECORD.pack(ts, topic_id, len(payload)))
+        write(payload)
+        self.messages += 1
+        self.bytes += RECORD.size + len(payload)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        log(f"Recorded {self.messages} message(s) to {self.path}")
+
+
+def read_traffic(path: str):
+    """
+    Yields (timestamp, topic, payload bytes) in recorded order. A truncated
+    last record (crash mid-write) ends the iteration.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a traffic recording")
+        topics = []
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            ts, topic_id, length = RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                log(f"⚠️ Truncated record at the end of {path}")
+                return
+            if topic_id == SESSION:
+                topics = []
+            elif topic_id == TOPIC_DEF:
+                topics.append(payload.decode())
+            elif topic_id < len(topics):
+                yield ts, topics[topic_id], payload
+            else:
+                raise ValueError(f"{path}: message for undefined topic id {topic_id}")
@@ -1,85 +1,317 @@
 import asyncio
-import json
+import signal
+import sys
+import time
 import uuid
-from datetime import datetime, timezone
 from config import (
     MQTT_HOST, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
     MQTT_CLIMATE_STATE, MQTT_DYNALITE_PREFIX, MQTT_BRIDGE_WILL,
-    OUT_JOIN, IN_JOIN, TEMP_PRECISION, MQTT_CLIMATE_PREFIX, MQTT_DEBUG,MQTT_CLIMATE_WILL,MQTT_DYNALITE_WILL
-)
-from helpers.dynet_mqtt import (
-    build_area_temperature_body, build_area_preset_body,
-    build_channel_level_body, build_area_setpoint_body
+    OUT_JOIN, IN_JOIN, TEMP_PRECISION, MQTT_CLIMATE_PREFIX, MQTT_DEBUG,MQTT_CLIMATE_WILL,MQTT_DYNALITE_WILL,
+    MSG_QUEUE_SIZE, MSG_QUEUE_POLICY, MSG_WORKERS, MSG_SHARDS, MSG_QUEUE_STATS_INTERVAL,
+    DYNET_BATCH, DYNET_BATCH_WINDOW, DYNET_BATCH_MAX,
+    TEMP_HYSTERESIS, TEMP_DEADBAND, TEMP_MIN_INTERVAL, TEMP_SETTLE_INTERVAL, TEMP_AREA_OVERRIDES,
+    PENDING_TTL, PENDING_MAX, PENDING_EVICTION,
+    METRICS_PORT, METRICS_HOST,
+    STATE_SNAPSHOT_PATH, STATE_SNAPSHOT_INTERVAL,
+    DYNET_BUS_BAUD, DYNET_BUS_SHARE, DYNET_BUS_BURST,
+    LOG_LEVEL, LOG_RING_SIZE, LOG_RING_LEVEL, LOG_BACKGROUND, JSON_CODEC,
+    MQTT_RECORD_PATH, MQTT_TRANSPORT,
+    CLIMATE_CONTROLLERS, CLIMATE_AREAS, CLIMATE_AREAS_FILE, CLIMATE_AREAS_LEARN,
+    DYNET_WINDOW, DYNET_WINDOW_MIN, DYNET_WINDOW_MAX, DYNET_WINDOW_LATENCY,
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_JITTER,
+    RETRY_BUDGET, RETRY_BUDGET_WINDOW, RETRY_RESYNC_INTERVAL,
+    ECHO_TTL, ECHO_MAX, DYNALITE_PREFILTER,
+    RESYNC_RATE, RESYNC_SETTLE,
+    TRACE, TRACE_TOPIC, TRACE_DIR, TRACE_SAMPLE_INTERVAL, TRACE_PROFILE, TRACE_PROFILE_MAX,
+    REQUEST_REPLY_FIELDS, REQUEST_COLLAPSE_WINDOW
 )
+from helpers.dynet_codec import setpoint_hex, temperature_hex, channel_level_hex
+from helpers.dynet_dispatch import DynetDispatcher, join_value, REQUEST_SETPOINT, SET_SETPOINT, RECALL_LEVEL
+from helpers.area_registry import AreaRegistry, load_units
+from helpers.bus_filter import BusPrefilter
+from helpers.climate_state import ClimateStateTable, FIELDS
+from helpers.dynet_batch import DynetBatcher
+from helpers.echo_filter import EchoFilter
+from helpers import dynet_mqtt, json_codec, logger
+from helpers.message_queue import BARRIER, DROP, MessageQueue, ShardedMessageQueue
+from helpers.metrics import MetricsRegistry, start_metrics_server
+from helpers.reply_bundle import ReplyBundles, parse_reply_fields
+from helpers.outbound import AimdWindow, OutboundScheduler, bus_bytes_per_second
+from helpers.response_tracker import PendingResponses
+from helpers.resync import AckedState, ResyncPacer
+from helpers.retry import RetryEngine
+from helpers.state_snapshot import SnapshotWriter, read_snapshot, snapshot_section
+from helpers.stats import HANDLER_BUCKETS
+from helpers.temp_limiter import TemperatureLimiter
+from helpers.tracing import Tracer, profile
+from helpers.traffic_log import TrafficRecorder
 from mqtt.publisher import MQTTPublisher
 
 mqtt_client = None  # Global instance
-last_state = {}     # State cache per area
-pending_responses = {} #Response tracker
+inbound = None      # paho thread -> asyncio hand-off queue
+batcher = None      # Optional multi-packet frames on /set (DYNET_BATCH)
+scheduler = None    # Outbound priority queue, paced to the bus capacity
+last_state = ClimateStateTable()     # State cache per area (columnar)
+#HA climate topic <-> Dynalite area/join, one dict lookup per message
+try:
+    area_registry = AreaRegistry(
+        MQTT_CLIMATE_PREFIX,
+        controllers=CLIMATE_CONTROLLERS,
+        units=load_units(CLIMATE_AREAS, CLIMATE_AREAS_FILE),
+        default_join=OUT_JOIN,
+        learn=CLIMATE_AREAS_LEARN
+    )
+except (ValueError, KeyError, TypeError) as e:
+    logger.get_logger("🗺️").error(f"❌ Bad climate unit config (CLIMATE_AREAS / CLIMATE_AREAS_FILE): {e!r}")
+    sys.exit(1)
+pending_responses = PendingResponses(ttl=PENDING_TTL, max_entries=PENDING_MAX, eviction=PENDING_EVICTION) #Response tracker
+acked_state = AckedState(in_flight_ttl=PENDING_TTL) #Last acknowledged packet per area/channel
+mqtt_connects = 0   #Successful broker connects, >1 = reconnect
+tracer = Tracer()   #Per-stage timings, TRACE or the trace command topic
+profile_task = None #Running "profile" command, one at a time
+echo_filter = EchoFilter(ttl=ECHO_TTL, max_entries=ECHO_MAX) if ECHO_TTL > 0 else None #Our packets reported back by the bus
 bridge_online = {"dynalite": False,"climate": False} #Track bridge status
+bridge_offline_since = {name: time.monotonic() for name in bridge_online}
+bridge_offline_total = {name: 0.0 for name in bridge_online}
+
+# Metrics (served on /metrics when METRICS_PORT is set)
+metrics = MetricsRegistry(prefix="climate_dynalite_")
+m_received = metrics.counter("messages_received_total", "MQTT messages received per topic class", ("topic_class",))
+m_packets = metrics.counter("packets_sent_total", "Dynet packets sent per channel", ("channel",))
+m_skipped = metrics.counter("messages_skipped_total", "Messages dropped without any action, per reason", ("reason",))
+m_handler = metrics.histogram("handler_seconds", "Time spent handling one MQTT message", "topic_class", buckets=HANDLER_BUCKETS)
+
+# Logger (level gated, written off the event loop once logger.configure() runs)
+log = logger.get_logger("🧠")
+mqtt_log = logger.get_logger("📡🧾")
+
+def _topic_class(topic: str) -> str:
+    if topic == TRACE_TOPIC:
+        return "trace"
+    if topic == MQTT_DYNALITE_WILL:
+        return "dynalite_status"
+    if topic == MQTT_CLIMATE_WILL:
+        return "climate_status"
+    if topic.startswith(MQTT_CLIMATE_PREFIX):
+        return "climate_state"
+    if topic == MQTT_DYNALITE_PREFIX:
+        return "dynalite_bus"
+    if topic.startswith(f"{MQTT_DYNALITE_PREFIX}/set/res/"):
+        return "set_response"
+    return "other"
+
+
+def _shard_key(topic: str, payload):
+    #area a message belongs to, picks its inbound shard (None = shard 0)
+    #runs at enqueue for every message: reads state, never learns or changes it
+    topic_class = _topic_class(topic)
+    if topic_class in ("dynalite_status", "climate_status"):
+        #every area depends on it, handled after what came before and before what follows
+        return BARRIER
+    if topic_class == "climate_state":
+        return area_registry.area_of(topic)
+    if topic_class == "dynalite_bus":
+        if bus_filter is None:
+            return None
+        #the bus pre-filter runs here with shards: one scan of the bytes gives the verdict and the area
+        reason, area = bus_filter.check_area(payload)
+        if reason:
+            m_skipped.inc(reason)
+            return DROP
+        return area
+    if topic_class == "set_response":
+        entry = pending_responses.get(topic.rsplit("/", 1)[-1])
+        return entry.data.get("area") if entry else None
+    return None
+
+
+def _set_bridge_online(name: str, online: bool):
+    was_online = bridge_online[name]
+    now = time.monotonic()
+    if was_online and not online:
+        bridge_offline_since[name] = now
+    elif online and not was_online:
+        bridge_offline_total[name] += now - bridge_offline_since[name]
+    bridge_online[name] = online
+    #back online, catch the bus up on what it missed
+    if online and not was_online and resync:
+        resync.trigger(f"{name} online")
+
+
+def _bridge_offline_seconds() -> dict:
+    now = time.monotonic()
+    return {
+        name: total + (0.0 if bridge_online[name] else now - bridge_offline_since[name])
+        for name, total in bridge_offline_total.items()
+    }
 
-# Logger
-def log(msg: str):
-    print(f"{datetime.now().strftime('%H:%M:%S')} 🧠 {msg}")
 
 # MQTT Connect handler
 def handle_mqtt_connect(client, userdata, flags, rc):
+    global mqtt_connects
     if rc == 0:
+        mqtt_connects += 1
+        if mqtt_connects > 1 and resync:
+            resync.trigger("reconnect")
         #log("✅ Connected to MQTT broker.")
         try:
             #first sub to the will status of the dependant bridges
             client.subscribe(f"{MQTT_DYNALITE_WILL}")
-            log(f"📡 Subscribed to {MQTT_DYNALITE_WILL}")
+            log("📡 Subscribed to %s", MQTT_DYNALITE_WILL)
             client.subscribe(f"{MQTT_CLIMATE_WILL}")
-            log(f"📡 Subscribed to {MQTT_CLIMATE_WILL}")
+            log("📡 Subscribed to %s", MQTT_CLIMATE_WILL)
             #Subscribe to rest of the required topics for this integration
             client.subscribe(MQTT_CLIMATE_STATE)
-            log(f"📡 Subscribed to {MQTT_CLIMATE_STATE}")
+            log("📡 Subscribed to %s", MQTT_CLIMATE_STATE)
             client.subscribe(MQTT_DYNALITE_PREFIX)
-            log(f"📡 Subscribed to {MQTT_DYNALITE_PREFIX}")
+            log("📡 Subscribed to %s", MQTT_DYNALITE_PREFIX)
             #do not sub to /set, as the bridge handles this
             #only sub to /set/res as this where the responses from 
             #the bridge will turn up
             client.subscribe(f"{MQTT_DYNALITE_PREFIX}/set/res/#")
-            log(f"📡 Subscribed to {MQTT_DYNALITE_PREFIX}/set/res/#")
+            log("📡 Subscribed to %s/set/res/#", MQTT_DYNALITE_PREFIX)
+            if TRACE_TOPIC:
+                client.subscribe(TRACE_TOPIC)
+                log("📡 Subscribed to %s", TRACE_TOPIC)
         except Exception as e:
-            log(f"❌ Failed to subscribe: {e}")
+            log("❌ Failed to subscribe: %s", e)
     else:
-        log(f"❌ Connection failed with code {rc}")
+        log("❌ Connection failed with code %s", rc)
+
+def _pub2dynet(type, hex_string, comment="", kind="", area=None, attempt=1):
+    #latest value per area/channel from the moment it is queued, older retries yield to it
+    if retries:
+        retries.note_queued(area, kind, hex_string)
+    #queued by priority class, goes out when the bus budget allows
+    if scheduler:
+        scheduler.submit(type, hex_string, kind=kind, area=area, comment=comment, attempt=attempt)
+        return
+    _publish_dynet(type, hex_string, comment, kind, area, attempt)
+
+
+def _send_outbound(packet):
+    _publish_dynet(packet.type, packet.hex_string, packet.comment, packet.kind, packet.area, packet.attempt)
 
-def _pub2dynet(type, hex_string, comment=""):
+
+def _publish_dynet(type, hex_string, comment="", kind="", area=None, attempt=1):
     response_id = uuid.uuid4().hex
+    #keep the packet with the entry so an expiry/failure can be retried
+    pending_responses.add(response_id, kind=kind, comment=comment,
+                          type=type, hex_string=hex_string, area=area, attempt=attempt)
+    m_packets.inc(kind)
+    if echo_filter is not None:
+        echo_filter.sent(hex_string)
+    if area is not None:
+        acked_state.sent(area, kind, hex_string)
+
+    #batch mode, packet goes out with the rest of the frame
+    if batcher:
+        batcher.add(type, hex_string, response_id)
+        return
+
     payload = {
         "type": type,
         "hex_string": hex_string,
         "response_id": response_id
     }
     
-    mqtt_client.publish(f"{MQTT_DYNALITE_PREFIX}/set", json.dumps(payload))
-    pending_responses[response_id] = {
-        "comment": comment,
-        "sent_at": datetime.now(timezone.utc)
-    }
+    mqtt_client.publish(f"{MQTT_DYNALITE_PREFIX}/set", json_codec.dumps(payload))
 
     #log(f"📤 Sent Dynalite command → Area: {area_code}, Channel: {channel}, ID: {response_id}{' — ' + comment if comment else ''}")
 
 
-def handle_climate_message(topic: str, state):
+def _pub2dynet_frame(frame):
+    mqtt_client.publish(f"{MQTT_DYNALITE_PREFIX}/set", json_codec.dumps(frame))
+    log.debug("📦 Sent Dynalite frame → %s x %s packets", len(frame['hex_strings']), frame['type'])
+
+
+# HA -> Dynet channel levels
+HVAC_MAP = {"cool": 0, "heat": 1, "fan": 2, "dry": 3, "auto": 4, "off" :0} #add off as a map here same as Cool
+FAN_MAP = {"low": 0, "med": 1, "high": 2, "top": 3, "auto": 4}
+KIND_FIELDS = {"setpoint": "setpoint", "temp": "current_temp", "101": "hvac_mode", "102": "hvac_mode",
+               "103": "fan_mode", "105": "status"}
+FIELD_LABELS = {
+    "setpoint": "Setpoint",
+    "current_temp": "Current Temp",
+    "hvac_mode": "HVAC Mode",
+    "fan_mode": "Fan Mode",
+    "status": "Status"
+}
+
+
+def _field_packets(area_code: int, field: str, value):
+    """
+    Dynet packets for one climate field as (kind, label, type, hex_string).
+    """
+    join = area_registry.join(area_code)
+    if field == "setpoint":
+        return [("setpoint", "Set_Point", "dynet2", setpoint_hex(area_code, join, value))]
+    if field == "current_temp":
+        return [("temp", "Cur_Temp", "dynet2", temperature_hex(area_code, join, value))]
+    if field == "hvac_mode":
+        on_off = 0 if value.lower() == "off" else 1
+        packets = [("101", "On/Off", "dynet2", channel_level_hex(area_code, join, 101, on_off))]
+        hvac_num = HVAC_MAP.get(value.lower())
+        if hvac_num is not None:
+            packets.append(("102", "Mode", "dynet2", channel_level_hex(area_code, join, 102, hvac_num)))
+        else:
+            log("❌ Unknown HVAC mode: %s", value)
+        return packets
+    if field == "fan_mode":
+        fan_num = FAN_MAP.get(value.lower())
+        if fan_num is None:
+            log("❌ Unknown Fan mode: %s", value)
+            return []
+        return [("103", "Fan", "dynet2", channel_level_hex(area_code, join, 103, fan_num))]
+    if field == "status":
+        error_no = 0 if value.lower() == "ok" else 1
+        return [("105", "Status", "dynet2", channel_level_hex(area_code, join, 105, error_no))]
+    raise ValueError(f"Unknown climate field {field}")
+
+
+def _send_field(area_code: int, field: str, value):
     try:
-        log(f"🔄 Handling Climate message")
+        for kind, label, type, hex_string in _field_packets(area_code, field, value):
+            log.debug("📤 Sending Dynalite Packet [%s] → %s", label, hex_string)
+            _pub2dynet(type=type,hex_string=hex_string,kind=kind,area=area_code)
+    except Exception as e:
+        log.error("❌ Failed to publish %s: %s", FIELD_LABELS.get(field, field), e)
 
-        try:
-            device_id = topic.split("/")[-2]
-            area_code = int(device_id.split("_")[-1])
-            log(f"🏷️  Area Code: {area_code}")
-        except Exception as e:
-            log(f"❌ Failed to extract area from topic: {e}")
+
+def _send_current_temp(area_code: int, current_temp: float):
+    _send_field(area_code, "current_temp", current_temp)
+
+
+#deadband/rate limit for the temperature channel, trailing sends go via _send_current_temp
+temp_limiter = TemperatureLimiter(
+    _send_current_temp,
+    step=TEMP_PRECISION,
+    hysteresis=TEMP_HYSTERESIS,
+    deadband=TEMP_DEADBAND,
+    min_interval=TEMP_MIN_INTERVAL,
+    settle=TEMP_SETTLE_INTERVAL,
+    overrides=TEMP_AREA_OVERRIDES
+)
+
+
+def handle_climate_message(topic: str, state, force=False, unit=None):
+    if batcher:
+        batcher.begin_area()
+    try:
+        log.debug("🔄 Handling Climate message")
+
+        unit = unit or area_registry.lookup(topic)
+        if unit is None:
+            log.every(topic, 300, "⚠️ No Dynalite area mapped for %s — skipping", topic, level=logger.WARNING)
+            m_skipped.inc("unknown_area")
             return
+        area_code = unit.area
+        log.debug("🏷️  Area Code: %s", area_code)
 
         # Extract state
         try:
             setpoint     = state.get("temperature")
-            current_temp = round(float(state.get("current_temperature", 0)) * 2) / 2  # nearest 0.5     
+            current_temp = temp_limiter.quantize(area_code, state.get("current_temperature", 0))  # TEMP_PRECISION step with hysteresis
             hvac_mode    = state.get("hvac_mode")
             fan_mode     = state.get("fan_mode")
             status       = state.get("status")
@@ -96,11 +328,12 @@ def handle_climate_message(topic: str, state):
                 raise ValueError(f"Missing keys: {', '.join(missing)}")
 
         except Exception as e:
-            log(f"❌ Failed to extract valid state: {e}")
+            log.error("❌ Failed to extract valid state: %s", e)
             return
 
         # Log new state
-        log(f"🌡️ Parsed State → Setpoint: {setpoint}, Temp: {current_temp}, Mode: {hvac_mode}, Fan: {fan_mode}, Status: {status}")
+        log.debug("🌡️ Parsed State → Setpoint: %s, Temp: %s, Mode: %s, Fan: %s, Status: %s",
+                  setpoint, current_temp, hvac_mode, fan_mode, status)
 
         new_state = {
             "setpoint": setpoint,
@@ -109,97 +342,42 @@ def handle_climate_message(topic: str, state):
             "fan_mode": fan_mode,
             "status": status
         }
-        prev_state = last_state.get(area_code, {})
+        prev_state = last_state.get(area_code) or {}
+        changed = list(FIELDS) if force else last_state.diff(area_code, new_state)
 
-        if new_state == prev_state:
-            log("✅ No change in climate state — skipping publish")
+        if not changed:
+            log.debug("✅ No change in climate state — skipping publish")
+            m_skipped.inc("no_change")
             return
 
-
-        # Compare and publish only if changed
-
-        if new_state["setpoint"] != prev_state.get("setpoint"):
-            log(f"📡 Setpoint changed from {prev_state.get('setpoint')} -> {new_state['setpoint']}")
-            try:
-                setpoint_hex = build_area_setpoint_body(area=area_code, join=OUT_JOIN, setpoint=setpoint)
-                log(f"📤 Sending Dynalite Packet [Set_Point] → {setpoint_hex}")
-                _pub2dynet(type="dynet2",hex_string=setpoint_hex)
-                #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": setpoint_hex})
-            except Exception as e:
-                log(f"❌ Failed to publish setpoint: {e}")
-
-        if new_state["current_temp"] != prev_state.get("current_temp"):
-            log(f"📡 Current Temp changed from {prev_state.get('current_temp')} -> {new_state['current_temp']}")            
-            try:
-                temp_hex = build_area_temperature_body(area=area_code, join=OUT_JOIN, temp=current_temp)
-                log(f"📤 Sending Dynalite Packet [Cur_Temp] → {temp_hex}")
-                _pub2dynet(type="dynet2",hex_string=temp_hex)
-                #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": temp_hex})
-            except Exception as e:
-                log(f"❌ Failed to publish temperature: {e}")
-
-        if new_state["hvac_mode"] != prev_state.get("hvac_mode"):
-            log(f"📡 HVAC Mode changed from {prev_state.get('hvac_mode')} -> {new_state['hvac_mode']}")            
-            try:
-                on_off = 0 if hvac_mode.lower() == "off" else 1
-                onoff_hex = build_channel_level_body(area=area_code, join=OUT_JOIN, channel=101, level=on_off)
-                log(f"📤 Sending Dynalite Packet [On/Off] → {onoff_hex}")
-                _pub2dynet(type="dynet2",hex_string=onoff_hex)
-                #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": onoff_hex})
-
-                hvac_map = {"cool": 0, "heat": 1, "fan": 2, "dry": 3, "auto": 4, "off" :0} #add off as a map here same as Cool
-                hvac_num = hvac_map.get(hvac_mode.lower())
-                if hvac_num is not None:
-                    hvac_hex = build_channel_level_body(area=area_code, join=OUT_JOIN, channel=102, level=hvac_num)
-                    log(f"📤 Sending Dynalite Packet [Mode] → {hvac_hex}")
-                    _pub2dynet(type="dynet2",hex_string=hvac_hex)                    
-                    #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": hvac_hex})
-                else:
-                    log(f"❌ Unknown HVAC mode: {hvac_mode}")
-            except Exception as e:
-                log(f"❌ Failed to publish HVAC mode: {e}")
-
-        if new_state["fan_mode"] != prev_state.get("fan_mode"):
-            log(f"📡 Fan Mode changed from {prev_state.get('fan_mode')} -> {new_state['fan_mode']}")            
-            try:
-                fan_map = {"low": 0, "med": 1, "high": 2, "top": 3, "auto": 4}
-                fan_num = fan_map.get(fan_mode.lower())
-                if fan_num is not None:
-                    fan_hex = build_channel_level_body(area=area_code, join=OUT_JOIN, channel=103, level=fan_num)
-                    log(f"📤 Sending Dynalite Packet [Fan] → {fan_hex}")
-                    _pub2dynet(type="dynet2",hex_string=fan_hex)   
-                    #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": fan_hex})
-                else:
-                    log(f"❌ Unknown Fan mode: {fan_mode}")
-            except Exception as e:
-                log(f"❌ Failed to publish Fan mode: {e}")
-
-        if new_state["status"] != prev_state.get("status"):
-            log(f"📡 Status changed from {prev_state.get('status')} -> {new_state['status']}")            
-            try:
-                error_no = 0 if status.lower() == "ok" else 1
-                status_hex = build_channel_level_body(area=area_code, join=OUT_JOIN, channel=105, level=error_no)
-                log(f"📤 Sending Dynalite Packet [Status] → {status_hex}")
-                #mqtt_client.publish("dynalite/set", {"type": "dynet2", "hex_string": status_hex})
-                _pub2dynet(type="dynet2",hex_string=status_hex)               
-            except Exception as e:
-                log(f"❌ Failed to publish error status: {e}")
-
-
         # Cache updated state
-        last_state[area_code] = new_state
+        last_state.update(area_code, new_state)
+
+        # Publish only what changed
+        for field in changed:
+            log.debug("📡 %s changed from %s -> %s", FIELD_LABELS[field], prev_state.get(field), new_state[field])
+            if field == "current_temp":
+                #limiter sends now, or holds the value for a trailing send
+                if not temp_limiter.offer(area_code, current_temp, force=force):
+                    log.debug("⏳ Current Temp %s held by deadband/rate limit for Area %s", current_temp, area_code)
+                continue
+            _send_field(area_code, field, new_state[field])
 
     except Exception as e:
-        log(f"❌ Failed handling Climate message: {e}")
+        log.error("❌ Failed handling Climate message: %s", e)
+    finally:
+        #one frame per area update in batch "area" mode
+        if batcher:
+            batcher.end_area()
 
 
 
 def force_climate_resend(area_code: int):
     if area_code not in last_state:
-        log(f"⚠️ Area {area_code} not found in cache")
+        log("⚠️ Area %s not found in cache", area_code)
         return
-    log(f"🔁 Forcing full climate resend for Area {area_code}")
-    cached = last_state[area_code].copy()
+    log("🔁 Forcing full climate resend for Area %s", area_code)
+    cached = last_state.get(area_code)
     # Map internal cache → MQTT-style keys
     mqtt_state = {
         "temperature": cached["setpoint"],
@@ -208,227 +386,625 @@ def force_climate_resend(area_code: int):
         "fan_mode": cached["fan_mode"],
         "status": cached["status"]
     }
-    # Stale cache to force publishing
-    last_state[area_code] = {}
+    #pass the unit, a guessed one must not be learned through its topic
+    unit = area_registry.for_area(area_code)
+    if unit is None:
+        log("⚠️ No climate unit mapped for Area %s", area_code)
+        return
     handle_climate_message(
-        f"homeassistant/climate/coolmaster_L1_{area_code}/state",
-        mqtt_state
+        unit.state_topic,
+        mqtt_state,
+        force=True,
+        unit=unit
     )
 
 
+#expired/failed commands are resent with backoff, areas that keep failing get a full resend
+retries = RetryEngine(
+    resend=lambda p: _pub2dynet(p["type"], p["hex_string"], p["comment"], p["kind"], p["area"], p["attempt"]),
+    resync=force_climate_resend,
+    max_attempts=RETRY_MAX_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY,
+    jitter=RETRY_JITTER,
+    budget=RETRY_BUDGET,
+    budget_window=RETRY_BUDGET_WINDOW,
+    resync_interval=RETRY_RESYNC_INTERVAL
+) if RETRY_MAX_ATTEMPTS > 0 else None
 
-def handle_dynalite_message(topic: str, dynalite):
+
+def _desired_packets(area_code: int, field: str):
+    value = last_state.get_field(area_code, field)
+    return [] if value is None else _field_packets(area_code, field, value)
+
+
+def _mark_if_acked(area_code: int, field: str):
+    #field synced once every packet of its current value is acked (hvac_mode = on/off + mode)
+    if all(acked_state.acked(area_code, kind, hex_string) for kind, label, type, hex_string in _desired_packets(area_code, field)):
+        last_state.mark_synced(area_code, field)
+
+
+def _note_acked(area_code, kind):
+    field = KIND_FIELDS.get(kind)
+    if field is not None and area_code in last_state:
+        _mark_if_acked(area_code, field)
+
+
+#after a reconnect/bridge online, only dirty fields whose packets differ from the last ack go out, paced
+resync = ResyncPacer(
+    acked_state,
+    packets=lambda: last_state.resync_packets(_desired_packets, last_state.dirty_fields()),
+    send=lambda area, kind, type, hex_string: _pub2dynet(type, hex_string, "resync", kind, area),
+    ready=lambda: all(bridge_online.values()),
+    rate=RESYNC_RATE,
+    settle=RESYNC_SETTLE
+) if RESYNC_RATE > 0 else None
+
+
+#keypad requests are answered from per-area encoded packets, re-encoded only when a value changed
+reply_bundles = ReplyBundles(last_state.get_field, _field_packets, window=REQUEST_COLLAPSE_WINDOW)
+REPLY_FIELDS = parse_reply_fields(REQUEST_REPLY_FIELDS)
+
+
+def answer_request(area_code: int, fields=REPLY_FIELDS):
+    if area_code not in last_state:
+        log("⚠️ Area %s not found in cache", area_code)
+        return
+    reply = reply_bundles.request(area_code, fields)
+    if reply is None:
+        log.debug("🔂 Request for Area %s already answered within %ss — collapsed", area_code, REQUEST_COLLAPSE_WINDOW)
+        m_skipped.inc("request_collapsed")
+        return
+    log.debug("🔁 Answering request for Area %s → %s", area_code, ", ".join(field for field, packets in reply))
+    if batcher:
+        batcher.begin_area()
     try:
-        log(f"🔄 Handling Dynalite message {dynalite.get('description', '')}")
-        #do not process FE joins and/or where the device/box=bb 08
-        #this avoids loop backs when issuing commands
-        
-        description = str(dynalite.get("description", "").lower())
-        template = dynalite.get("template", "")
-        type = dynalite.get("type")
-        fields = dynalite.get("fields")
-  
-        if "join fe" in description:
-            log(f"⛔ Skipping due to Join FE → {description}")
-            return
+        for field, packets in reply:
+            for kind, label, type, hex_string in packets:
+                _pub2dynet(type=type, hex_string=hex_string, comment="request", kind=kind, area=area_code)
+            if field == "current_temp":
+                temp_limiter.note_sent(area_code, last_state.get_field(area_code, field))
+    except Exception as e:
+        log.error("❌ Failed answering request for Area %s: %s", area_code, e)
+    finally:
+        if batcher:
+            batcher.end_area()
 
-        #handle requests, which is usually a keypad requesting updated
-        #data from system, so stale the cache and resend out the area data
-        #for this hvac
-        #request user temperature set point = #dynet1
-        #request temperature set point = #dynet2
-        if "request user temperature set point" in description or "request temperature set point" in description:
-            if type =="dynet1":
-                if not len(fields) == 2:
-                    log(f"⛔ Field length for Dynet1 Setpoint [REQUEST] is more than 2 → {dynalite}")
-                    return   
-                area = fields[0]
-                join = fields[1]
-            elif type =="dynet2":
-                if not len(fields) == 4:
-                    log(f"⛔ Field length for Dynet2 Setpoint [REQUEST] is more than 4 → {dynalite}")
-                    return
-                area = fields[2]
-                join = fields[3]
-            #function calls handler and stales cache, it also checks area exists
-            force_climate_resend(area)
-            return
-        
-                
-        if "set temperature set point to" in description:
-            if type =="dynet1":
-                #got dynet 1, we know field format is Area, Join, Setpoint
-                if not len(fields) == 3:
-                    log(f"⛔ Field length for Dynet1 Setpoint is more than 3 → {dynalite}")
-                    return   
-                area = fields[0]
-                join = fields[1]
-                setpoint = fields[2]
-            elif type =="dynet2":
-                if not len(fields) == 5:
-                    log(f"⛔ Field length for Dynet2 Setpoint is more than 5 → {dynalite}")
-                    return
-                #got dynet 2, we know field format is more complicated :)
-                area = fields[2]
-                join = fields[3]
-                setpoint = fields[4]
-            if area not in last_state:
-                log(f"⚠️ Area {area} not in cache (not a command for climate related area) — skipping publish")
-                return
-            topic_out = f"homeassistant/climate/coolmaster_L1_{area}/set/temperature"
-            mqtt_client.publish(topic_out, setpoint)
-            log(f"✅ Setpoint {setpoint} -> {area} ")
-            last_state[int(area)]["setpoint"] = setpoint
+
+def _retry_failed(entry, reason):
+    #nothing to retry into while the Dynalite bridge is offline
+    if retries and bridge_online["dynalite"] and "hex_string" in entry.data:
+        retries.failed({**entry.data, "kind": entry.kind, "comment": entry.comment}, reason)
+
+
+
+def _skip_loopback(handler):
+    #do not process FE joins and/or where the device/box=bb 08
+    #this avoids loop backs when issuing commands
+    def wrapped(area, join, channel, value, dynalite):
+        if join_value(join) == 0xFE:
+            log.debug("⛔ Skipping due to Join FE → %s", dynalite.get('description', ''))
+            m_skipped.inc("loopback")
             return
+        return handler(area, join, channel, value, dynalite)
+    return wrapped
+
+
+#handle requests, which is usually a keypad requesting updated
+#data from system, so send the area data for this hvac
+#(REQUEST_REPLY_FIELDS) from its reply bundle
+#request user temperature set point = #dynet1
+#request temperature set point = #dynet2
+@_skip_loopback
+def _on_request_setpoint(area, join, channel, value, dynalite):
+    #checks area exists, repeats within REQUEST_COLLAPSE_WINDOW are collapsed
+    answer_request(area)
+
+
+def _ha_unit(area):
+    #areas from the snapshot or the bus have no HA entity when CLIMATE_AREAS_LEARN=false
+    unit = area_registry.for_area(area)
+    if unit is None:
+        log.every(("no_unit", area), 300, "⚠️ No climate unit mapped for Area %s — skipping", area, level=logger.WARNING)
+        m_skipped.inc("unknown_area")
+    return unit
+
+
+@_skip_loopback
+def _on_set_setpoint(area, join, channel, setpoint, dynalite):
+    if area not in last_state:
+        log.debug("⚠️ Area %s not in cache (not a command for climate related area) — skipping publish", area)
+        m_skipped.inc("not_in_cache")
+        return
+    unit = _ha_unit(area)
+    if unit is None:
+        return
+    mqtt_client.publish(unit.set_temperature_topic, setpoint)
+    log("✅ Setpoint %s -> %s ", setpoint, area)
+    last_state.set_field(int(area), "setpoint", setpoint)
 
-        #handle all other commands    
-        elif "recall level" in description:
-            if type == "dynet1":
-                if not len(fields) == 5:
-                    log(f"⛔ Field length for Dynet1 Recall Level must be 4 → {dynalite}")
-                    return
-                #field len is 5
-                area = fields[0]
-                join = fields[1]
-                channel = fields[2]
-                level = int(fields[3].strip('%'))
-            elif type == "dynet2":
-                if not len(fields) == 7:
-                    log(f"⛔ Field length for Dynet2 Recall Level must be 6 → {dynalite} FIELD{len(fields)}")
-                    return
-                #field len is 7
-                area = fields[2]
-                join = fields[3]
-                channel = fields[4]
-                level = int(fields[5].strip('%'))
-            else:   
-                log(f"⛔ Unknown type → {dynalite}")
-                return
-            
-            if area not in last_state:
-                log(f"⚠️ Area {area} not in cache (not a command for climate related area) — skipping publish")
-                return
-            
-            if channel not in [101, 102, 103]:
-                log(f"⚠️ Channel {channel} is not HVAC command (101,102,103) — skipping")
-                return
-            
-            log(f"recall level for area{area} channel{channel} level{level} join{join}")
-
-            #update on/off
-            if channel == 101:
-                mode = "off" if level == 0 else "auto"
-                topic_out = f"homeassistant/climate/coolmaster_L1_{area}/set/mode"
-                mqtt_client.publish(topic_out, mode)
-                log(f"✅ HVAC mode {mode} -> {area} ")
-                #TODO update cache
-                return
-            #update mode
-            elif channel == 102:
-                hvac_modes = ["cool", "heat", "fan", "dry", "auto"]
-                if 0 <= level < len(hvac_modes):
-                    mode = hvac_modes[level]
-                    topic_out = f"homeassistant/climate/coolmaster_L1_{area}/set/mode"
-                    mqtt_client.publish(topic_out, mode)
-                    log(f"✅ HVAC mode {mode} -> {area} ")
-                    #TODO update cache
-                    last_state[int(area)]["hvac_mode"] = mode
-                return
-            #update fan
-            elif channel ==103:
-                fan_modes = ["low", "medium", "high", "top", "auto"]
-                if 0 <= level < len(fan_modes):
-                    mode = fan_modes[level]
-                    topic_out = f"homeassistant/climate/coolmaster_L1_{area}/set/fan_mode"
-                    mqtt_client.publish(topic_out, mode)
-                    log(f"✅ Fan mode {mode} -> {area} ")
-                    #TODO update cache
-                    last_state[int(area)]["fan_mode"] = mode
-                return
 
+@_skip_loopback
+def _on_recall_level(area, join, channel, level, dynalite):
+    level = int(str(level).strip('%'))
 
-        log("✅ Skipped Dynalite Message")
+    if area not in last_state:
+        log.debug("⚠️ Area %s not in cache (not a command for climate related area) — skipping publish", area)
+        m_skipped.inc("not_in_cache")
+        return
+    
+    if channel not in [101, 102, 103]:
+        log.debug("⚠️ Channel %s is not HVAC command (101,102,103) — skipping", channel)
+        m_skipped.inc("not_hvac_channel")
+        return
+    
+    log.debug("recall level for area%s channel%s level%s join%s", area, channel, level, join)
+
+    unit = _ha_unit(area)
+    if unit is None:
+        return
+
+    #update on/off
+    if channel == 101:
+        mode = "off" if level == 0 else "auto"
+        mqtt_client.publish(unit.set_mode_topic, mode)
+        log("✅ HVAC mode %s -> %s ", mode, area)
+        #TODO update cache
+        return
+    #update mode
+    elif channel == 102:
+        hvac_modes = ["cool", "heat", "fan", "dry", "auto"]
+        if 0 <= level < len(hvac_modes):
+            mode = hvac_modes[level]
+            mqtt_client.publish(unit.set_mode_topic, mode)
+            log("✅ HVAC mode %s -> %s ", mode, area)
+            #TODO update cache
+            last_state.set_field(int(area), "hvac_mode", mode)
+        return
+    #update fan
+    elif channel ==103:
+        fan_modes = ["low", "medium", "high", "top", "auto"]
+        if 0 <= level < len(fan_modes):
+            mode = fan_modes[level]
+            mqtt_client.publish(unit.set_fan_mode_topic, mode)
+            log("✅ Fan mode %s -> %s ", mode, area)
+            #TODO update cache
+            last_state.set_field(int(area), "fan_mode", mode)
+        return
+
+
+def _is_echo(kind, area, join, channel, value) -> bool:
+    #our own packet reported back by the bus, any join
+    if echo_filter is not None and echo_filter.is_echo(kind, area, join, channel, value):
+        log.debug("⛔ Skipping echo of our own packet → %s Area %s Channel %s Value %s", kind, area, channel, value)
+        m_skipped.inc("echo")
+        return True
+    return False
+
+
+def _on_unhandled_dynalite(dynalite):
+    log.debug("✅ Skipped Dynalite Message")
+    m_skipped.inc("unhandled_dynalite")
+
+
+def _on_invalid_dynalite(dynalite):
+    log.sample("invalid_dynalite", 10, "⛔ Unexpected type/field count for %s → %s", dynalite.get('type'), dynalite, level=logger.WARNING)
+    m_skipped.inc("invalid_fields")
+
+
+#one handler per message kind, routed on (type, template)
+dynalite_dispatcher = DynetDispatcher(
+    {
+        REQUEST_SETPOINT: _on_request_setpoint,
+        SET_SETPOINT: _on_set_setpoint,
+        RECALL_LEVEL: _on_recall_level,
+    },
+    fallback=_on_unhandled_dynalite,
+    invalid=_on_invalid_dynalite,
+    echo=_is_echo
+)
+
+#bus traffic for other areas/kinds dropped from the raw bytes, before the JSON parse
+bus_filter = BusPrefilter(dynalite_dispatcher, last_state.__contains__) if DYNALITE_PREFILTER else None
+
+
+def handle_dynalite_message(topic: str, dynalite):
+    try:
+        log.debug("🔄 Handling Dynalite message %s", dynalite.get('description', ''))
+        dynalite_dispatcher.dispatch(dynalite)
     except Exception as e:
-        log(f"❌ Failed handling Dynalite message: {e}")
+        log.error("❌ Failed handling Dynalite message: %s", e)
+
+
+def _is_online(payload) -> bool:
+    if isinstance(payload, bytes):
+        return payload.strip().lower() == b"online"
+    return payload.strip().lower() == "online"
+
+
+# MQTT Message handler, payload is the raw bytes from paho (str also accepted)
+def handle_set_response(topic, payload):
+    try:
+        parsed = json_codec.loads(payload)
+    except Exception as e:
+        log.error("❌ Invalid JSON on %s: %s", topic, e)
+        m_skipped.inc("invalid_json")
+        return
+    response_id = topic.split("/")[-1]
+    result = parsed if isinstance(parsed, dict) else {}
+
+    entry, elapsed = pending_responses.ack(response_id)
+
+    if entry:
+        comment = entry.comment or "-"
+        status = result.get("status", "Unknown")
+        ok = str(status).lower() == "ok"
+        if ok and "hex_string" in entry.data:
+            acked_state.ack(entry.data.get("area"), entry.kind, entry.data["hex_string"])
+            _note_acked(entry.data.get("area"), entry.kind)
+        if not ok:
+            log.error("❌❌❌ Response ID %s acknowledged — Status: %s, Time: %.2fs, Comment: %s", response_id, status, elapsed, comment)
+        _window_feedback(elapsed if ok else None)
+        if not ok:
+            _retry_failed(entry, f"status {status}")
+    else:
+        log.warning("⚠️❌❌ Response ID %s not found in pending_responses (maybe expired or duplicate)", response_id)
+        m_skipped.inc("unknown_response")
 
 
-# MQTT Message handler
 def handle_mqtt_command(topic, payload):
+    started = time.perf_counter()
+    topic_class = _topic_class(topic)
+    m_received.inc(topic_class)
     try:
         #log(f"📥 Received on {topic}: {payload}")
-        #first check if bridges are online
-        if topic == MQTT_DYNALITE_WILL:
-            online = payload.lower() == "online"
-            bridge_online["dynalite"] = online
-        elif topic == MQTT_CLIMATE_WILL:
-            online = payload.lower() == "online"
-            bridge_online["climate"] = online
+        #first check if bridges are online, status payloads are plain text
+        if topic_class == "trace":
+            handle_trace_command(payload)
+            return
+        elif topic_class == "dynalite_status":
+            _set_bridge_online("dynalite", _is_online(payload))
+            return
+        elif topic_class == "climate_status":
+            _set_bridge_online("climate", _is_online(payload))
+            return
+        elif topic_class == "set_response":
+            #acks keep coming while only the climate bridge is down, dropping them would expire and retry the commands
+            handle_set_response(topic, payload)
+            return
 
         if not all(bridge_online.values()):
             offline = [name for name, status in bridge_online.items() if not status]
-            log(f"⏳ Waiting for dependent bridge(s) to come online: {', '.join(offline)}")
+            log.every("bridge_offline", 30, "⏳ Waiting for dependent bridge(s) to come online: %s", ', '.join(offline))
+            m_skipped.inc("bridge_offline")
             return
-        
 
+        if topic_class == "other":
+            m_skipped.inc("other_topic")
+            return
+
+        #most bus traffic is lighting/presets or other areas, drop it unparsed (with shards, _shard_key did)
+        if topic_class == "dynalite_bus" and bus_filter is not None and not isinstance(inbound, ShardedMessageQueue):
+            reason = bus_filter.check(payload)
+            if reason:
+                m_skipped.inc(reason)
+                return
 
-        # Parse JSON
+        # Parse JSON, once, straight from the raw payload
         try:
-            parsed = json.loads(payload)
+            parsed = json_codec.loads(payload)
         except Exception as e:
-            log(f"❌ Invalid JSON: {e}")
+            log.error("❌ Invalid JSON on %s: %s", topic, e)
+            m_skipped.inc("invalid_json")
             return
 
         #if topic is on Climate prefix
-        if topic.startswith(MQTT_CLIMATE_PREFIX):
+        if topic_class == "climate_state":
             handle_climate_message(topic, parsed)
             return
         #if topic is on Dynalite Bus SET
-        elif topic == MQTT_DYNALITE_PREFIX:
+        elif topic_class == "dynalite_bus":
             handle_dynalite_message(topic, parsed)
             return
-        elif topic.startswith(f"{MQTT_DYNALITE_PREFIX}/set/res/"):
-            response_id = topic.split("/")[-1]
-            
-            try:
-                result = json.loads(payload)
-            except Exception as e:
-                log(f"❌ Invalid JSON in response for ID {response_id}: {e}")
-                return
-
-            entry = pending_responses.pop(response_id, None)
-            
-            if entry:
-                elapsed = (datetime.now(timezone.utc) - entry["sent_at"]).total_seconds()
-                comment = entry.get("comment", "-")
-                status = result.get("status", "Unknown")
-                if str(status).lower() != "ok":
-                    log(f"❌❌❌ Response ID {response_id} acknowledged — Status: {status}, Time: {elapsed:.2f}s, Comment: {comment}")
-            else:
-                log(f"⚠️❌❌ Response ID {response_id} not found in pending_responses (maybe expired or duplicate)")
-            
-            return
         
               
     except Exception as e:
-        log(f"❌ Handler crashed: {e}")
+        log.error("❌ Handler crashed: %s", e)
+    finally:
+        m_handler.observe(topic_class, time.perf_counter() - started)
+
+
+def _trace_targets():
+    #(object, attribute, stage) swapped for timing wrappers while tracing is on
+    module = sys.modules[__name__]
+    queues = inbound.shards if isinstance(inbound, ShardedMessageQueue) else [inbound]
+    return [
+        (mqtt_client.transport if mqtt_client else None, "on_message", "receive"),
+        *((queue, "handler", "handle_message") for queue in queues if queue is not None),
+        (json_codec, "loads", "json_parse"),
+        (bus_filter, "check_area", "bus_prefilter"),
+        (dynalite_dispatcher, "dispatch", "dynalite_dispatch"),
+        (module, "handle_climate_message", "climate_handler"),
+        (ClimateStateTable, "diff", "state_diff"),
+        (module, "handle_set_response", "set_response"),
+        (module, "_field_packets", "dynet_encode"),
+        #the hex builders as main calls them (dynet_codec), and the string builders kept in dynet_mqtt
+        *((module, name, f"dynet_codec.{name}") for name in ("setpoint_hex", "temperature_hex", "channel_level_hex")),
+        *((dynet_mqtt, name, f"dynet_mqtt.{name}") for name in (
+            "build_area_setpoint_body", "build_area_temperature_body", "build_channel_level_body")),
+        (module, "_publish_dynet", "dynet_publish"),
+        (mqtt_client, "publish", "mqtt_publish"),
+    ]
+
+
+def trace_dump():
+    since = time.strftime("%H:%M:%S", time.localtime(tracer.since)) if tracer.since else "-"
+    log("🔬 Stage timings since %s (inclusive)", since)
+    for line in tracer.report():
+        log("🔬 %s", line)
+    if mqtt_client:
+        mqtt_client.publish(f"{TRACE_TOPIC}/stats", tracer.snapshot())
+
+
+def start_profile(arg):
+    global profile_task
+    #writes files into TRACE_DIR, so only with TRACE_PROFILE and one run at a time
+    if not TRACE_PROFILE:
+        log.warning("⚠️ Profile command ignored, set TRACE_PROFILE=true to allow it")
+        return
+    if profile_task is not None and not profile_task.done():
+        log.warning("⚠️ Profile already running, ignoring the new request")
+        return
+    try:
+        seconds = float(arg) if arg else 10.0
+    except ValueError:
+        log.warning("⚠️ Bad profile duration %r", arg)
+        return
+    if not 0 < seconds <= TRACE_PROFILE_MAX:
+        log.warning("⚠️ Profile duration must be between 0 and %gs, got %s", TRACE_PROFILE_MAX, arg)
+        return
+    profile_task = asyncio.get_running_loop().create_task(
+        profile(seconds, TRACE_DIR, TRACE_SAMPLE_INTERVAL), name="trace-profile")
+    profile_task.add_done_callback(_profile_done)
+
+
+def _profile_done(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("❌ Profile failed: %r", task.exception())
+
+
+def handle_trace_command(payload):
+    #on | off | reset | dump | profile [seconds]
+    text = payload.decode(errors="replace") if isinstance(payload, bytes) else str(payload)
+    command, _, arg = text.strip().lower().partition(" ")
+    if command == "on":
+        tracer.enable(_trace_targets())
+    elif command == "off":
+        tracer.disable()
+    elif command == "reset":
+        tracer.reset()
+    elif command == "dump":
+        trace_dump()
+    elif command == "profile":
+        start_profile(arg)
+    else:
+        log.warning("⚠️ Unknown trace command %r, expected on | off | reset | dump | profile [seconds]", text)
+
+
+def _window_feedback(latency=None):
+    #ack latency grows/shrinks the in-flight window, None = lost (expired/failed)
+    if not scheduler:
+        return
+    if scheduler.window:
+        if latency is None:
+            scheduler.window.on_loss()
+        else:
+            scheduler.window.on_ack(latency)
+    scheduler.wake()
+
+
+def _register_metrics():
+    metrics.histogram("ack_latency_seconds", "Latency from /set publish to /set/res ack per packet kind", "kind",
+                      source=pending_responses.latency)
+    metrics.gauge("responses_pending", "Commands waiting for a /set/res ack", lambda: len(pending_responses))
+    metrics.counter_fn("responses_total", "Pending response outcomes", lambda: {
+        outcome: pending_responses.stats()[outcome] for outcome in ("acked", "expired", "evicted", "unknown")
+    }, ("outcome",))
+    metrics.gauge("bridge_online", "Dependent bridge status (1 = online)",
+                  lambda: {name: int(online) for name, online in bridge_online.items()}, ("bridge",))
+    metrics.counter_fn("bridge_offline_seconds_total", "Time dependent bridges spent offline", _bridge_offline_seconds, ("bridge",))
+    metrics.gauge("inbound_queue_depth", "Messages waiting in the inbound queue", lambda: inbound.depth())
+    metrics.counter_fn("inbound_queue_dropped_total", "Messages dropped by the inbound queue policy", lambda: inbound.dropped)
+    if isinstance(inbound, ShardedMessageQueue):
+        metrics.gauge("inbound_shard_depth", "Messages waiting per inbound shard", inbound.shard_depths, ("shard",))
+        metrics.histogram("inbound_shard_latency_seconds", "Time from arrival to handled per inbound shard", "shard",
+                          source={str(i): shard.latency for i, shard in enumerate(inbound.shards)})
+    metrics.counter_fn("temperature_packets_suppressed_total", "Temperature packets held back per reason", lambda: {
+        "deadband": temp_limiter.suppressed_deadband, "rate": temp_limiter.suppressed_rate
+    }, ("reason",))
+    metrics.counter_fn("log_lines_dropped_total", "Log lines dropped because the log writer fell behind", lambda: logger.dropped)
+    if bus_filter is not None:
+        metrics.counter_fn("bus_prefiltered_total", "Dynalite bus messages dropped before the JSON parse per reason",
+                           lambda: bus_filter.stats()["filtered"], ("reason",))
+    metrics.counter_fn("keypad_requests_total", "Keypad set point requests, answered or collapsed", lambda: {
+        "answered": reply_bundles.requests - reply_bundles.collapsed, "collapsed": reply_bundles.collapsed}, ("outcome",))
+    if resync:
+        metrics.counter_fn("resync_runs_total", "Incremental resyncs after a reconnect/bridge online", lambda: resync.runs)
+        metrics.counter_fn("resync_packets_total", "Packets sent by incremental resyncs", lambda: resync.sent)
+    if retries:
+        metrics.counter_fn("retries_total", "Retry engine outcomes for expired/failed commands", lambda: {
+            outcome: retries.stats()[outcome] for outcome in ("scheduled", "sent", "superseded", "exhausted", "over_budget")
+        }, ("outcome",))
+        metrics.counter_fn("retry_resyncs_total", "Full area resends after retries ran out", lambda: retries.resyncs)
+    if scheduler:
+        metrics.histogram("outbound_wait_seconds", "Time Dynet packets waited in the outbound queue per priority class",
+                          "class", source=scheduler.wait)
+        metrics.gauge("outbound_queue_depth", "Dynet packets waiting in the outbound queue per priority class",
+                      scheduler.depth, ("class",))
+        metrics.counter_fn("outbound_bytes_total", "Estimated Dynet bus bytes sent", lambda: scheduler.bytes_sent)
+        metrics.counter_fn("outbound_coalesced_total", "Queued Dynet packets replaced by a newer value for the same area/channel",
+                           lambda: scheduler.stats()["coalesced"], ("class",))
+        if scheduler.window:
+            metrics.gauge("outbound_window", "Unacknowledged /set commands allowed in flight", lambda: int(scheduler.window.size))
+            metrics.counter_fn("outbound_window_decreases_total", "In-flight window reductions (expiry, failure, slow ack)",
+                               lambda: scheduler.window.decreases)
+    if batcher:
+        metrics.counter_fn("batch_frames_sent_total", "Multi-packet frames sent on /set", lambda: batcher.frames_sent)
+
+
+def restore_state():
+    #warm restart, load the last known state per area before any subscriptions
+    snapshot = read_snapshot(STATE_SNAPSHOT_PATH)
+    for area, state in snapshot_section(snapshot).items():
+        if not all(state.get(field) is not None for field in FIELDS):
+            log("⚠️ Skipping incomplete snapshot state for Area %s", area)
+            continue
+        last_state.update(area, state)
+        temp_limiter.seed(area, state["current_temp"])
+    #only packets acked before the shutdown count as delivered, resync sends the rest
+    acked_state.load(snapshot_section(snapshot, "acked"))
+    for area, fields in last_state.dirty_fields().items():
+        for field in fields:
+            _mark_if_acked(area, field)
 
 
-async def sweep_pending_responses(ttl=15):
+async def sweep_pending_responses():
     while True:
-        now = datetime.now(timezone.utc)
-        expired = [rid for rid, meta in pending_responses.items()
-                   if (now - meta["sent_at"]).total_seconds() > ttl]
-        for rid in expired:
-            meta = pending_responses.pop(rid, None)
-            log(f"⚠️❌⚠️ Expired Response ID {rid} — Full data: {json.dumps(meta, default=str)}")
-            #pending_responses.pop(rid, None)
-        await asyncio.sleep(ttl)
+        expired = pending_responses.expire()
+        for entry in expired:
+            log.warning("⚠️❌⚠️ Expired Response ID %s — Full data: %s", entry.response_id, entry.as_dict())
+            _retry_failed(entry, "expired")
+        if expired:
+            _window_feedback(None)
+        #sleep until the next deadline, or until a new entry brings it forward
+        await pending_responses.wait_next()
+
+
+async def log_stats(interval=MSG_QUEUE_STATS_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        stats = inbound.stats()
+        log(f"📊 Inbound queue → depth {stats['depth']}/{stats['maxsize']} (max {stats['max_depth']}), "
+            f"processed {stats['processed']}, dropped {stats['dropped']}, errors {stats['errors']}, "
+            f"avg wait {stats['avg_wait_ms']}ms, avg handle {stats['avg_handle_ms']}ms")
+        if "shards" in stats:
+            log(f"📊 Inbound shards → barriers {stats['barriers']}, held {stats['held']}, "
+                f"bus messages pre-filtered at enqueue {stats['filtered']}")
+        for i, shard in enumerate(stats.get("shards", ())):
+            log(f"📊 Inbound shard {i} → depth {shard['depth']} (max {shard['max_depth']}), processed {shard['processed']}, "
+                f"dropped {shard['dropped']}, avg wait {shard['avg_wait_ms']}ms, p99 ≤{shard['p99_ms']}ms")
+        stats = temp_limiter.stats()
+        log(f"📊 Temperature → sent {stats['sent']} (trailing {stats['trailing_sent']}), "
+            f"suppressed deadband {stats['suppressed_deadband']}, rate {stats['suppressed_rate']}, "
+            f"hysteresis holds {stats['held_hysteresis']}, pending {stats['pending']}")
+        stats = pending_responses.stats()
+        log(f"📊 Responses → pending {stats['pending']}, acked {stats['acked']}, expired {stats['expired']}, "
+            f"evicted {stats['evicted']}, unknown {stats['unknown']}")
+        for kind, hist in pending_responses.latency_snapshot().items():
+            log(f"📊 Ack latency [{kind}] → n={hist['count']} avg {hist['avg']*1000:.0f}ms, "
+                f"p50 ≤{hist['p50']*1000:.0f}ms, p99 ≤{hist['p99']*1000:.0f}ms, max {hist['max']*1000:.0f}ms")
+        if bus_filter is not None:
+            stats = bus_filter.stats()
+            log(f"📊 Bus pre-filter → checked {stats['checked']}, passed {stats['passed']}, "
+                f"dropped unhandled {stats['filtered']['unhandled_dynalite']}, other areas {stats['filtered']['not_in_cache']}")
+        stats = reply_bundles.stats()
+        if stats["requests"]:
+            log(f"📊 Keypad requests → {stats['requests']}, collapsed {stats['collapsed']}, "
+                f"packets encoded {stats['encoded']}, reused {stats['reused']}")
+        if resync:
+            stats = resync.stats()
+            log(f"📊 Resync → runs {stats['runs']}, fields checked {stats['checked']}, packets {stats['sent']}, stopped {stats['aborted']}")
+        if retries:
+            stats = retries.stats()
+            log(f"📊 Retries → scheduled {stats['scheduled']}, sent {stats['sent']}, superseded {stats['superseded']}, "
+                f"exhausted {stats['exhausted']}, over budget {stats['over_budget']}, resyncs {stats['resyncs']}, "
+                f"waiting {stats['pending']}")
+        stats = logger.stats()
+        if stats["dropped"] or stats["suppressed"]:
+            log(f"📊 Logging → written {stats['written']}, dropped {stats['dropped']}, rate limited {stats['suppressed']}")
+        if scheduler:
+            stats = scheduler.stats()
+            for name, hist in stats["wait"].items():
+                log(f"📊 Outbound [{name}] → sent {stats['sent'][name]}, coalesced {stats['coalesced'][name]}, queued {stats['depth'][name]}, "
+                    f"wait avg {hist['avg']*1000:.0f}ms, p99 ≤{hist['p99']*1000:.0f}ms, max {hist['max']*1000:.0f}ms")
+            if scheduler.window:
+                window = scheduler.window.stats()
+                log(f"📊 In-flight window → {window['window']} (in flight {len(pending_responses)}), srtt {window['srtt_ms']}ms, "
+                    f"+{window['increases']} / -{window['decreases']}, waits {stats['window_waits']}")
 
 
 # Async main
 async def main():
-    global mqtt_client
+    global mqtt_client, inbound, batcher, scheduler
+    logger.configure(LOG_LEVEL, ring_size=LOG_RING_SIZE, ring_level=LOG_RING_LEVEL or None, background=LOG_BACKGROUND)
     log("🚀 Starting HA Climate → Dynalite Bridge")
+    log(f"🧩 JSON codec: {json_codec.use(JSON_CODEC)}")
+    try:
+        #kill -USR1 <pid> dumps the recent log records to stderr
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, logger.dump_recent)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        pass
+
+    snapshots = None
+    if STATE_SNAPSHOT_PATH:
+        restore_state()
+        snapshots = SnapshotWriter(STATE_SNAPSHOT_PATH, last_state.to_dict, interval=STATE_SNAPSHOT_INTERVAL,
+                                   get_acked=acked_state.to_dict)
+
+    if DYNET_BATCH:
+        batcher = DynetBatcher(
+            _pub2dynet_frame,
+            mode=DYNET_BATCH,
+            window=DYNET_BATCH_WINDOW,
+            max_packets=DYNET_BATCH_MAX
+        )
+        log(f"📦 Dynet batch mode: {DYNET_BATCH}")
+
+    #interactive changes first, everything paced to the bus (DYNET_BUS_SHARE=0 -> priority only)
+    bus_rate = bus_bytes_per_second(DYNET_BUS_BAUD, DYNET_BUS_SHARE)
+    #unacked commands in flight capped by an AIMD window (DYNET_WINDOW=0 -> no cap)
+    window = AimdWindow(
+        initial=DYNET_WINDOW,
+        minimum=DYNET_WINDOW_MIN,
+        maximum=DYNET_WINDOW_MAX,
+        latency_target=DYNET_WINDOW_LATENCY
+    ) if DYNET_WINDOW > 0 else None
+    scheduler = OutboundScheduler(
+        _send_outbound,
+        rate=bus_rate,
+        burst=DYNET_BUS_BURST,
+        window=window,
+        in_flight=lambda: len(pending_responses),
+        begin_burst=batcher.begin_area if batcher else None,
+        end_burst=batcher.end_area if batcher else None
+    )
+    log(f"🚦 Outbound budget: {f'{bus_rate:.0f} bytes/s' if bus_rate else 'unlimited'}")
+
+    #capture incoming traffic for benchmarks/replay.py, written where the loop accepts a message
+    recorder = TrafficRecorder(MQTT_RECORD_PATH) if MQTT_RECORD_PATH else None
+    if recorder:
+        log(f"🎙️ Recording incoming MQTT traffic to {MQTT_RECORD_PATH}")
+
+    #messages are handled on the event loop, the paho thread only enqueues
+    if MSG_SHARDS > 1:
+        #one queue per area shard, ordered within an area, bridge status ordered against all shards
+        inbound = ShardedMessageQueue(
+            handle_mqtt_command,
+            _shard_key,
+            shards=MSG_SHARDS,
+            maxsize=MSG_QUEUE_SIZE,
+            policy=MSG_QUEUE_POLICY,
+            recorder=recorder
+        )
+    else:
+        inbound = MessageQueue(
+            handle_mqtt_command,
+            maxsize=MSG_QUEUE_SIZE,
+            policy=MSG_QUEUE_POLICY,
+            workers=MSG_WORKERS,
+            recorder=recorder
+        )
+    tasks = inbound.start()
 
     mqtt_client = MQTTPublisher(
         mqtt_username=MQTT_USERNAME,
@@ -436,17 +1012,36 @@ async def main():
         mqtt_host=MQTT_HOST,
         mqtt_port=MQTT_PORT,
         will_topic=f"{MQTT_BRIDGE_WILL}/status",
-        mqtt_debug=MQTT_DEBUG
+        mqtt_debug=MQTT_DEBUG,
+        on_connect=handle_mqtt_connect,
+        #paho calls back on its network thread, the asyncio/loopback transports on the loop
+        on_message=inbound.submit_threadsafe if MQTT_TRANSPORT == "paho" else inbound.submit,
+        logger=lambda msg: mqtt_log("MQTT Client:%s", msg),
+        transport=MQTT_TRANSPORT
     )
+    mqtt_client.start()
+    if TRACE:
+        tracer.enable(_trace_targets())
 
-    mqtt_client.on_message = handle_mqtt_command
-    mqtt_client.on_connect = handle_mqtt_connect
+    tasks.append(scheduler.start())
+    if resync:
+        resync.start()
+    tasks.append(asyncio.create_task(sweep_pending_responses()))
+    if snapshots and STATE_SNAPSHOT_INTERVAL > 0:
+        tasks.append(asyncio.create_task(snapshots.run()))
+
+    metrics_server = None
+    if METRICS_PORT:
+        _register_metrics()
+        try:
+            metrics_server = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+        except Exception as e:
+            log(f"❌ Failed to start metrics server: {e}")
+    if MSG_QUEUE_STATS_INTERVAL > 0:
+        tasks.append(asyncio.create_task(log_stats()))
 
-    asyncio.create_task(sweep_pending_responses())
-    
     try:
-        while True:
-            await asyncio.sleep(1)
+        await asyncio.gather(*tasks)
 
     except asyncio.CancelledError:
         log("⏹ Cancelled by asyncio")
@@ -459,6 +1054,29 @@ async def main():
 
     finally:
         log("🔍 Shutting down...")
+        for task in tasks:
+            task.cancel()
+        if metrics_server:
+            metrics_server.close()
+        if retries:
+            retries.cancel_all()
+        if resync:
+            resync.stop()
+        if profile_task is not None:
+            profile_task.cancel()
+        if tracer.enabled:
+            trace_dump()
+            tracer.disable()
+        temp_limiter.flush_all()
+        scheduler.flush()
+        if batcher:
+            batcher.flush()
+        mqtt_client.stop()
+        if recorder:
+            recorder.close()
+        if snapshots:
+            snapshots.save()
+        logger.stop_writer()
 
 # Entrypoint
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+import asyncio
+import struct
+from mqtt.transport import Transport, PublishError, CONNACK_CODES
+
+# MQTT 3.1.1 control packets (fixed header high nibble)
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82    # reserved flags 0010
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+_U16 = struct.Struct(">H")
+
+
+def _string(value) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    return _U16.pack(len(value)) + value
+
+
+def _packet(header: int, body: bytes) -> bytes:
+    # Fixed header + remaining length (7 bits per byte, high bit = more)
+    out = bytearray([header])
+    length = len(body)
+    while True:
+        byte, length = length & 0x7F, length >> 7
+        out.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(out) + body
+
+
+def connect_packet(client_id, keepalive, username=None, password=None, will=None) -> bytes:
+    flags = 0x02    # clean session
+    payload = _string(client_id)
+    if will and will.topic:
+        flags |= 0x04 | (will.qos & 0x03) << 3 | (0x20 if will.retain else 0)
+        payload += _string(will.topic) + _string(will.payload or b"")
+    if username:
+        flags |= 0x80
+        payload += _string(username)
+        if password is not None:
+            flags |= 0x40
+            payload += _string(password)
+    return _packet(CONNECT, _string("MQTT") + bytes([4, flags]) + _U16.pack(keepalive) + payload)
+
+
+def publish_packet(topic, payload: bytes, qos=0, retain=False, packet_id=0, dup=False) -> bytes:
+    header = PUBLISH | (0x08 if dup else 0) | qos << 1 | (0x01 if retain else 0)
+    body = _string(topic) + (_U16.pack(packet_id) if qos else b"") + payload
+    return _packet(header, body)
+
+
+def subscribe_packet(packet_id, topic, qos=0) -> bytes:
+    return _packet(SUBSCRIBE, _U16.pack(packet_id) + _string(topic) + bytes([qos]))
+
+
+async def read_packet(reader):
+    """
+    (fixed header byte, body bytes) of the next packet.
+    """
+    header = (await reader.readexactly(1))[0]
+    length = shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+        if shift > 21:
+            raise ValueError("Malformed remaining length")
+    return header, await reader.readexactly(length) if length else b""
+
+
+class AsyncioTransport(Transport):
+    """
+    MQTT 3.1.1 client on asyncio streams, no extra thread: callbacks run on
+    the event loop.
+
+    - start() spawns the connection task and returns at once; the task
+      reconnects with backoff (1 s doubling to 30 s) until stop()
+    - publishes and subscribes go through an outbox written by one task
+      that awaits drain(), so a slow broker backs up into the outbox;
+      a publish raises PublishError when `max_queued` packets are waiting
+    - QoS 1 publishes get a packet id and a future resolved on PUBACK;
+      unacknowledged ones are resent (DUP) after a reconnect, publishes
+      made while disconnected wait for the connection; with all 65535
+      packet ids in flight a publish raises PublishError
+    - QoS 0 publishes while disconnected raise, as with paho, and QoS 0
+      packets still in the outbox when the connection drops are lost
+    - incoming QoS 1 messages are acknowledged after on_message returns
+    - subscriptions are not restored by the transport, on_connect
+      subscribes again (same as paho)
+    """
+
+    def __init__(self, *args, max_queued=1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_queued = max(1, int(max_queued))
+        self._task = None
+        self._writer = None
+        self._outbox = None     # asyncio.Queue of packet bytes for the current connection
+        self._packet_id = 0
+        self._inflight = {}     # packet id -> (packet bytes, future)
+        self._stopping = False
+        self._pong = None
+        self.host = None
+        self.port = None
+        self.keepalive = 60
+
+    def start(self, host, port, keepalive=60):
+        self.host, self.port, self.keepalive = host, port, keepalive
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="mqtt-asyncio")
+
+    def _next_id(self) -> int:
+        if len(self._inflight) >= 0xFFFF:
+            raise PublishError("all packet ids in flight")
+        while True:
+            self._packet_id = self._packet_id % 0xFFFF + 1
+            if self._packet_id not in self._inflight:
+                return self._packet_id
+
+    def _send(self, packet: bytes):
+        outbox = self._outbox
+        if outbox is None:
+            raise ConnectionError("not connected")
+        if outbox.full():
+            raise PublishError(f"send queue full ({self.max_queued})")
+        outbox.put_nowait(packet)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if qos == 0:
+            # Nothing to wait for, no future per message
+            self._send(publish_packet(topic, payload, 0, retain))
+            return None
+        packet_id = self._next_id()
+        packet = publish_packet(topic, payload, 1, retain, packet_id)
+        if self._outbox is not None:
+            self._send(packet)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[packet_id] = (packet, future)
+        return future
+
+    def subscribe(self, topic, qos=0):
+        self._send(subscribe_packet(self._next_id(), topic, min(qos, 1)))
+
+    async def _run(self):
+        delay = 1.0
+        while not self._stopping:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                self.log(f"❌ TCP connect error: {e}, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            accepted = False
+            try:
+                writer.write(connect_packet(self.client_id, self.keepalive, self.username, self.password, self.will))
+                header, body = await asyncio.wait_for(read_packet(reader), 10)
+                rc = body[1] if header & 0xF0 == CONNACK and len(body) >= 2 else 3
+                if rc:
+                    self.log(f"❌ Connection refused: {CONNACK_CODES.get(rc, rc)}")
+                    self._connected(rc)
+                else:
+                    accepted = True
+                    self._writer = writer
+                    # Live before the first await: a publish made while the resends
+                    # drain is queued behind them instead of waiting in _inflight
+                    self._outbox = asyncio.Queue(maxsize=self.max_queued)
+                    # Unacknowledged QoS 1 messages go again, flagged as duplicates
+                    for packet, future in self._inflight.values():
+                        writer.write(bytes([packet[0] | 0x08]) + packet[1:])
+                    await writer.drain()
+                    self._connected(0)
+                    await self._session(reader, writer)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, struct.error) as e:
+                self.log(f"⚠️ Connection lost: {e!r}")
+            except Exception as e:
+                # A bug or a packet we can't make sense of must not end the connection task
+                self.log(f"❌ Unexpected error on the connection: {e!r}")
+            finally:
+                self._writer = None
+                self._outbox = None
+                writer.close()
+            if accepted:
+                self._disconnected(0 if self._stopping else 1)
+                delay = 1.0
+            if not self._stopping:
+                self.log(f"🔌 Reconnecting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                if not accepted:
+                    delay = min(delay * 2, 30.0)
+
+    async def _session(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        pinger = loop.create_task(self._keepalive(writer))
+        sender = loop.create_task(self._sender(writer, self._outbox))
+        sender.add_done_callback(lambda task: self._sender_done(task, writer))
+        try:
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == PUBLISH:
+                    self._on_publish(header, body, writer)
+                elif kind == PUBACK:
+                    entry = self._inflight.pop(_U16.unpack_from(body)[0], None)
+                    if entry is not None and not entry[1].done():
+                        entry[1].set_result(True)
+                elif kind == PINGRESP:
+                    self._pong = True
+                elif kind == SUBACK:
+                    if body[2:] and body[2] == 0x80:
+                        self.log(f"❌ Subscription {_U16.unpack_from(body)[0]} refused")
+        finally:
+            pinger.cancel()
+            sender.cancel()
+
+    async def _sender(self, writer, outbox):
+        while True:
+            writer.write(await outbox.get())
+            # Only buffer past the transport's high-water mark in the outbox, which is bounded
+            await writer.drain()
+
+    def _sender_done(self, task, writer):
+        # drain() failed: closing the writer ends the read loop, which reconnects
+        if not task.cancelled() and task.exception() is not None:
+            self.log(f"⚠️ Write failed: {task.exception()!r}")
+            writer.close()
+
+    def _on_publish(self, header, body, writer):
+        qos = header >> 1 & 0x03
+        length = _U16.unpack_from(body)[0]
+        topic = body[2:2 + length].decode()
+        offset = 2 + length
+        packet_id = None
+        if qos:
+            packet_id = _U16.unpack_from(body, offset)[0]
+            offset += 2
+        try:
+            self._message(topic, body[offset:])
+        finally:
+            if qos == 1:
+                writer.write(_packet(PUBACK, _U16.pack(packet_id)))
+
+    async def _keepalive(self, writer):
+        if not self.keepalive:
+            return
+        while True:
+            self._pong = False
+            writer.write(_packet(PINGREQ, b""))
+            await asyncio.sleep(self.keepalive)
+            if not self._pong:
+                self.log("⚠️ No PINGRESP within the keepalive, reconnecting")
+                writer.close()
+                return
+
+    def stop(self):
+        self._stopping = True
+        writer = self._writer
+        if writer is not None:
+            try:
+                writer.write(_packet(DISCONNECT, b""))
+            except Exception:
+                pass
+            writer.close()
+        if self._task:
+            self._task.cancel()
+        for packet, future in self._inflight.values():
+            if not future.done():
+                future.cancel()
+        self._inflight.clear()
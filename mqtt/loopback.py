@@ -0,0 +1,103 @@
+import asyncio
+from mqtt.transport import Transport, topic_matches
+
+
+class LoopbackBroker:
+    """
+    In-memory broker for tests, benchmarks and dry runs: subscriptions,
+    retained messages and wills, delivered synchronously on the caller's
+    thread. Plain callables can listen in with listen(pattern, fn).
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.listeners = []     # (pattern, fn(topic, payload))
+        self.retained = {}      # topic -> payload
+        self.published = 0
+
+    def listen(self, pattern, fn):
+        self.listeners.append((pattern, fn))
+
+    def publish(self, topic, payload, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for pattern, fn in list(self.listeners):
+            if topic_matches(pattern, topic):
+                fn(topic, payload)
+        for client in list(self.clients):
+            client._deliver(topic, payload)
+
+    def connect(self, client):
+        if client not in self.clients:
+            self.clients.append(client)
+
+    def disconnect(self, client, clean=True):
+        if client in self.clients:
+            self.clients.remove(client)
+        will = client.will
+        if not clean and will and will.topic:
+            self.publish(will.topic, will.payload, will.retain)
+
+
+# One broker per process unless a test passes its own
+default_broker = LoopbackBroker()
+
+
+class LoopbackTransport(Transport):
+    """
+    Transport connected to a LoopbackBroker: connects at start(), QoS 1
+    futures resolve straight away.
+    """
+
+    def __init__(self, *args, broker: LoopbackBroker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broker = broker or default_broker
+        self.subscriptions = {}     # pattern -> qos
+        self._loop = None
+
+    def start(self, host=None, port=None, keepalive=60):
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self.broker.connect(self)
+        self._connected(0)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if not self.connected:
+            raise ConnectionError("loopback transport not connected")
+        self.broker.publish(topic, payload, retain)
+        if not qos or self._loop is None:
+            return None
+        future = self._loop.create_future()
+        future.set_result(True)
+        return future
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions[topic] = qos
+        for retained_topic, payload in list(self.broker.retained.items()):
+            if topic_matches(topic, retained_topic):
+                self._message(retained_topic, payload)
+
+    def _deliver(self, topic, payload):
+        for pattern in self.subscriptions:
+            if topic_matches(pattern, topic):
+                self._message(topic, payload)
+                return
+
+    def drop(self):
+        """
+        Lose the connection without a DISCONNECT (the broker publishes the will).
+        """
+        self.broker.disconnect(self, clean=False)
+        self._disconnected(1)
+
+    def stop(self):
+        self.broker.disconnect(self, clean=True)
+        self._disconnected(0)
@@ -1,7 +1,7 @@
-import paho.mqtt.client as mqtt
-import json
+from helpers import json_codec
 from datetime import datetime
 from typing import Callable, Optional
+from mqtt.transport import Transport, Will, make_transport
 class MQTTPublisher:
     
 
@@ -22,7 +22,10 @@ class MQTTPublisher:
         on_connect=None,
         on_disconnect=None,
         on_message=None,
-        logger: Optional[Callable[[str], None]] = None
+        logger: Optional[Callable[[str], None]] = None,
+        transport="paho",
+        client_id="",
+        keepalive=60
     ):
         """
         Initialize MQTT client with optional callbacks and LWT.
@@ -36,17 +39,15 @@ class MQTTPublisher:
         :param on_connect: Optional user-defined callback for connect event
         :param on_disconnect: Optional user-defined callback for disconnect event
         :param on_message: Optional user-defined callback for incoming MQTT messages
+        :param transport: "paho" | "asyncio" | "loopback" or a Transport instance
+        :param keepalive: MQTT keepalive in seconds
+
+        Nothing touches the network until start().
         """
         #self.loop = loop
-        self.client = mqtt.Client()
-
-        # Authentication
-        self.client.username_pw_set(mqtt_username, mqtt_password)
-
-        # Callbacks
-        self.client.on_connect = self._on_connect
-        self.client.on_disconnect = self._on_disconnect
-        self.client.on_message = self._on_message
+        self.mqtt_host = mqtt_host
+        self.mqtt_port = mqtt_port
+        self.keepalive = keepalive
 
         # External user-defined callbacks
         self.on_connect = on_connect
@@ -55,6 +56,7 @@ class MQTTPublisher:
 
         self.will_topic = will_topic
         self.will_retain = will_retain
+        self.mqtt_debug = mqtt_debug
 
         #logging
         self.logger = (
@@ -63,64 +65,75 @@ class MQTTPublisher:
             else (lambda msg: None)
         )
 
-        # Set Last Will and Testament (LWT)
-        if will_topic:
-            self.client.will_set(
-                topic=will_topic,
-                payload=will_payload,
-                qos=will_qos,
-                retain=will_retain
+        # Transport, with the Last Will and Testament (LWT)
+        will = Will(will_topic, will_payload, will_qos, will_retain) if will_topic else None
+        if isinstance(transport, Transport):
+            self.transport = transport
+            self.transport.will = self.transport.will or will
+        else:
+            self.transport = make_transport(
+                transport,
+                username=mqtt_username,
+                password=mqtt_password,
+                will=will,
+                client_id=client_id,
+                log=self.log
             )
 
+        # Callbacks
+        self.transport.on_connect = self._on_connect
+        self.transport.on_disconnect = self._on_disconnect
+        self.transport.on_message = self._on_message
 
-        # Try to connect
+    def start(self):
+        """
+        Start connecting; returns at once, on_connect fires when the broker accepts.
+        """
         try:
-            self.log(f"🔌 Connecting to MQTT at {mqtt_host}:{mqtt_port}...")
-            self.client.connect(mqtt_host, mqtt_port, keepalive=60)
-            self.client.loop_start()
+            self.log(f"🔌 Connecting to MQTT at {self.mqtt_host}:{self.mqtt_port}...")
+            self.transport.start(self.mqtt_host, self.mqtt_port, keepalive=self.keepalive)
         except Exception as e:
             self.log(f"❌ TCP connect error: {e}")
 
     def log(self, msg: str):
         self.logger(msg)
 
-    def _on_connect(self, client, userdata, flags, rc):
+    def _on_connect(self, rc):
         """
         Internal callback for MQTT connection event.
         Calls external callback if provided.
         """
         if rc == 0:
             self.log(f" ✅ connected successfully")
-            if hasattr(self, "will_topic") and self.will_topic:
-                self.client.publish(self.will_topic, "online", retain=self.will_retain)
+            if self.will_topic:
+                self.publish(self.will_topic, "online", retain=self.will_retain)
 
             if self.on_connect:
-                self.on_connect(client, userdata, flags, rc)
+                self.on_connect(self, None, {}, rc)
         elif rc == 4:
             self.log(f"❌ authentication failed (bad username/password)")
         else:
             self.log(f"❌ connection failed with result code {rc}")
 
-    def _on_disconnect(self, client, userdata, rc):
+    def _on_disconnect(self, rc):
         """
         Internal callback for MQTT disconnection event.
         Calls external callback if provided.
         """
         self.log(f"⚠️ Disconnected from MQTT (code {rc})")
         if self.on_disconnect:
-            self.on_disconnect(client, userdata, rc)
+            self.on_disconnect(self, None, rc)
 
-    def _on_message(self, client, userdata, msg):
+    def _on_message(self, topic, payload):
         """
         Internal callback for incoming MQTT messages.
         Calls external callback if provided.
         """
         try:
-            topic = msg.topic
-            payload = msg.payload.decode()
-            self.log(f"📨 command: {topic} = {payload}")
+            if self.mqtt_debug:
+                self.log(f"📨 command: {topic} = {payload.decode(errors='replace')}")
 
-            # Pass to external handler
+            # Pass the raw bytes on, the handler parses only what it needs
             if self.on_message:
                 self.on_message(topic, payload)
 
@@ -137,19 +150,37 @@ class MQTTPublisher:
         :param retain: Retain flag
         :return: True if published, False otherwise
         """
+        return self._publish(topic, payload, qos, retain) is not False
+
+    async def publish_async(self, topic: str, payload, qos=1, retain=False) -> bool:
+        """
+        Publish and wait until the broker has it (PUBACK for QoS 1).
+
+        :return: True once acknowledged, False if the publish failed
+        """
+        future = self._publish(topic, payload, qos, retain)
+        if future is False:
+            return False
+        if future is None:
+            return True
+        try:
+            return bool(await future)
+        except Exception as e:
+            self.log(f" ❌ Publish to {topic} not acknowledged: {e!r}")
+            return False
+
+    def _publish(self, topic, payload, qos, retain):
+        # transport future, None (not tracked) or False (failed)
         try:
             # If dict or object, serialize to JSON
-            if not isinstance(payload, str):
-                payload = json.dumps(payload)
-            result = self.client.publish(topic, payload=payload, qos=qos, retain=retain)
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+            if not isinstance(payload, (str, bytes, bytearray)):
+                payload = json_codec.dumps(payload)
+            future = self.transport.publish(topic, payload, qos=qos, retain=retain)
+            if self.mqtt_debug:
                 self.log(f"📤 Published to topic: {topic} payload:{payload}")
-                return True
-            else:
-                self.log(f" ❌  Failed to publish to {topic}, rc={result.rc}")
-                return False
+            return future
         except Exception as e:
-            self.log(f" ❌ Exception during publish to {topic}: {e}")
+            self.log(f" ❌ Failed to publish to {topic}: {e}")
             return False
 
     def subscribe(self, topic: str, qos=0):
@@ -160,7 +191,7 @@ class MQTTPublisher:
         :param qos: QoS level
         """
         try:
-            self.client.subscribe(topic, qos=qos)
+            self.transport.subscribe(topic, qos=qos)
             self.log(f"📡 Subscribed to {topic}")
         except Exception as e:
             self.log(f"❌ Subscription error for {topic}: {e}")
@@ -171,7 +202,6 @@ class MQTTPublisher:
         """
         try:
             self.log(f"🔌 Stopping...")
-            self.client.loop_stop()
-            self.client.disconnect()
+            self.transport.stop()
         except Exception as e:
             self.log(f"❌ Error while stopping: {e}")
@@ -0,0 +1,201 @@
+import asyncio
+import threading
+from typing import Callable, Optional
+
+# Transports behind MQTTPublisher. A transport owns the connection and
+# calls back with:
+#
+#   on_connect(rc)              0 = connected, see CONNACK_CODES
+#   on_disconnect(rc)           0 = asked for (stop)
+#   on_message(topic, payload)  payload as raw bytes
+#
+# publish() returns an asyncio future resolved with True once the broker has
+# the message (PUBACK for QoS 1), or None for QoS 0 and when the transport
+# can't tell; it raises when the message can't be sent at all.
+
+TRANSPORTS = ("paho", "asyncio", "loopback")
+
+CONNACK_CODES = {
+    0: "accepted",
+    1: "unacceptable protocol version",
+    2: "identifier rejected",
+    3: "server unavailable",
+    4: "bad username or password",
+    5: "not authorised",
+}
+
+
+class PublishError(Exception):
+    pass
+
+
+class Will:
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic, payload="offline", qos=0, retain=True):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """
+    MQTT subscription match, + is one level, # the rest (including none).
+    """
+    if pattern == topic or pattern == "#":
+        return True
+    parts = pattern.split("/")
+    levels = topic.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+class Transport:
+    """
+    Base transport: callbacks and the interface MQTTPublisher drives.
+    """
+
+    def __init__(self, username=None, password=None, will: Optional[Will] = None, client_id="",
+                 log: Callable[[str], None] = None):
+        self.username = username
+        self.password = password
+        self.will = will
+        self.client_id = client_id
+        self.log = log or (lambda msg: None)
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.connected = False
+
+    def start(self, host, port, keepalive=60):
+        """
+        Start connecting in the background; never blocks on the network.
+        """
+        raise NotImplementedError
+
+    def publish(self, topic: str, payload: bytes, qos=0, retain=False):
+        raise NotImplementedError
+
+    def subscribe(self, topic: str, qos=0):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def _connected(self, rc):
+        self.connected = rc == 0
+        if self.on_connect:
+            self.on_connect(rc)
+
+    def _disconnected(self, rc):
+        self.connected = False
+        if self.on_disconnect:
+            self.on_disconnect(rc)
+
+    def _message(self, topic, payload):
+        if self.on_message:
+            self.on_message(topic, payload)
+
+
+class PahoTransport(Transport):
+    """
+    paho-mqtt with its network thread (loop_start). Callbacks run on that
+    thread. QoS 1+ publishes made on the asyncio loop that called start()
+    get a future, resolved on PUBACK and failed on disconnect (paho drops
+    them); QoS 0 and publishes from other threads return None.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        import paho.mqtt.client as mqtt
+        self.mqtt = mqtt
+        self.client = mqtt.Client(client_id=self.client_id)
+        if self.username:
+            self.client.username_pw_set(self.username, self.password)
+        if self.will:
+            self.client.will_set(topic=self.will.topic, payload=self.will.payload,
+                                 qos=self.will.qos, retain=self.will.retain)
+        self.client.on_connect = lambda client, userdata, flags, rc: self._connected(rc)
+        self.client.on_disconnect = lambda client, userdata, rc: self._on_disconnect(rc)
+        self.client.on_message = lambda client, userdata, msg: self._message(msg.topic, msg.payload)
+        self.client.on_publish = self._on_publish
+        self._loop = None
+        self._loop_thread = None
+        self._futures = {}  # mid -> future, only touched on the loop thread
+
+    def start(self, host, port, keepalive=60):
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+        except RuntimeError:
+            self._loop = None
+        # connect_async: the TCP connect happens on the network thread
+        self.client.connect_async(host, port, keepalive=keepalive)
+        self.client.loop_start()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        result = self.client.publish(topic, payload=payload, qos=qos, retain=retain)
+        if result.rc != self.mqtt.MQTT_ERR_SUCCESS:
+            raise PublishError(f"rc={result.rc}")
+        if not qos or self._loop is None or threading.get_ident() != self._loop_thread:
+            return None
+        # The PUBACK callback is queued behind this on the loop, so it finds the future
+        future = self._loop.create_future()
+        self._futures[result.mid] = future
+        return future
+
+    def _on_publish(self, client, userdata, mid):
+        # Network thread: QoS 0 once written, QoS 1 on PUBACK
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._resolve, mid)
+
+    def _resolve(self, mid):
+        future = self._futures.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(True)
+
+    def _on_disconnect(self, rc):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fail_all, ConnectionError(f"disconnected (rc={rc})"))
+        self._disconnected(rc)
+
+    def _fail_all(self, error):
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(error)
+                # Fire-and-forget publishes never await theirs, don't warn about them
+                future.exception()
+        self._futures.clear()
+
+    def subscribe(self, topic, qos=0):
+        self.client.subscribe(topic, qos=qos)
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+        self._futures.clear()
+
+
+def make_transport(name: str, **kwargs) -> Transport:
+    """
+    Transport by name (MQTT_TRANSPORT): paho | asyncio | loopback.
+    """
+    if name == "paho":
+        return PahoTransport(**kwargs)
+    if name == "asyncio":
+        from mqtt.aio import AsyncioTransport
+        return AsyncioTransport(**kwargs)
+    if name == "loopback":
+        from mqtt.loopback import LoopbackTransport
+        return LoopbackTransport(**kwargs)
+    raise ValueError(f"Unknown MQTT transport {name!r}, expected one of {', '.join(TRANSPORTS)}")
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+
+import main
+from helpers.area_registry import AreaRegistry, load_units
+
+
+class AreaRegistryTest(unittest.TestCase):
+
+    def test_configured_units(self):
+        registry = AreaRegistry("ha/climate", units={"office_ac": {"area": 40, "join": "FE"}, "coolmaster_L1_12": 12})
+        unit = registry.lookup("ha/climate/office_ac/state")
+        self.assertEqual((unit.area, unit.join), (40, 0xFE))
+        self.assertEqual(unit.set_temperature_topic, "ha/climate/office_ac/set/temperature")
+        self.assertIs(registry.for_area(12), registry.lookup("ha/climate/coolmaster_L1_12/state"))
+
+    def test_learns_controller_naming(self):
+        registry = AreaRegistry("ha/climate", controllers=("coolmaster_L1", "coolmaster_L2"))
+        self.assertEqual(registry.lookup("ha/climate/coolmaster_L2_7/state").area, 7)
+        self.assertIsNone(registry.lookup("ha/climate/other_7/state"))
+        # Area 7 taken, the same number on another controller isn't learned
+        self.assertIsNone(registry.lookup("ha/climate/coolmaster_L1_7/state"))
+
+    def test_guess_is_not_registered(self):
+        registry = AreaRegistry("ha/climate", controllers=("coolmaster_L1", "coolmaster_L2"))
+        self.assertEqual(registry.for_area(5).entity, "coolmaster_L1_5")
+        self.assertEqual(registry.lookup("ha/climate/coolmaster_L2_5/state").entity, "coolmaster_L2_5")
+        self.assertEqual(registry.for_area(5).entity, "coolmaster_L2_5")
+
+    def test_no_learning(self):
+        registry = AreaRegistry("ha/climate", units={"office_ac": 40}, learn=False)
+        self.assertIsNone(registry.lookup("ha/climate/coolmaster_L1_12/state"))
+        self.assertIsNone(registry.for_area(12))
+
+    def test_area_of_registers_nothing(self):
+        registry = AreaRegistry("ha/climate", units={"office_ac": 40})
+        self.assertEqual(registry.area_of("ha/climate/office_ac/state"), 40)
+        self.assertEqual(registry.area_of("ha/climate/coolmaster_L1_12/state"), 12)
+        self.assertIsNone(registry.area_of("ha/climate/other/state"))
+        self.assertEqual(len(registry), 1)
+        self.assertIsNone(AreaRegistry("ha/climate", learn=False).area_of("ha/climate/coolmaster_L1_12/state"))
+
+    def test_area_mapped_twice(self):
+        with self.assertRaises(ValueError):
+            AreaRegistry(units={"a": 1, "b": 1})
+
+
+class LoadUnitsTest(unittest.TestCase):
+
+    def test_file_wins(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({"a": 2, "b": 3}, f)
+        try:
+            self.assertEqual(load_units('{"a": 1}', f.name), {"a": 2, "b": 3})
+        finally:
+            os.unlink(f.name)
+
+    def test_errors_name_the_setting(self):
+        with self.assertRaisesRegex(ValueError, "^CLIMATE_AREAS is not valid JSON"):
+            load_units("{bad")
+        with self.assertRaisesRegex(ValueError, "^CLIMATE_AREAS must be"):
+            load_units("[1]")
+        with self.assertRaisesRegex(ValueError, "^CLIMATE_AREAS_FILE /does/not/exist"):
+            load_units("", "/does/not/exist")
+
+
+class UnmappedAreaHandlerTest(unittest.TestCase):
+    """
+    Bus commands for an area known from the snapshot/bus but without an HA
+    unit (CLIMATE_AREAS_LEARN=false) are skipped, not crashed on.
+    """
+
+    def setUp(self):
+        self.registry = main.area_registry
+        self.client = main.mqtt_client
+        self.published = []
+        main.area_registry = AreaRegistry(learn=False)
+        main.mqtt_client = type("Client", (), {"publish": lambda _, topic, payload: self.published.append(topic)})()
+        main.last_state.update(77, {"setpoint": 21.0, "hvac_mode": "cool", "fan_mode": "low"})
+
+    def tearDown(self):
+        main.area_registry = self.registry
+        main.mqtt_client = self.client
+
+    def test_setpoint_and_levels_skipped(self):
+        skipped = main.m_skipped.values.get(("unknown_area",), 0)
+        main._on_set_setpoint(77, 0xFF, None, 23.0, {})
+        for channel in (101, 102, 103):
+            main._on_recall_level(77, 0xFF, channel, "1", {})
+        self.assertEqual(self.published, [])
+        self.assertEqual(main.last_state.get_field(77, "setpoint"), 21.0)
+        self.assertEqual(main.m_skipped.values[("unknown_area",)], skipped + 4)
+
+
+class ShardKeyTest(unittest.TestCase):
+
+    def test_shard_key_learns_nothing(self):
+        registry = main.area_registry
+        main.area_registry = AreaRegistry(main.MQTT_CLIMATE_PREFIX, controllers=("coolmaster_L1",))
+        try:
+            topic = f"{main.MQTT_CLIMATE_PREFIX}/coolmaster_L1_78/state"
+            self.assertEqual(main._shard_key(topic, b"{}"), 78)
+            self.assertEqual(len(main.area_registry), 0)
+        finally:
+            main.area_registry = registry
+
+
+if __name__ == "__main__":
+    unittest.main()
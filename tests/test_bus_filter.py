@@ -0,0 +1,57 @@
+import json
+import unittest
+
+from helpers.bus_filter import NOT_CLIMATE, UNHANDLED, BusPrefilter
+from helpers.dynet_dispatch import RECALL_LEVEL, REQUEST_SETPOINT, SET_SETPOINT, DynetDispatcher
+
+RECALL = "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}"
+SETPOINT = "Set Temperature Set Point to {} Area {} Join {:02x}"
+PRESET = "Select Current Preset {} in Area {} Join {:02x} Fade {}s"
+
+
+def _payload(type, template, fields):
+    return json.dumps({"dynalite": {"type": type, "template": template, "fields": fields,
+                                    "description": "ignored"}}).encode()
+
+
+class BusPrefilterTest(unittest.TestCase):
+
+    def setUp(self):
+        handler = lambda *args: None
+        dispatcher = DynetDispatcher({REQUEST_SETPOINT: handler, SET_SETPOINT: handler, RECALL_LEVEL: handler},
+                                     fallback=handler, invalid=handler)
+        self.areas = {12}
+        self.prefilter = BusPrefilter(dispatcher, self.areas.__contains__)
+
+    def test_unhandled_template_dropped(self):
+        self.assertEqual(self.prefilter.check(_payload("dynet1", PRESET, [1, 12, 255, 2])), UNHANDLED)
+
+    def test_area_not_in_climate_cache_dropped(self):
+        self.assertEqual(self.prefilter.check(_payload("dynet2", RECALL, [8, 187, 40, 254, 101, 100, 0])), NOT_CLIMATE)
+        self.assertIsNone(self.prefilter.check(_payload("dynet2", RECALL, [8, 187, 12, 254, 101, 100, 0])))
+        self.assertEqual(self.prefilter.check_area(_payload("dynet1", SETPOINT, [12, 254, 22.5])), (None, 12))
+        self.assertEqual(self.prefilter.check_area(_payload("dynet1", SETPOINT, [40, 254, 22.5])), (NOT_CLIMATE, 40))
+
+    def test_unreadable_payloads_pass(self):
+        # Wrong field count, quoted area, escaped template, no template at all
+        self.assertIsNone(self.prefilter.check(_payload("dynet2", RECALL, [40, 254, 101])))
+        self.assertIsNone(self.prefilter.check(_payload("dynet2", RECALL, [8, 187, "40", 254, 101, 100, 0])))
+        self.assertIsNone(self.prefilter.check(_payload("dynet1", 'Preset "{}"', [1, 12])))
+        self.assertIsNone(self.prefilter.check(b'{"dynalite": {"type": "dynet1", "fields": [40, 1]}}'))
+
+    def test_templates_compiled_once(self):
+        for area in (12, 40, 41):
+            self.prefilter.check(_payload("dynet2", RECALL, [8, 187, area, 254, 101, 100, 0]))
+        self.prefilter.check(_payload("dynet1", PRESET, [1, 12, 255, 2]))
+        stats = self.prefilter.stats()
+        self.assertEqual(stats["templates"], 2)
+        self.assertEqual(stats["checked"], 4)
+        self.assertEqual(stats["passed"], 1)
+        self.assertEqual(stats["filtered"], {UNHANDLED: 1, NOT_CLIMATE: 2})
+
+    def test_str_payload(self):
+        self.assertEqual(self.prefilter.check(_payload("dynet1", PRESET, [1, 12, 255, 2]).decode()), UNHANDLED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from helpers.climate_state import FIELDS, ClimateStateTable
+
+STATE = {"setpoint": 22.0, "current_temp": 21.5, "hvac_mode": "cool", "fan_mode": "low", "status": "ok"}
+
+
+class ClimateStateTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = ClimateStateTable()
+
+    def test_round_trip_and_diff(self):
+        self.assertEqual(self.table.update(12, STATE), list(FIELDS))
+        self.assertEqual(self.table.get(12), STATE)
+        self.assertEqual(self.table.diff(12, {**STATE, "setpoint": 23, "fan_mode": "high"}), ["setpoint", "fan_mode"])
+        self.assertEqual(self.table.diff(12, STATE), [])
+        self.assertEqual(self.table.diff(13, {"setpoint": 20}), ["setpoint"])
+        self.assertIsNone(self.table.get(13))
+
+    def test_dirty_until_synced(self):
+        self.table.update(12, STATE)
+        self.table.update(13, STATE)
+        for field in FIELDS:
+            self.table.mark_synced(13, field)
+        self.table.mark_synced(12, "setpoint")
+        self.assertEqual(self.table.dirty_fields(), {12: ["current_temp", "hvac_mode", "fan_mode", "status"]})
+
+        self.table.update(13, {**STATE, "setpoint": 19})
+        self.assertEqual(self.table.dirty_fields()[13], ["setpoint"])
+
+    def test_values_from_the_bus_are_not_dirty(self):
+        self.table.update(12, STATE)
+        for field in FIELDS:
+            self.table.mark_synced(12, field)
+        self.table.set_field(12, "setpoint", 25)
+        self.assertEqual(self.table.get_field(12, "setpoint"), 25)
+        self.assertEqual(self.table.dirty_fields(), {})
+
+    def test_resync_packets(self):
+        self.table.update(12, STATE)
+        self.table.update(13, {"setpoint": 20})
+        encode = lambda area, field: [(field, self.table.get_field(area, field))]
+        packets = list(self.table.resync_packets(encode))
+        self.assertEqual(len(packets), 6)
+        self.assertIn((13, "setpoint", [("setpoint", 20.0)]), packets)
+
+        only = self.table.resync_packets(encode, {12: ["setpoint", "status"], 99: ["setpoint"]})
+        self.assertEqual(next(only), (12, "setpoint", [("setpoint", 22.0)]))
+        # Read when reached, not when the list was asked for
+        self.table.update(12, {"status": "error"})
+        self.assertEqual(next(only), (12, "status", [("status", "error")]))
+        self.assertEqual(list(only), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
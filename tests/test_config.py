@@ -0,0 +1,28 @@
+import os
+import unittest
+from unittest import mock
+
+import config
+
+
+class BoolEnvTest(unittest.TestCase):
+
+    def test_spellings(self):
+        for value, expected in (("1", True), ("true", True), ("Yes", True), ("on", True),
+                                ("0", False), ("FALSE", False), ("no", False), ("off", False)):
+            with mock.patch.dict(os.environ, {"SWITCH": value}):
+                self.assertIs(config._bool_env("SWITCH", not expected), expected, value)
+
+    def test_unset_or_empty_uses_default(self):
+        with mock.patch.dict(os.environ, {"SWITCH": ""}):
+            self.assertIs(config._bool_env("SWITCH", True), True)
+        self.assertIs(config._bool_env("SWITCH_NOT_SET"), False)
+
+    def test_unknown_value_exits(self):
+        with mock.patch.dict(os.environ, {"SWITCH": "maybe"}):
+            with self.assertRaises(SystemExit):
+                config._bool_env("SWITCH")
+
+
+if __name__ == "__main__":
+    unittest.main()
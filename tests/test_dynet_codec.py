@@ -0,0 +1,74 @@
+import unittest
+
+from helpers import dynet_codec as codec
+from helpers.dynet_mqtt import (
+    build_area_preset_body, build_area_setpoint_body, build_area_temperature_body, build_channel_level_body
+)
+
+AREAS = (1, 12, 255, 256, 0x1234)
+JOINS = (0xFE, 0xFF, 0x01)
+TEMPS = [x / 2 for x in range(32, 64)] + [21.25, 0.0]
+CHANNELS = (101, 102, 103, 105)
+LEVELS = (0, 1, 2, 3, 4, 50, 100)
+
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_setpoint_and_temperature(self):
+        for encode, opcode in ((codec.encode_setpoint, codec.OP_SETPOINT),
+                               (codec.encode_temperature, codec.OP_TEMPERATURE)):
+            for area in AREAS:
+                for join in JOINS:
+                    for temp in TEMPS:
+                        packet = codec.decode(encode(area, join, temp))
+                        self.assertEqual((packet.opcode, packet.device, packet.box, packet.area, packet.join),
+                                         (opcode, codec.DEVICE, codec.BOX, area, join))
+                        self.assertAlmostEqual(packet.value, temp)
+
+    def test_channel_level(self):
+        for area in AREAS:
+            for channel in CHANNELS:
+                for level in LEVELS:
+                    for fade in (0, 0x1234, 0xABCDEF):
+                        packet = codec.decode(codec.channel_level_hex(area, 0xFE, channel, level, fade))
+                        self.assertEqual(packet, codec.DynetPacket(codec.OP_CHANNEL_LEVEL, codec.DEVICE, codec.BOX,
+                                                                   area, 0xFE, channel, codec._level(level), fade))
+
+    def test_preset(self):
+        for area in AREAS:
+            for preset in (0, 4, 255):
+                packet = codec.decode(codec.preset_hex(area, preset))
+                self.assertEqual((packet.opcode, packet.area, packet.value), (codec.OP_PRESET, area, preset))
+
+    def test_bytes_and_hex_decode_alike(self):
+        data = codec.encode_setpoint(12, 0xFE, 22.5)
+        self.assertEqual(codec.decode(data), codec.decode(codec.to_hex(data)))
+        self.assertEqual(codec.from_hex(codec.to_hex(data)), data)
+
+    def test_unsupported(self):
+        for data in (b"", b"\x56\xBB", codec.encode_preset(1, 1) + b"\x00", b"\x99" * 12):
+            with self.assertRaises(ValueError):
+                codec.decode(data)
+
+
+class LegacyBuildersTest(unittest.TestCase):
+    """
+    The codec replaced the dynet_mqtt string builders and must produce the same packets.
+    """
+
+    def test_same_packets(self):
+        for area in AREAS[:4]:
+            for temp in TEMPS:
+                self.assertEqual(codec.setpoint_hex(area, 0xFE, temp),
+                                 build_area_setpoint_body(area=area, join=0xFE, setpoint=temp))
+                self.assertEqual(codec.temperature_hex(area, 0xFE, temp),
+                                 build_area_temperature_body(area=area, join=0xFE, temp=temp))
+            for channel in CHANNELS:
+                for level in LEVELS:
+                    self.assertEqual(codec.channel_level_hex(area, 0xFE, channel, level),
+                                     build_channel_level_body(area=area, join=0xFE, channel=channel, level=level))
+            self.assertEqual(codec.preset_hex(area, 4), build_area_preset_body(area=area, preset=4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from helpers.dynet_dispatch import (RECALL_LEVEL, REQUEST_SETPOINT, SET_SETPOINT, UNKNOWN, DynetDispatcher,
+                                    classify, join_value)
+
+# Templates as the Dynalite bridge publishes them
+TEMPLATES = {
+    ("dynet1", "Request User Temperature Set Point Area {} Join {:02x}"): REQUEST_SETPOINT,
+    ("dynet2", "Request Temperature Set Point Area {} Join {:02x}"): REQUEST_SETPOINT,
+    ("dynet1", "Set Temperature Set Point to {} Area {} Join {:02x}"): SET_SETPOINT,
+    ("dynet2", "Area {} Join {:02x} Set Temperature Set Point to {}"): SET_SETPOINT,
+    ("dynet1", "Recall Level Channel {} Area {} Join {:02x} Level {} Fade {}"): RECALL_LEVEL,
+    ("dynet2", "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}"): RECALL_LEVEL,
+}
+UNHANDLED = (
+    "Select Current Preset {} in Area {} Join {:02x} Fade {}s",
+    "Fade Channel {} in Area {} to {} Join {:02x}",
+    "Report Channel Level {} in Area {}",
+    "",
+)
+FIELDS = {
+    (REQUEST_SETPOINT, "dynet1"): [12, "FF"],
+    (REQUEST_SETPOINT, "dynet2"): [8, 187, 12, "FF"],
+    (SET_SETPOINT, "dynet1"): [12, "FF", 22.5],
+    (SET_SETPOINT, "dynet2"): [8, 187, 12, "FF", 22.5],
+    (RECALL_LEVEL, "dynet1"): [12, "FF", 101, "100%", 0],
+    (RECALL_LEVEL, "dynet2"): [8, 187, 12, "FF", 101, "100%", 0],
+}
+EXPECTED = {
+    REQUEST_SETPOINT: (12, "FF", None, None),
+    SET_SETPOINT: (12, "FF", None, 22.5),
+    RECALL_LEVEL: (12, "FF", 101, "100%"),
+}
+
+
+def old_chain(description):
+    # The substring chain handle_dynalite_message used before the dispatch table
+    description = str(description).lower()
+    if "request user temperature set point" in description or "request temperature set point" in description:
+        return REQUEST_SETPOINT
+    if "set temperature set point to" in description:
+        return SET_SETPOINT
+    if "recall level" in description:
+        return RECALL_LEVEL
+    return UNKNOWN
+
+
+class DispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.echoes = set()
+        handlers = {kind: self._handler(kind) for kind in (REQUEST_SETPOINT, SET_SETPOINT, RECALL_LEVEL)}
+        self.dispatcher = DynetDispatcher(handlers, fallback=lambda raw: self.calls.append(("fallback",)),
+                                          invalid=lambda raw: self.calls.append(("invalid",)),
+                                          echo=lambda *message: message in self.echoes)
+
+    def _handler(self, kind):
+        return lambda area, join, channel, value, raw: self.calls.append((kind, area, join, channel, value))
+
+    def test_templates_route_to_their_handler(self):
+        for (type, template), kind in TEMPLATES.items():
+            self.calls.clear()
+            self.dispatcher.dispatch({"type": type, "template": template, "fields": FIELDS[(kind, type)]})
+            self.assertEqual(self.calls, [(kind, *EXPECTED[kind])], template)
+
+    def test_unknown_templates_fall_through_like_the_old_chain(self):
+        for template in UNHANDLED:
+            self.assertEqual(classify(template), old_chain(template))
+            self.calls.clear()
+            self.dispatcher.dispatch({"type": "dynet1", "template": template, "fields": [1, 2, 3]})
+            self.assertEqual(self.calls, [("fallback",)], template)
+
+    def test_same_kinds_as_the_old_chain(self):
+        descriptions = [template for type, template in TEMPLATES] + list(UNHANDLED) + [
+            "request temperature set point area 5 join ff", "SET TEMPERATURE SET POINT TO 21.0 AREA 3"]
+        for description in descriptions:
+            self.assertEqual(classify(description), old_chain(description), description)
+
+    def test_no_template_classifies_the_description(self):
+        self.dispatcher.dispatch({"type": "dynet1", "description": "Set Temperature Set Point to 22.5 Area 12 Join ff",
+                                  "fields": [12, "FF", 22.5]})
+        self.assertEqual(self.calls, [(SET_SETPOINT, 12, "FF", None, 22.5)])
+        self.assertEqual(self.dispatcher.stats()["routes"], 0)
+
+    def test_wrong_layout_is_invalid(self):
+        template = "Recall Level Channel {} Area {} Join {:02x} Level {} Fade {}"
+        self.dispatcher.dispatch({"type": "dynet1", "template": template, "fields": [12, "FF", 101]})
+        self.dispatcher.dispatch({"type": "dynet3", "template": template, "fields": [12, "FF", 101, "1%", 0]})
+        self.assertEqual(self.calls, [("invalid",), ("invalid",)])
+
+    def test_route_compiled_once_per_template(self):
+        template = "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}"
+        for _ in range(3):
+            self.dispatcher.dispatch({"type": "dynet2", "template": template, "fields": FIELDS[(RECALL_LEVEL, "dynet2")]})
+        self.assertEqual(self.dispatcher.compiled, 1)
+        self.assertEqual(self.dispatcher.stats()["routes_per_kind"], {RECALL_LEVEL: 1})
+
+    def test_echo_hook_drops_before_the_handler(self):
+        self.echoes.add((RECALL_LEVEL, 12, "FF", 101, "100%"))
+        template = "Area {} Join {:02x} Recall Level Channel {} Level {} Fade {}"
+        self.dispatcher.dispatch({"type": "dynet2", "template": template, "fields": FIELDS[(RECALL_LEVEL, "dynet2")]})
+        self.assertEqual(self.calls, [])
+        self.dispatcher.dispatch({"type": "dynet2", "template": template, "fields": [8, 187, 12, "FF", 102, "0%", 0]})
+        self.assertEqual(self.calls, [(RECALL_LEVEL, 12, "FF", 102, "0%")])
+
+    def test_join_value(self):
+        self.assertEqual(join_value("FE"), 0xFE)
+        self.assertEqual(join_value(255), 255)
+        self.assertEqual(join_value("zz"), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
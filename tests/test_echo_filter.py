@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from helpers import dynet_codec
+from helpers.dynet_dispatch import RECALL_LEVEL, SET_SETPOINT
+from helpers.echo_filter import EchoFilter, message_fingerprint, packet_fingerprint
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_setpoint_matches_bus_report(self):
+        sent = packet_fingerprint(dynet_codec.setpoint_hex(12, 0xFE, 22.5))
+        self.assertEqual(sent, message_fingerprint(SET_SETPOINT, "12", "FE", None, "22.5"))
+        self.assertNotEqual(sent, message_fingerprint(SET_SETPOINT, 12, 0xFE, None, 23.0))
+        self.assertNotEqual(sent, message_fingerprint(SET_SETPOINT, 13, 0xFE, None, 22.5))
+
+    def test_level_in_percent_matches_raw_level(self):
+        sent = packet_fingerprint(dynet_codec.channel_level_hex(12, 0xFE, 101, 100))
+        self.assertEqual(sent, message_fingerprint(RECALL_LEVEL, 12, "FE", 101, "100%"))
+        self.assertNotEqual(sent, message_fingerprint(RECALL_LEVEL, 12, "FE", 102, "100%"))
+
+    def test_packets_that_never_echo(self):
+        self.assertIsNone(packet_fingerprint(dynet_codec.temperature_hex(12, 0xFE, 21.0)))
+        self.assertIsNone(packet_fingerprint("zz"))
+        self.assertIsNone(message_fingerprint(SET_SETPOINT, "x", "FE", None, 22))
+
+
+class EchoFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patch = mock.patch("helpers.echo_filter.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.setpoint = dynet_codec.setpoint_hex(12, 0xFE, 22.5)
+
+    def test_echo_dropped_within_ttl(self):
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(self.setpoint)
+        self.now = 104.0
+        self.assertTrue(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+        self.assertEqual(echoes.stats()["suppressed"], 1)
+
+    def test_echo_expires(self):
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(self.setpoint)
+        self.now = 105.0
+        self.assertFalse(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+        self.assertEqual(len(echoes), 0)
+
+    def test_real_repeat_after_the_echo_gets_through(self):
+        # We send heat, the bus echoes it, then a keypad sets cool and heat again
+        heat = dynet_codec.channel_level_hex(12, 0xFE, 102, 100)
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(heat)
+        self.assertTrue(echoes.is_echo(RECALL_LEVEL, 12, "FE", 102, "100%"))
+        self.now = 101.0
+        self.assertFalse(echoes.is_echo(RECALL_LEVEL, 12, "FE", 102, "0%"))
+        self.assertFalse(echoes.is_echo(RECALL_LEVEL, 12, "FE", 102, "100%"))
+
+    def test_one_echo_per_send(self):
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(self.setpoint)
+        echoes.sent(self.setpoint)
+        self.assertTrue(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+        self.assertTrue(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+        self.assertFalse(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+
+    def test_other_values_pass(self):
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(self.setpoint)
+        self.assertFalse(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 21.0))
+
+    def test_resend_refreshes_deadline(self):
+        echoes = EchoFilter(ttl=5)
+        echoes.sent(self.setpoint)
+        self.now = 103.0
+        echoes.sent(self.setpoint)
+        self.now = 106.0
+        echoes.sent(dynet_codec.setpoint_hex(13, 0xFE, 20.0))
+        self.assertTrue(echoes.is_echo(SET_SETPOINT, 12, "FE", None, 22.5))
+
+    def test_bounded(self):
+        echoes = EchoFilter(ttl=60, max_entries=2)
+        for area in (1, 2, 3):
+            echoes.sent(dynet_codec.setpoint_hex(area, 0xFE, 22.0))
+        self.assertEqual(len(echoes), 2)
+        self.assertFalse(echoes.is_echo(SET_SETPOINT, 1, "FE", None, 22.0))
+        self.assertTrue(echoes.is_echo(SET_SETPOINT, 3, "FE", None, 22.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
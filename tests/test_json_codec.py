@@ -0,0 +1,52 @@
+import unittest
+
+from helpers import json_codec
+
+PAYLOAD = '{"area":"7","name":"Küche ☀","temp":21.5,"on":true,"tags":[1,null]}'.encode()
+VALUE = {"area": "7", "name": "Küche ☀", "temp": 21.5, "on": True, "tags": [1, None]}
+
+
+def _text(data):
+    return data.decode() if isinstance(data, bytes) else data
+
+
+class CodecTest(unittest.TestCase):
+
+    def tearDown(self):
+        json_codec.use("auto")
+
+    def check_backend(self, name):
+        self.assertEqual(json_codec.use(name), name)
+        self.assertEqual(json_codec.loads(PAYLOAD), VALUE)
+        self.assertEqual(json_codec.loads(PAYLOAD.decode()), VALUE)
+        out = _text(json_codec.dumps(VALUE))
+        # Compact, and non-ASCII written as-is rather than \u escapes
+        self.assertIn("Küche ☀", out)
+        self.assertNotIn("\\u", out)
+        self.assertNotIn(", ", out)
+        self.assertEqual(json_codec.loads(out), VALUE)
+        return out
+
+    def test_stdlib(self):
+        self.check_backend("stdlib")
+
+    @unittest.skipIf(json_codec.orjson is None, "orjson not installed")
+    def test_orjson_matches_stdlib(self):
+        stdlib = self.check_backend("stdlib")
+        self.assertEqual(self.check_backend("orjson"), stdlib)
+
+    def test_orjson_falls_back_when_missing(self):
+        orjson, json_codec.orjson = json_codec.orjson, None
+        try:
+            self.assertEqual(json_codec.use("orjson"), "stdlib")
+            self.assertEqual(json_codec.use("auto"), "stdlib")
+        finally:
+            json_codec.orjson = orjson
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            json_codec.use("simplejson")
+
+
+if __name__ == "__main__":
+    unittest.main()
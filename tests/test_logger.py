@@ -0,0 +1,47 @@
+import unittest
+from unittest import mock
+
+from helpers import logger
+
+
+class RateLimitTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = []
+        patches = [
+            mock.patch.object(logger, "_limits", logger.OrderedDict()),
+            mock.patch.object(logger, "_limits_max", 3),
+            mock.patch.object(logger, "_emit", lambda record: self.lines.append(record[3])),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.log = logger.get_logger("🧪")
+
+    def test_table_is_bounded(self):
+        for area in range(100):
+            self.log.every(("no_unit", area), 60, "Area %s", area)
+        self.assertEqual(len(logger._limits), 3)
+        self.assertEqual(list(logger._limits), [("no_unit", 97), ("no_unit", 98), ("no_unit", 99)])
+        self.assertEqual(len(self.lines), 100)
+
+    def test_recently_used_key_survives(self):
+        self.log.every("a", 60, "a")
+        self.log.every("b", 60, "b")
+        self.log.every("c", 60, "c")
+        self.log.every("a", 60, "a")
+        self.log.every("d", 60, "d")
+        self.assertEqual(list(logger._limits), ["c", "a", "d"])
+        # "a" is still rate limited
+        self.log.every("a", 60, "a")
+        self.assertEqual(self.lines, ["a", "b", "c", "d"])
+        self.assertEqual(logger._limits["a"][1], 2)
+
+    def test_sample_shares_the_bound(self):
+        for i in range(10):
+            self.log.sample(i, 2, "x")
+        self.assertEqual(len(logger._limits), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from helpers.message_queue import BARRIER, DROP, MessageQueue, ShardedMessageQueue
+
+
+def _key(topic, payload):
+    if topic == "status":
+        return BARRIER
+    if topic == "lighting":
+        return DROP
+    return int(topic.split("/")[1]) if topic.startswith("area/") else None
+
+
+class ShardedOrderingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.handled = []
+        self.online = False
+        self.inbound = ShardedMessageQueue(self._handle, _key, shards=4)
+        self.tasks = self.inbound.start()
+
+    async def asyncTearDown(self):
+        self.inbound.stop()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def _handle(self, topic, payload):
+        if topic == "status":
+            self.online = payload == "online"
+        elif not self.online:
+            topic = f"{topic} dropped"
+        self.handled.append(topic)
+
+    async def _settle(self):
+        for _ in range(50):
+            await asyncio.sleep(0)
+
+    async def test_state_after_status_is_handled_after_it(self):
+        # A backlog on other shards must not let area 13 overtake the status
+        for area in (1, 2, 3, 5, 6, 7):
+            self.inbound.submit(f"area/{area}", None)
+        self.inbound.submit("status", "online")
+        self.inbound.submit("area/13", None)
+        await self._settle()
+        self.assertEqual(self.handled[6:], ["status", "area/13"])
+        self.assertTrue(all(topic.endswith("dropped") for topic in self.handled[:6]))
+
+    async def test_arrival_order_kept_across_barriers(self):
+        arrivals = ["area/1", "area/2", "status", "area/3", "area/1", "status", "area/4", "area/2"]
+        for topic in arrivals:
+            self.inbound.submit(topic, "online")
+        await self._settle()
+        self.assertEqual(sorted(self.handled[:2]), ["area/1 dropped", "area/2 dropped"])
+        self.assertEqual(self.handled[2], "status")
+        self.assertEqual(sorted(self.handled[3:5]), ["area/1", "area/3"])
+        self.assertEqual(self.handled[5], "status")
+        self.assertEqual(sorted(self.handled[6:]), ["area/2", "area/4"])
+        self.assertEqual(self.inbound.stats()["barriers"], 2)
+        self.assertEqual(self.inbound.depth(), 0)
+
+    async def test_dropped_by_key_never_queued(self):
+        self.online = True
+        self.inbound.submit("lighting", None)
+        self.inbound.submit("area/1", None)
+        await self._settle()
+        self.assertEqual(self.handled, ["area/1"])
+        self.assertEqual(self.inbound.stats()["filtered"], 1)
+
+    async def test_one_area_keeps_its_order(self):
+        self.online = True
+        for i in range(20):
+            self.inbound.submit("area/9", i)
+        seen = []
+        self.inbound.shard_for("area/9", None).handler = lambda topic, payload: seen.append(payload)
+        await self._settle()
+        self.assertEqual(seen, list(range(20)))
+
+
+class MessageQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_drop_oldest_when_full(self):
+        handled = []
+        queue = MessageQueue(lambda topic, payload: handled.append(payload), maxsize=2)
+        tasks = queue.start()
+        for i in range(4):
+            queue.submit("t", i)
+        await queue.drained()
+        queue.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(handled, [2, 3])
+        self.assertEqual(queue.dropped, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
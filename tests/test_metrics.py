@@ -0,0 +1,58 @@
+import unittest
+
+from helpers.metrics import MetricsRegistry
+
+
+class RenderTest(unittest.TestCase):
+
+    def test_counter_lines_with_and_without_labels(self):
+        registry = MetricsRegistry(prefix="dynalite_")
+        skipped = registry.counter("skipped_total", "Bus messages skipped", ("reason",))
+        sent = registry.counter("sent_total", "Packets sent")
+        skipped.inc("unknown_template")
+        skipped.inc("unknown_template")
+        skipped.inc("echo", amount=3)
+        sent.inc()
+        self.assertEqual(registry.render(), "\n".join([
+            "# HELP dynalite_skipped_total Bus messages skipped",
+            "# TYPE dynalite_skipped_total counter",
+            'dynalite_skipped_total{reason="unknown_template"} 2',
+            'dynalite_skipped_total{reason="echo"} 3',
+            "# HELP dynalite_sent_total Packets sent",
+            "# TYPE dynalite_sent_total counter",
+            "dynalite_sent_total 1",
+            "",
+        ]))
+
+    def test_histogram_buckets_are_cumulative_with_inf_sum_and_count(self):
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Handler latency", "kind", buckets=(0.1, 1.0))
+        latency.observe("temp", 0.05)
+        latency.observe("temp", 0.5)
+        latency.observe("temp", 2.0)
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP latency_seconds Handler latency",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{kind="temp",le="0.1"} 1',
+            'latency_seconds_bucket{kind="temp",le="1.0"} 2',
+            'latency_seconds_bucket{kind="temp",le="+Inf"} 3',
+            'latency_seconds_sum{kind="temp"} 2.55',
+            'latency_seconds_count{kind="temp"} 3',
+        ])
+
+    def test_collectors_and_a_failing_metric(self):
+        registry = MetricsRegistry()
+        registry.gauge("queue_depth", "Messages waiting", lambda: 4)
+        registry.counter_fn("areas_total", "Per area", lambda: {("1", "on"): 2, "7": 1}, ("area", "state"))
+        registry.gauge("broken", "Raises", lambda: 1 / 0)
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE queue_depth gauge", lines)
+        self.assertIn("queue_depth 4", lines)
+        self.assertIn("# TYPE areas_total counter", lines)
+        self.assertIn('areas_total{area="1",state="on"} 2', lines)
+        self.assertIn('areas_total{area="7"} 1', lines)
+        self.assertFalse([line for line in lines if "broken" in line])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,278 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from mqtt.aio import (AsyncioTransport, CONNACK, CONNECT, DISCONNECT, PINGREQ, PINGRESP, PUBACK, PUBLISH,
+                      SUBACK, SUBSCRIBE, _U16, _packet, connect_packet, publish_packet, read_packet,
+                      subscribe_packet)
+from mqtt.loopback import LoopbackBroker, LoopbackTransport
+from mqtt.transport import PublishError, Will
+
+
+def _reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def _string(body, offset):
+    length = _U16.unpack_from(body, offset)[0]
+    return body[offset + 2:offset + 2 + length], offset + 2 + length
+
+
+class TcpShim:
+    """
+    Minimal MQTT 3.1.1 server in front of a LoopbackBroker, decoding frames
+    with the same codec the client uses. `corrupt` sends a truncated PUBLISH
+    after the next CONNACK.
+    """
+
+    def __init__(self, broker: LoopbackBroker):
+        self.broker = broker
+        self.server = None
+        self.port = None
+        self.connects = []      # (client id, will topic, will payload)
+        self.received = []      # (topic, payload, qos, dup)
+        self.pubacks = []
+        self.corrupt = False
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._client, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _client(self, reader, writer):
+        will = None
+        subscriptions = []
+        clean = False
+
+        def deliver(topic, payload):
+            if any(pattern == topic or pattern.endswith("#") and topic.startswith(pattern[:-1])
+                   for pattern in subscriptions):
+                writer.write(publish_packet(topic, payload, 0))
+
+        try:
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == CONNECT:
+                    protocol, offset = _string(body, 0)
+                    level, flags = body[offset], body[offset + 1]
+                    client_id, offset = _string(body, offset + 4)
+                    if flags & 0x04:
+                        topic, offset = _string(body, offset)
+                        payload, offset = _string(body, offset)
+                        will = (topic.decode(), payload)
+                    self.connects.append((client_id.decode(), protocol, level, will))
+                    writer.write(_packet(CONNACK, b"\x00\x00"))
+                    self.broker.listen("#", deliver)
+                    if self.corrupt:
+                        self.corrupt = False
+                        # Remaining length 1, then a topic length the body doesn't have
+                        writer.write(bytes([PUBLISH, 1, 0]))
+                elif kind == PUBLISH:
+                    qos = header >> 1 & 0x03
+                    topic, offset = _string(body, 0)
+                    if qos:
+                        packet_id = _U16.unpack_from(body, offset)[0]
+                        offset += 2
+                        writer.write(_packet(PUBACK, _U16.pack(packet_id)))
+                    self.received.append((topic.decode(), body[offset:], qos, bool(header & 0x08)))
+                    self.broker.publish(topic.decode(), body[offset:], bool(header & 0x01))
+                elif kind == PUBACK:
+                    self.pubacks.append(_U16.unpack_from(body)[0])
+                elif header == SUBSCRIBE:
+                    packet_id = _U16.unpack_from(body)[0]
+                    topic, offset = _string(body, 2)
+                    subscriptions.append(topic.decode())
+                    writer.write(_packet(SUBACK, _U16.pack(packet_id) + bytes([body[offset]])))
+                elif kind == PINGREQ:
+                    writer.write(_packet(PINGRESP, b""))
+                elif kind == DISCONNECT:
+                    clean = True
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            subscriptions.clear()
+            if not clean and will:
+                self.broker.publish(will[0], will[1], True)
+            writer.close()
+
+
+class FramingTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_connect_round_trip(self):
+        will = Will("bridge/status", "offline", qos=1, retain=True)
+        header, body = await read_packet(_reader(connect_packet("bridge", 60, "user", "secret", will)))
+        self.assertEqual(header, CONNECT)
+        protocol, offset = _string(body, 0)
+        self.assertEqual((protocol, body[offset]), (b"MQTT", 4))
+        flags = body[offset + 1]
+        self.assertEqual(flags, 0x02 | 0x04 | 1 << 3 | 0x20 | 0x80 | 0x40)
+        self.assertEqual(_U16.unpack_from(body, offset + 2)[0], 60)
+        fields = []
+        offset += 4
+        while offset < len(body):
+            value, offset = _string(body, offset)
+            fields.append(value)
+        self.assertEqual(fields, [b"bridge", b"bridge/status", b"offline", b"user", b"secret"])
+
+    async def test_publish_round_trip(self):
+        for qos, dup, size in ((0, False, 5), (1, False, 200), (1, True, 20000)):
+            payload = b"x" * size
+            packet = publish_packet("dynalite/set", payload, qos, retain=True, packet_id=42, dup=dup)
+            header, body = await read_packet(_reader(packet))
+            self.assertEqual(header & 0xF0, PUBLISH)
+            self.assertEqual(header >> 1 & 0x03, qos)
+            self.assertEqual(bool(header & 0x08), dup)
+            self.assertTrue(header & 0x01)
+            topic, offset = _string(body, 0)
+            self.assertEqual(topic, b"dynalite/set")
+            if qos:
+                self.assertEqual(_U16.unpack_from(body, offset)[0], 42)
+                offset += 2
+            self.assertEqual(body[offset:], payload)
+
+    async def test_puback_and_subscribe_round_trip(self):
+        reader = _reader(_packet(PUBACK, _U16.pack(7)) + subscribe_packet(9, "a/#", 1))
+        header, body = await read_packet(reader)
+        self.assertEqual((header, _U16.unpack_from(body)[0]), (PUBACK, 7))
+        header, body = await read_packet(reader)
+        self.assertEqual(header, SUBSCRIBE)
+        self.assertEqual(_U16.unpack_from(body)[0], 9)
+        topic, offset = _string(body, 2)
+        self.assertEqual((topic, body[offset]), (b"a/#", 1))
+
+    async def test_remaining_length_limit(self):
+        with self.assertRaises(ValueError):
+            await read_packet(_reader(bytes([PUBLISH, 0xFF, 0xFF, 0xFF, 0xFF, 0x01])))
+
+
+class LoopbackRoundTripTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.broker = LoopbackBroker()
+        self.shim = TcpShim(self.broker)
+        await self.shim.start()
+        self.messages = []
+        self.connects = []
+        self.client = AsyncioTransport(client_id="bridge", will=Will("bridge/status", "offline"))
+        self.client.on_message = lambda topic, payload: self.messages.append((topic, payload))
+        self.client.on_connect = self._on_connect
+        self.peer = LoopbackTransport(broker=self.broker)
+        self.peer_messages = []
+        self.peer.on_message = lambda topic, payload: self.peer_messages.append((topic, payload))
+        self.peer.start()
+        self.peer.subscribe("dynalite/#")
+
+    def _on_connect(self, rc):
+        self.connects.append(rc)
+        self.client.subscribe("homeassistant/#", qos=1)
+
+    async def asyncTearDown(self):
+        self.client.stop()
+        await self.shim.stop()
+
+    async def _connected(self, count=1):
+        for _ in range(200):
+            if len(self.connects) >= count and self.client.connected:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"not connected {count} time(s)")
+
+    async def test_publish_and_receive(self):
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        self.assertEqual(self.shim.connects[0][0], "bridge")
+
+        future = self.client.publish("dynalite/set", b'{"type":"dynet2"}', qos=1)
+        self.assertTrue(await asyncio.wait_for(future, 1))
+        self.assertEqual(self.client._inflight, {})
+        self.client.publish("dynalite/set", "qos0")
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.peer_messages, [("dynalite/set", b'{"type":"dynet2"}'), ("dynalite/set", b"qos0")])
+        self.assertEqual([qos for topic, payload, qos, dup in self.shim.received], [1, 0])
+
+        self.peer.publish("homeassistant/climate/x/state", b"{}")
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.messages, [("homeassistant/climate/x/state", b"{}")])
+
+    async def test_will_on_unclean_disconnect(self):
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        self.client._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.broker.retained.get("bridge/status"), b"offline")
+
+    async def test_reconnects_after_malformed_packet(self):
+        self.shim.corrupt = True
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        # Retry delay is 1 s after a dropped connection
+        await asyncio.wait_for(self._connected(2), 3)
+        self.assertFalse(self.client._task.done())
+
+    async def test_qos1_resent_as_duplicate_after_reconnect(self):
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        self.client._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        future = self.client.publish("dynalite/set", b"later", qos=1)
+        self.assertFalse(future.done())
+        self.assertTrue(await asyncio.wait_for(future, 3))
+        self.assertIn(("dynalite/set", b"later", 1, True), self.shim.received)
+
+    async def test_qos1_published_while_resends_drain(self):
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        self.client._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        resent = self.client.publish("dynalite/set", b"resent", qos=1)
+        futures = []
+        drain = asyncio.StreamWriter.drain
+
+        async def publish_then_drain(writer):
+            # The first drain after the reconnect is the one behind the resends
+            if not futures:
+                futures.append(self.client.publish("dynalite/set", b"during", qos=1))
+            await drain(writer)
+
+        with mock.patch.object(asyncio.StreamWriter, "drain", publish_then_drain):
+            self.assertTrue(await asyncio.wait_for(resent, 3))
+            self.assertTrue(await asyncio.wait_for(futures[0], 1))
+        self.assertIn(("dynalite/set", b"during", 1, False), self.shim.received)
+
+    async def test_qos0_publish_returns_no_future(self):
+        self.client.start("127.0.0.1", self.shim.port, keepalive=0)
+        await self._connected()
+        self.assertIsNone(self.client.publish("dynalite/set", b"x"))
+
+
+class LimitsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_packet_ids_exhausted(self):
+        client = AsyncioTransport()
+        client._inflight = {packet_id: (b"", None) for packet_id in range(1, 0x10000)}
+        with self.assertRaises(PublishError):
+            client.publish("t", b"x", qos=1)
+
+    async def test_send_queue_bounded(self):
+        client = AsyncioTransport(max_queued=2)
+        client._outbox = asyncio.Queue(maxsize=2)
+        client.publish("t", b"1")
+        client.publish("t", b"2")
+        with self.assertRaises(PublishError):
+            client.publish("t", b"3")
+
+    async def test_qos0_while_disconnected_raises(self):
+        with self.assertRaises(ConnectionError):
+            AsyncioTransport().publish("t", b"x")
+
+
+if __name__ == "__main__":
+    unittest.main()
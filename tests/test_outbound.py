@@ -0,0 +1,177 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from helpers.dynet_batch import DynetBatcher
+from helpers.outbound import AimdWindow, OutboundScheduler, TokenBucket, frame_size
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_take_and_refill(self):
+        bucket = TokenBucket(rate=100, burst=50)
+        now = bucket.stamp = 10.0
+        self.assertEqual(bucket.take(30, now), 0.0)
+        self.assertAlmostEqual(bucket.take(30, now), 0.1)
+        # Steps that are exact in binary, now + 0.1 - now isn't always 0.1
+        self.assertEqual(bucket.take(30, now + 0.125), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 2.5)
+
+    def test_larger_than_burst_goes_once_full(self):
+        bucket = TokenBucket(rate=100, burst=50)
+        now = bucket.stamp = 10.0
+        self.assertEqual(bucket.take(80, now), 0.0)
+        # In debt by 30, the next packet waits for it
+        self.assertAlmostEqual(bucket.take(10, now), 0.4)
+
+    def test_frame_size(self):
+        self.assertEqual(frame_size("dynet1", "1C 0C 00 00 00 00 FF"), 8)
+        self.assertEqual(frame_size("dynet2", "56 BB 0C 00"), 8)
+
+
+class AimdWindowTest(unittest.TestCase):
+
+    def test_fast_acks_grow_about_one_per_window(self):
+        window = AimdWindow(initial=4, maximum=64, latency_target=1.0)
+        for _ in range(4):
+            window.on_ack(0.05)
+        self.assertEqual(int(window.size), 4)
+        self.assertAlmostEqual(window.size, 4.9, places=1)
+        for _ in range(8):
+            window.on_ack(0.05)
+        self.assertEqual(int(window.size), 6)
+        self.assertTrue(window.can_send(5))
+        self.assertFalse(window.can_send(6))
+
+    def test_bounded(self):
+        window = AimdWindow(initial=100, minimum=2, maximum=8, cooldown=0)
+        self.assertEqual(window.size, 8)
+        for _ in range(10):
+            window.on_loss()
+        self.assertEqual(window.size, 2)
+        window = AimdWindow(initial=7, minimum=2, maximum=8)
+        for _ in range(20):
+            window.on_ack(0.05)
+        self.assertEqual(window.size, 8)
+
+    def test_loss_halves_once_per_cooldown(self):
+        window = AimdWindow(initial=16, cooldown=1.0)
+        with mock.patch("helpers.outbound.time.monotonic", return_value=100.0):
+            window.on_loss()
+            window.on_loss()
+        self.assertEqual(window.size, 8)
+        self.assertEqual(window.decreases, 1)
+        with mock.patch("helpers.outbound.time.monotonic", return_value=101.5):
+            window.on_loss()
+        self.assertEqual(window.size, 4)
+
+    def test_slow_ack_counts_as_loss(self):
+        window = AimdWindow(initial=16, latency_target=0.5)
+        window.on_ack(0.8)
+        self.assertEqual(window.size, 8)
+        self.assertEqual(window.increases, 0)
+        self.assertEqual(window.stats()["srtt_ms"], 800.0)
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.sent = []
+        self.frames = []
+        self.in_flight = 0
+        self.tasks = []
+
+    async def asyncTearDown(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def _scheduler(self, **kwargs):
+        return OutboundScheduler(lambda packet: self.sent.append((packet.area, packet.kind, packet.hex_string)), **kwargs)
+
+    def _submit(self, scheduler, area, *kinds):
+        for kind in kinds:
+            scheduler.submit("dynet2", f"{area}-{kind}", kind=kind, area=area)
+
+    async def test_priority_across_areas(self):
+        scheduler = self._scheduler()
+        self._submit(scheduler, 1, "temp")
+        self._submit(scheduler, 2, "105")
+        self._submit(scheduler, 3, "setpoint")
+        scheduler.flush()
+        self.assertEqual([area for area, kind, hex_string in self.sent], [3, 1, 2])
+
+    async def test_area_sent_together_in_submission_order(self):
+        scheduler = self._scheduler()
+        self._submit(scheduler, 12, "101", "102", "103", "temp")
+        self._submit(scheduler, 13, "101", "102")
+        self._submit(scheduler, 12, "setpoint")
+        scheduler.flush()
+        self.assertEqual([(area, kind) for area, kind, hex_string in self.sent], [
+            (12, "101"), (12, "102"), (12, "103"), (12, "temp"), (12, "setpoint"),
+            (13, "101"), (13, "102")])
+
+    async def test_last_writer_wins_keeps_place(self):
+        scheduler = self._scheduler()
+        scheduler.submit("dynet2", "22", kind="setpoint", area=12)
+        scheduler.submit("dynet2", "on", kind="101", area=12)
+        scheduler.submit("dynet2", "23", kind="setpoint", area=12)
+        scheduler.submit("dynet2", "x", kind="105")
+        scheduler.submit("dynet2", "y", kind="105")
+        self.assertEqual(scheduler.stats()["coalesced"]["interactive"], 1)
+        scheduler.flush()
+        self.assertEqual(self.sent, [(12, "setpoint", "23"), (12, "101", "on"), (None, "105", "x"), (None, "105", "y")])
+
+    async def test_area_index_follows_the_queue(self):
+        scheduler = self._scheduler()
+        self._submit(scheduler, 12, "temp", "101")
+        scheduler.submit("dynet2", "12-101-b", kind="101", area=12)
+        self._submit(scheduler, 12, "setpoint")
+        self.assertEqual([packet.hex_string for packet in scheduler._next_area()], ["12-temp", "12-101-b", "12-setpoint"])
+        scheduler.flush()
+        self.assertEqual(scheduler._by_area, {})
+        self.assertEqual(scheduler.stats()["depth"], {name: 0 for name in scheduler.depth()})
+
+    async def test_one_batch_frame_per_area(self):
+        batcher = DynetBatcher(self.frames.append, mode="area")
+        scheduler = OutboundScheduler(lambda packet: batcher.add(packet.type, packet.hex_string, packet.seq),
+                                      rate=1000, burst=64, begin_burst=batcher.begin_area, end_burst=batcher.end_area)
+        self.tasks.append(scheduler.start())
+        self._submit(scheduler, 12, "101", "102", "103")
+        self._submit(scheduler, 13, "101", "102", "103")
+        self._submit(scheduler, 12, "temp")
+        for _ in range(100):
+            if scheduler._depth == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual([frame["hex_strings"] for frame in self.frames], [
+            ["12-101", "12-102", "12-103", "12-temp"],
+            ["13-101", "13-102", "13-103"]])
+
+    async def test_budget_paces_areas(self):
+        # 6 bytes per packet, a 12 byte burst at 120 bytes/s: the second area waits 0.1 s
+        scheduler = self._scheduler(rate=120, burst=12)
+        self.tasks.append(scheduler.start())
+        self._submit(scheduler, 1, "101", "102")
+        self._submit(scheduler, 2, "101", "102")
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(self.sent), 2)
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.sent), 4)
+        self.assertEqual(scheduler.bytes_sent, 24)
+
+    async def test_window_holds_the_next_area(self):
+        scheduler = self._scheduler(window=AimdWindow(initial=2, minimum=1, maximum=2), in_flight=lambda: self.in_flight)
+        self.tasks.append(scheduler.start())
+        self.in_flight = 1
+        self._submit(scheduler, 1, "101", "102")
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [])
+        self.in_flight = 0
+        scheduler.wake()
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(self.sent), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest import mock
+
+from helpers.climate_state import FIELDS
+from helpers.reply_bundle import ReplyBundles, parse_reply_fields
+
+
+class ParseReplyFieldsTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_reply_fields(""), FIELDS)
+        self.assertEqual(parse_reply_fields("All"), FIELDS)
+        self.assertEqual(parse_reply_fields("requested"), ("setpoint",))
+        # Kept in FIELDS order whatever the order given
+        self.assertEqual(parse_reply_fields("fan_mode, setpoint"), ("setpoint", "fan_mode"))
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError) as caught:
+            parse_reply_fields("setpoint,humidity")
+        self.assertIn("humidity", str(caught.exception))
+
+
+class ReplyBundlesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patch = mock.patch("helpers.reply_bundle.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.state = {(12, "setpoint"): 22.0, (12, "hvac_mode"): "cool"}
+        self.encoded = []
+        self.bundles = ReplyBundles(lambda area, field: self.state.get((area, field)), self._encode, window=1.0)
+
+    def _encode(self, area, field, value):
+        self.encoded.append((area, field, value))
+        return [(field, str(value), "dynet2", f"{area}-{field}-{value}")]
+
+    def test_packets_reused_until_value_changes(self):
+        self.bundles.packets(12, "setpoint")
+        self.bundles.packets(12, "setpoint")
+        self.assertEqual(self.encoded, [(12, "setpoint", 22.0)])
+        self.state[(12, "setpoint")] = 23.0
+        self.assertEqual(self.bundles.packets(12, "setpoint"), [("setpoint", "23.0", "dynet2", "12-setpoint-23.0")])
+        self.assertEqual(self.bundles.stats()["encoded"], 2)
+        self.assertEqual(self.bundles.stats()["reused"], 1)
+
+    def test_request_skips_fields_without_a_value(self):
+        reply = self.bundles.request(12)
+        self.assertEqual([field for field, packets in reply], ["setpoint", "hvac_mode"])
+
+    def test_repeat_within_window_collapsed(self):
+        self.bundles.request(12)
+        self.now = 100.5
+        self.assertIsNone(self.bundles.request(12))
+        self.assertEqual(self.bundles.stats()["collapsed"], 1)
+        self.now = 101.0
+        self.assertEqual(len(self.bundles.request(12)), 2)
+
+    def test_area_without_a_value_collapsed(self):
+        self.assertIsNone(self.bundles.request(40))
+        self.assertEqual(self.encoded, [])
+
+    def test_window_is_per_field(self):
+        self.bundles.request(12, ("setpoint",))
+        self.now = 100.5
+        reply = self.bundles.request(12)
+        self.assertEqual([field for field, packets in reply], ["hvac_mode"])
+
+    def test_window_is_per_area(self):
+        self.state[(13, "setpoint")] = 20.0
+        self.bundles.request(12)
+        self.assertEqual([field for field, packets in self.bundles.request(13)], ["setpoint"])
+
+
+if __name__ == "__main__":
+    unittest.main()
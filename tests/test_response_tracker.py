@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from helpers.response_tracker import PendingResponses
+
+
+class PendingResponsesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patch = mock.patch("helpers.response_tracker.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_expire_returns_past_deadline_oldest_first(self):
+        pending = PendingResponses(ttl=10)
+        pending.add("a", kind="setpoint")
+        self.now = 102.0
+        pending.add("b", kind="temp")
+        pending.add("c", kind="101")
+        self.assertEqual(pending.expire(now=109.0), [])
+        self.assertEqual([entry.response_id for entry in pending.expire(now=112.0)], ["a", "b", "c"])
+        self.assertEqual(len(pending), 0)
+        self.assertEqual(pending.stats()["expired"], 3)
+
+    def test_acked_entry_never_expires(self):
+        pending = PendingResponses(ttl=10)
+        pending.add("a")
+        pending.add("b")
+        pending.ack("a")
+        self.assertEqual([entry.response_id for entry in pending.expire(now=200.0)], ["b"])
+
+    def test_ack_records_latency_per_kind(self):
+        pending = PendingResponses(ttl=10)
+        pending.add("a", kind="setpoint", area=12)
+        self.now = 100.2
+        entry, latency = pending.ack("a")
+        self.assertEqual(entry.data, {"area": 12})
+        self.assertAlmostEqual(latency, 0.2)
+        self.assertEqual(pending.latency_snapshot()["setpoint"]["count"], 1)
+        self.assertEqual(pending.ack("a"), (None, None))
+        self.assertEqual(pending.stats()["unknown"], 1)
+
+    def test_pop_forgets_without_latency(self):
+        pending = PendingResponses(ttl=10)
+        pending.add("a", kind="setpoint")
+        self.assertEqual(pending.pop("a").response_id, "a")
+        self.assertEqual(pending.latency_snapshot(), {})
+        self.assertNotIn("a", pending)
+
+    def test_evict_oldest_when_full(self):
+        pending = PendingResponses(ttl=10, max_entries=2, eviction="oldest")
+        for response_id in ("a", "b", "c"):
+            pending.add(response_id)
+            self.now += 1
+        self.assertNotIn("a", pending)
+        self.assertIn("c", pending)
+        self.assertEqual(pending.evicted, 1)
+
+    def test_evict_newest_when_full(self):
+        pending = PendingResponses(ttl=10, max_entries=2, eviction="newest")
+        for response_id in ("a", "b", "c"):
+            pending.add(response_id)
+        self.assertEqual(sorted(pending._entries), ["a", "b"])
+        self.assertEqual(pending.evicted, 1)
+
+    def test_unknown_eviction_policy(self):
+        with self.assertRaises(ValueError):
+            PendingResponses(eviction="random")
+
+    def test_next_deadline_skips_acked(self):
+        pending = PendingResponses(ttl=10)
+        self.assertIsNone(pending.next_deadline())
+        pending.add("a")
+        self.now = 104.0
+        pending.add("b")
+        pending.ack("a")
+        self.assertEqual(pending.next_deadline(), 10.0)
+        pending.ack("b")
+        self.assertIsNone(pending.next_deadline())
+
+    def test_heap_compacts_after_many_acks(self):
+        pending = PendingResponses(ttl=10)
+        for i in range(200):
+            pending.add(i)
+        for i in range(190):
+            pending.ack(i)
+        self.assertLess(len(pending._heap), 100)
+        self.assertEqual(len(pending.expire(now=200.0)), 10)
+
+
+
+class WaitNextTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sleeps_while_empty_until_an_add(self):
+        pending = PendingResponses(ttl=10)
+        waiter = asyncio.create_task(pending.wait_next())
+        await asyncio.sleep(0.02)
+        self.assertFalse(waiter.done())
+        pending.add("a")
+        await asyncio.wait_for(waiter, 0.1)
+
+    async def test_wakes_at_the_deadline(self):
+        pending = PendingResponses(ttl=0.03)
+        pending.add("a")
+        await asyncio.wait_for(pending.wait_next(), 0.2)
+        self.assertEqual([entry.response_id for entry in pending.expire()], ["a"])
+
+    async def test_later_deadline_does_not_wake(self):
+        pending = PendingResponses(ttl=0.05)
+        pending.add("a")
+        waiter = asyncio.create_task(pending.wait_next())
+        await asyncio.sleep(0.01)
+        pending.add("b")
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        await asyncio.wait_for(waiter, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+from helpers.climate_state import ClimateStateTable
+from helpers.resync import AckedState, ResyncPacer
+
+
+class ResyncPacerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.table = ClimateStateTable()
+        self.acked = AckedState()
+        self.sent = []
+        self.online = True
+        self.pacer = ResyncPacer(
+            self.acked,
+            packets=lambda: self.table.resync_packets(self._encode, self.table.dirty_fields()),
+            send=lambda area, kind, type, hex_string: self.sent.append((area, kind, hex_string)),
+            ready=lambda: self.online,
+            rate=0,
+            settle=0
+        )
+        self.pacer.start()
+
+    def _encode(self, area, field):
+        return [(field, field, "dynet2", f"{area}:{self.table.get_field(area, field)}")]
+
+    async def _run(self):
+        self.pacer.trigger("test")
+        for _ in range(20):
+            await asyncio.sleep(0)
+        await self.pacer._task
+
+    async def test_only_unacknowledged_dirty_fields(self):
+        self.table.update(12, {"setpoint": 22.0, "status": "ok"})
+        self.table.update(13, {"setpoint": 20.0})
+        self.table.mark_synced(13, "setpoint")
+        self.acked.ack(12, "setpoint", "12:22.0")
+        await self._run()
+        self.assertEqual(self.sent, [(12, "status", "12:ok")])
+        self.assertEqual(self.pacer.stats()["checked"], 2)
+
+    async def test_in_flight_packet_not_resent(self):
+        self.table.update(12, {"setpoint": 22.0})
+        self.acked.sent(12, "setpoint", "12:22.0")
+        await self._run()
+        self.assertEqual(self.sent, [])
+
+    async def test_skipped_while_offline(self):
+        self.table.update(12, {"setpoint": 22.0})
+        self.online = False
+        await self._run()
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.pacer.runs, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from helpers.outbound import AimdWindow, OutboundScheduler
+from helpers.retry import RetryEngine
+
+
+class RetryOrderingTest(unittest.IsolatedAsyncioTestCase):
+    """
+    A retry of an older value must never replace, or go out instead of, a
+    newer value queued for the same area/channel.
+    """
+
+    async def asyncSetUp(self):
+        self.sent = []
+        self.in_flight = []
+        self.scheduler = OutboundScheduler(
+            self._send,
+            window=AimdWindow(initial=1, minimum=1, maximum=1),
+            in_flight=lambda: len(self.in_flight)
+        )
+        self.retries = RetryEngine(resend=lambda p: self._queue(p["hex_string"], p["attempt"]),
+                                   resync=lambda area: None, base_delay=0, jitter=0)
+        self.task = self.scheduler.start()
+
+    async def asyncTearDown(self):
+        self.scheduler.stop()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+    def _send(self, packet):
+        self.sent.append((packet.hex_string, packet.attempt))
+        self.in_flight.append(packet)
+
+    def _queue(self, hex_string, attempt=1):
+        # What main._pub2dynet does
+        self.retries.note_queued(12, "setpoint", hex_string)
+        self.scheduler.submit("dynet2", hex_string, kind="setpoint", area=12, attempt=attempt)
+
+    async def test_retry_yields_to_newer_queued_value(self):
+        self._queue("22")
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [("22", 1)])
+
+        # 23 waits behind the full window, then 22 times out
+        self._queue("23")
+        await asyncio.sleep(0.01)
+        self.retries.failed({"type": "dynet2", "hex_string": "22", "kind": "setpoint", "area": 12,
+                             "comment": "", "attempt": 1}, "expired")
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.retries.stats()["superseded"], 1)
+        self.assertEqual(self.scheduler.depth()["interactive"], 1)
+
+        self.in_flight.clear()
+        self.scheduler.wake()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [("22", 1), ("23", 1)])
+
+    async def test_retry_never_replaces_a_different_queued_packet(self):
+        self.in_flight.append(object())
+        self.scheduler.submit("dynet2", "23", kind="setpoint", area=12)
+        self.scheduler.submit("dynet2", "22", kind="setpoint", area=12, attempt=2)
+        self.in_flight.clear()
+        self.scheduler.wake()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [("23", 1)])
+
+    async def test_retry_of_the_latest_value_goes_out(self):
+        self._queue("22")
+        await asyncio.sleep(0.01)
+        self.in_flight.clear()
+        self.retries.failed({"type": "dynet2", "hex_string": "22", "kind": "setpoint", "area": 12,
+                             "comment": "", "attempt": 1}, "expired")
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [("22", 1), ("22", 2)])
+
+
+
+def _packet(hex_string="22", attempt=1, area=12, kind="setpoint"):
+    return {"type": "dynet2", "hex_string": hex_string, "kind": kind, "area": area, "comment": "", "attempt": attempt}
+
+
+class RetryEngineTest(unittest.TestCase):
+    """
+    Without a running loop a retry is resent straight away, which keeps these synchronous.
+    """
+
+    def setUp(self):
+        self.resent = []
+        self.resynced = []
+        self.retries = RetryEngine(self.resent.append, self.resynced.append, max_attempts=3,
+                                   base_delay=1.0, max_delay=5.0, jitter=0, budget=2, budget_window=60.0,
+                                   resync_interval=300.0)
+
+    def test_backoff_doubles_up_to_max_delay(self):
+        self.assertEqual([self.retries.delay(attempt) for attempt in range(1, 6)], [1.0, 2.0, 4.0, 5.0, 5.0])
+
+    def test_jitter_only_shortens(self):
+        retries = RetryEngine(None, None, base_delay=2.0, jitter=0.5)
+        for _ in range(50):
+            self.assertTrue(1.0 <= retries.delay(1) <= 2.0)
+
+    def test_gives_up_after_max_attempts_and_resyncs(self):
+        self.retries.failed(_packet(attempt=1), "expired")
+        self.retries.failed(_packet(attempt=2), "expired")
+        self.assertEqual([p["attempt"] for p in self.resent], [2, 3])
+        self.retries.failed(_packet(attempt=3), "expired")
+        self.assertEqual(len(self.resent), 2)
+        self.assertEqual(self.retries.exhausted, 1)
+        self.assertEqual(self.resynced, [12])
+
+    def test_budget_per_area_and_channel(self):
+        for _ in range(3):
+            self.retries.failed(_packet(), "failed")
+        self.assertEqual(len(self.resent), 2)
+        self.assertEqual(self.retries.over_budget, 1)
+        # Another channel of the same area has its own budget
+        self.retries.failed(_packet(kind="101"), "failed")
+        self.assertEqual(len(self.resent), 3)
+
+    def test_budget_refills_after_window(self):
+        with mock.patch("helpers.retry.time.monotonic", return_value=100.0):
+            for _ in range(3):
+                self.retries.failed(_packet(), "failed")
+        with mock.patch("helpers.retry.time.monotonic", return_value=160.0):
+            self.retries.failed(_packet(), "failed")
+        self.assertEqual(len(self.resent), 3)
+
+    def test_resync_at_most_once_per_interval(self):
+        with mock.patch("helpers.retry.time.monotonic", return_value=100.0):
+            self.retries.failed(_packet(attempt=3), "expired")
+            self.retries.failed(_packet(kind="101", attempt=3), "expired")
+        with mock.patch("helpers.retry.time.monotonic", return_value=401.0):
+            self.retries.failed(_packet(attempt=3), "expired")
+        self.assertEqual(self.resynced, [12, 12])
+        self.assertEqual(self.retries.resyncs, 2)
+
+
+class RetryTimerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancel_all_drops_pending_retries(self):
+        resent = []
+        retries = RetryEngine(resent.append, lambda area: None, base_delay=0.01, jitter=0)
+        retries.failed(_packet(), "expired")
+        self.assertEqual(retries.pending(), 1)
+        retries.cancel_all()
+        await asyncio.sleep(0.03)
+        self.assertEqual(resent, [])
+        self.assertEqual(retries.pending(), 0)
+
+    async def test_retry_waits_for_backoff(self):
+        resent = []
+        retries = RetryEngine(resent.append, lambda area: None, base_delay=0.02, jitter=0)
+        retries.failed(_packet(), "expired")
+        await asyncio.sleep(0.005)
+        self.assertEqual(resent, [])
+        await asyncio.sleep(0.04)
+        self.assertEqual([p["attempt"] for p in resent], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+from helpers.state_snapshot import (SNAPSHOT_VERSION, SnapshotWriter, load_snapshot, read_snapshot,
+                                    save_snapshot, snapshot_section)
+
+STATE = {"setpoint": 22.5, "current_temp": 21.0, "hvac_mode": "cool", "fan_mode": "auto", "status": "on"}
+
+
+class SnapshotFileTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.json")
+
+    def _write(self, data):
+        with open(self.path, "w") as f:
+            f.write(data)
+
+    def test_round_trip(self):
+        save_snapshot(self.path, {12: STATE, 13: None}, {12: {"setpoint": "56 BB"}})
+        snapshot = read_snapshot(self.path)
+        self.assertEqual(snapshot_section(snapshot), {12: STATE})
+        self.assertEqual(snapshot_section(snapshot, "acked"), {12: {"setpoint": "56 BB"}})
+        self.assertEqual(load_snapshot(self.path), {12: STATE})
+
+    def test_missing_acked_section(self):
+        save_snapshot(self.path, {12: STATE})
+        self.assertEqual(load_snapshot(self.path, "acked"), {})
+
+    def test_missing_file(self):
+        self.assertEqual(read_snapshot(self.path), {})
+
+    def test_version_mismatch(self):
+        self._write(json.dumps({"v": SNAPSHOT_VERSION + 1, "areas": {"12": STATE}}))
+        self.assertEqual(load_snapshot(self.path), {})
+
+    def test_corrupt_file(self):
+        self._write('{"v": 1, "areas": {"12"')
+        self.assertEqual(load_snapshot(self.path), {})
+
+    def test_not_an_object(self):
+        for data in ("[1, 2]", "null", '"areas"'):
+            self._write(data)
+            self.assertEqual(read_snapshot(self.path), {})
+        self._write(json.dumps({"v": SNAPSHOT_VERSION, "areas": [12]}))
+        self.assertEqual(load_snapshot(self.path), {})
+
+    def test_bad_area_skipped(self):
+        self._write(json.dumps({"v": SNAPSHOT_VERSION, "areas": {"12": STATE, "x": STATE}}))
+        self.assertEqual(load_snapshot(self.path), {12: STATE})
+
+
+class SnapshotWriterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state.json")
+        self.state = {12: dict(STATE)}
+        self.writer = SnapshotWriter(self.path, lambda: {area: dict(state) for area, state in self.state.items()})
+
+    async def test_writes_only_changes(self):
+        self.assertTrue(await self.writer.save_async())
+        self.assertFalse(await self.writer.save_async())
+        self.state[12]["setpoint"] = 23.0
+        self.assertTrue(await self.writer.save_async())
+        self.assertEqual(self.writer.writes, 2)
+        self.assertEqual(self.writer.skipped, 1)
+        self.assertEqual(load_snapshot(self.path)[12]["setpoint"], 23.0)
+
+    async def test_older_write_never_lands_over_a_newer_one(self):
+        old = self.writer._prepare(False)
+        self.state[12]["setpoint"] = 23.0
+        self.assertTrue(self.writer.save())
+        self.assertIsNone(self.writer._write(old[0], old[2]))
+        self.assertEqual(load_snapshot(self.path)[12]["setpoint"], 23.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
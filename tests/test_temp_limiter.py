@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from config import TEMP_DEADBAND, TEMP_PRECISION
+from helpers.temp_limiter import TemperatureLimiter
+
+
+class TemperatureLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def _limiter(self, **kwargs):
+        return TemperatureLimiter(lambda area, value: self.sent.append(value), **kwargs)
+
+    def test_default_deadband_holds_one_step(self):
+        # Nothing to hold if the deadband is no wider than a rounding step
+        self.assertGreater(TEMP_DEADBAND, TEMP_PRECISION)
+        limiter = self._limiter(step=TEMP_PRECISION, deadband=TEMP_DEADBAND, min_interval=0)
+        for raw in (21.0, 21.6, 22.1):
+            limiter.offer(1, limiter.quantize(1, raw))
+        self.assertEqual(self.sent, [21.0, 22.0])
+        self.assertEqual(limiter.suppressed_deadband, 1)
+
+    def test_deadband_with_fine_precision(self):
+        limiter = self._limiter(step=0.1, hysteresis=0, deadband=0.3, min_interval=0)
+        for raw in (20.0, 20.2, 20.3):
+            limiter.offer(1, limiter.quantize(1, raw))
+        self.assertEqual(self.sent, [20.0, 20.3])
+
+    def test_hysteresis_holds_a_boundary_reading(self):
+        limiter = self._limiter(step=0.5, hysteresis=0.1)
+        self.assertEqual(limiter.quantize(1, 21.0), 21.0)
+        self.assertEqual(limiter.quantize(1, 21.3), 21.0)
+        self.assertEqual(limiter.quantize(1, 21.4), 21.5)
+
+    def test_rate_limit_then_flush(self):
+        limiter = self._limiter(deadband=0, min_interval=60)
+        self.assertTrue(limiter.offer(1, 21.0))
+        self.assertFalse(limiter.offer(1, 23.0))
+        self.assertFalse(limiter.offer(1, 24.0))
+        self.assertEqual(limiter.suppressed_rate, 2)
+        limiter.flush_all()
+        self.assertEqual(self.sent, [21.0, 24.0])
+
+    def test_back_to_the_sent_value_drops_the_held_one(self):
+        limiter = self._limiter(min_interval=60)
+        limiter.offer(1, 21.0)
+        limiter.offer(1, 23.0)
+        limiter.offer(1, 21.0)
+        limiter.flush_all()
+        self.assertEqual(self.sent, [21.0])
+
+    def test_per_area_overrides(self):
+        limiter = self._limiter(min_interval=0, overrides={"2": {"deadband": 3}})
+        for area in (1, 2):
+            limiter.offer(area, 20.0)
+            limiter.offer(area, 22.0)
+        self.assertEqual(self.sent, [20.0, 22.0, 20.0])
+        with self.assertRaises(ValueError):
+            self._limiter(overrides={"1": {"bogus": 1}})
+
+
+class TrailingSendTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_held_value_sent_after_settle(self):
+        sent = []
+        limiter = TemperatureLimiter(lambda area, value: sent.append(value), min_interval=0, settle=0.05)
+        limiter.offer(1, 21.0)
+        limiter.offer(1, 21.5)
+        await asyncio.sleep(0.1)
+        self.assertEqual(sent, [21.0, 21.5])
+        self.assertEqual(limiter.trailing_sent, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import types
+import unittest
+
+import main
+from helpers import json_codec
+from helpers.tracing import Tracer
+
+
+class Handler:
+
+    def handle(self, value):
+        return value * 2
+
+    @staticmethod
+    def encode(value):
+        return str(value)
+
+    @classmethod
+    def create(cls):
+        return cls()
+
+
+class SubHandler(Handler):
+    pass
+
+
+def _state(target, attr):
+    # What the target itself holds, None when it only inherits the attribute
+    holder = vars(target) if hasattr(target, "__dict__") else {}
+    return holder.get(attr)
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_enable_wraps_and_disable_restores_each_kind_of_target(self):
+        module = types.SimpleNamespace(parse=lambda payload: payload.upper())
+        handler = Handler()
+        handler.callback = lambda value: value + 1
+        originals = (module.parse, handler.callback)
+        targets = [(module, "parse", "parse"), (handler, "handle", "handle"), (handler, "callback", "callback"),
+                   (Handler, "encode", "encode"), (Handler, "create", "create"), (SubHandler, "handle", "sub"),
+                   (None, "missing", "missing")]
+        class_encode, class_create = vars(Handler)["encode"], vars(Handler)["create"]
+
+        tracer = Tracer()
+        tracer.enable(targets)
+        self.assertIs(module.parse.__wrapped__, originals[0])
+        self.assertIs(handler.callback.__wrapped__, originals[1])
+        self.assertEqual(handler.handle.__wrapped__, Handler().handle.__func__.__get__(handler))
+        self.assertEqual((module.parse("a"), handler.handle(2), handler.callback(1), Handler.encode(3)), ("A", 4, 2, "3"))
+        # Static/class methods still work from an instance while wrapped
+        self.assertEqual(handler.encode(4), "4")
+        self.assertIsInstance(handler.create(), Handler)
+        self.assertEqual(SubHandler().handle(1), 2)
+        self.assertEqual(module.parse("b"), "B")
+
+        tracer.disable()
+        self.assertIs(module.parse, originals[0])
+        self.assertIs(handler.callback, originals[1])
+        self.assertNotIn("handle", vars(handler))
+        self.assertIs(vars(Handler)["encode"], class_encode)
+        self.assertIs(vars(Handler)["create"], class_create)
+        self.assertNotIn("handle", vars(SubHandler))
+        self.assertEqual(handler.encode(5), "5")
+
+        counts = {stage: s["count"] for stage, s in tracer.snapshot().items()}
+        self.assertEqual(counts, {"parse": 2, "handle": 1, "callback": 1, "encode": 2, "create": 1, "sub": 1})
+        tracer.reset()
+        self.assertEqual({s["count"] for s in tracer.snapshot().values()}, {0})
+
+    def test_bridge_trace_targets_round_trip(self):
+        targets = [(target, attr, stage) for target, attr, stage in main._trace_targets() if target is not None]
+        before = [(_state(target, attr), getattr(target, attr)) for target, attr, stage in targets]
+        tracer = Tracer()
+        tracer.enable(targets)
+        try:
+            for target, attr, stage in targets:
+                self.assertTrue(hasattr(getattr(target, attr), "__wrapped__"), stage)
+            json_codec.loads(b'{"a": 1}')
+        finally:
+            tracer.disable()
+        for (target, attr, stage), (own, value) in zip(targets, before):
+            self.assertIs(_state(target, attr), own, stage)
+            self.assertEqual(getattr(target, attr), value, stage)
+        self.assertEqual(tracer.snapshot()["json_parse"]["count"], 1)
+        self.assertFalse(tracer.enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
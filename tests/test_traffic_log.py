@@ -0,0 +1,65 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from helpers.message_queue import MessageQueue
+from helpers.traffic_log import TrafficRecorder, read_traffic
+
+
+class TrafficLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "traffic.bin")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip_across_sessions(self):
+        recorder = TrafficRecorder(self.path)
+        recorder.record("a/state", b'{"x": 1}', ts=1.0)
+        recorder.record("dynalite", "text", ts=2.0)
+        recorder.record("a/state", b"", ts=3.0)
+        recorder.close()
+        recorder = TrafficRecorder(self.path)
+        recorder.record("b", b"again", ts=4.0)
+        recorder.close()
+        self.assertEqual(list(read_traffic(self.path)), [
+            (1.0, "a/state", b'{"x": 1}'), (2.0, "dynalite", b"text"), (3.0, "a/state", b""), (4.0, "b", b"again")])
+
+    def test_truncated_tail_ends_the_read(self):
+        recorder = TrafficRecorder(self.path)
+        recorder.record("t", b"complete", ts=1.0)
+        recorder.record("t", b"cut short", ts=2.0)
+        recorder.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual(list(read_traffic(self.path)), [(1.0, "t", b"complete")])
+
+
+class RecordOnLoopTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_network_thread_only_enqueues(self):
+        path = os.path.join(tempfile.mkdtemp(), "traffic.bin")
+        recorder = TrafficRecorder(path)
+        threads = []
+        record = recorder.record
+        recorder.record = lambda *args, **kwargs: (threads.append(threading.get_ident()), record(*args, **kwargs))
+        queue = MessageQueue(lambda topic, payload: None, recorder=recorder)
+        tasks = queue.start()
+        sender = threading.Thread(target=queue.submit_threadsafe, args=("t", b"from paho"))
+        sender.start()
+        sender.join()
+        await asyncio.sleep(0.01)
+        await queue.drained()
+        queue.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        recorder.close()
+        self.assertEqual(threads, [threading.get_ident()])
+        self.assertEqual([payload for ts, topic, payload in read_traffic(path)], [b"from paho"])
+
+
+if __name__ == "__main__":
+    unittest.main()